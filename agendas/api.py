@@ -120,20 +120,14 @@ class AgendaResource(BaseResource):
         return members
 
     def dehydrate_parties(self, bundle):
-        party_values = dict(map(lambda party_data:(party_data[0],(party_data[1],party_data[2])),
-                            bundle.obj.get_party_values()))
+        party_values = Agenda.objects.get_party_scores().get(bundle.obj.id, {})
         parties = []
         for party in Party.objects.all():
-            if party.pk in party_values:
-                parties.append(dict(name=party.name, 
-                                    score=party_values[party.pk][0], 
-                                    volume=party_values[party.pk][1],
-                                    absolute_url=party.get_absolute_url()))
-            else:
-                parties.append(dict(name=party.name,
-                                    score=0,
-                                    volume=0,
-                                    absolute_url=party.get_absolute_url()))
+            score, volume = party_values.get(party.pk, (0, 0))
+            parties.append(dict(name=party.name,
+                                score=round(score, 2),
+                                volume=round(volume, 2),
+                                absolute_url=party.get_absolute_url()))
         return parties
 
     def dehydrate_votes(self, bundle):
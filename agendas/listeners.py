@@ -5,8 +5,10 @@ from django.contrib.contenttypes.models import ContentType
 from planet.models import Feed, Post
 from actstream import action
 from actstream.models import Follow
+from knesset.cache_invalidation import invalidated_by
 from knesset.utils import cannonize, disable_for_loaddata
-from agendas.models import AgendaVote, AgendaMeeting, AgendaBill, Agenda
+from laws.models.vote_action import VoteAction
+from agendas.models import AgendaVote, AgendaMeeting, AgendaBill, Agenda, SummaryAgenda
 from links.models import Link, LinkType
 
 @disable_for_loaddata
@@ -34,6 +36,11 @@ def record_agenda_removal_action(sender, instance, **kwargs):
                 timestamp = datetime.datetime.now())
 pre_delete.connect(record_agenda_removal_action, sender=AgendaVote)
 
+@disable_for_loaddata
+def update_agenda_summaries_on_removal(sender, instance, **kwargs):
+    SummaryAgenda.objects.update_for_agenda_votes([instance])
+post_delete.connect(update_agenda_summaries_on_removal, sender=AgendaVote)
+
 @disable_for_loaddata
 def record_agenda_bill_ascription_action(sender, created, instance, **kwargs):
     if created:
@@ -97,3 +104,13 @@ def update_num_followers(sender, instance, **kwargs):
 
 post_delete.connect(update_num_followers, sender=Follow)
 post_save.connect(update_num_followers, sender=Follow)
+
+
+@invalidated_by(AgendaVote)
+def agenda_vote_cache_keys(instance):
+    keys = ['agenda_votes_%d' % instance.agenda_id, 'AllAgendaPartyVotes']
+    # only the members who voted in it have the vote in their agendas
+    keys.extend('api_v2_member_agendas_%d' % member_id
+                for member_id in VoteAction.objects.filter(vote_id=instance.vote_id).values_list(
+                    'member_id', flat=True).distinct())
+    return keys
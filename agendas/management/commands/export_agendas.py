@@ -5,6 +5,7 @@ from django.conf import settings
 
 from mks.models import Member
 from agendas.models import Agenda, AgendaVote
+from laws.vote_matrix import get_vote_matrix
 
 
 class Command(NoArgsCommand):
@@ -12,6 +13,9 @@ class Command(NoArgsCommand):
     def handle_noargs(self, **options):
         mks = Member.objects.exclude(current_party__isnull=True).order_by(
             'current_party').values('id', 'name', 'current_party')
+        mk_ids = [mk['id'] for mk in mks]
+        # the for and against votes of the mks are read from the vote matrix
+        matrix = get_vote_matrix(AgendaVote.objects.values_list('vote', flat=True).distinct())
         for agenda in Agenda.objects.all():
             f = open(os.path.join(settings.DATA_ROOT, 'agenda_%d.csv' %
                                   agenda.id), 'wt')
@@ -26,22 +30,15 @@ class Command(NoArgsCommand):
                 header.append('%s %d' % (mk['name'].encode('utf8'), mk['id']))
             csv_writer.writerow(header)
 
-            for agenda_vote in AgendaVote.objects.filter(
-                    agenda=agenda).select_related('vote'):
+            agenda_votes = list(AgendaVote.objects.filter(agenda=agenda).select_related('vote'))
+            mk_votes = matrix.dense([agenda_vote.vote_id for agenda_vote in agenda_votes], mk_ids, abstain=0)
+            for agenda_vote, mk_row in zip(agenda_votes, mk_votes):
                 row = []
                 row.append(agenda_vote.vote.id)
                 row.append(agenda_vote.vote.title.encode('utf8'))
                 row.append(agenda_vote.vote.time.isoformat())
                 row.append(agenda_vote.score)
                 row.append(agenda_vote.importance)
-                mks_for = agenda_vote.vote.get_voters_id('for')
-                mks_against = agenda_vote.vote.get_voters_id('against')
-                for mk in mks:
-                    if mk['id'] in mks_for:
-                        row.append(1)
-                    elif mk['id'] in mks_against:
-                        row.append(-1)
-                    else:
-                        row.append(0)
+                row.extend(mk_row.tolist())
                 csv_writer.writerow(row)
             f.close()
@@ -1,12 +1,13 @@
 from __future__ import division
-from itertools import chain
-from operator import itemgetter, attrgetter
+from operator import attrgetter
 from collections import defaultdict
 import math
+import operator
 
-from django.db import connection
+from dateutil.relativedelta import relativedelta
+from django.db import connection, transaction
 from django.db import models
-from django.db.models import Sum, Q, Count, F
+from django.db.models import Sum, Q
 from django.utils.translation import ugettext_lazy as _
 
 from django.core.cache import cache
@@ -19,6 +20,7 @@ from laws.models.vote_action import VoteAction
 from laws.models.vote import Vote
 from mks.models import Party, Member, Knesset, Membership
 import queries
+from score_matrix import AgendaScoreMatrix
 
 from tagging.models import Tag
 
@@ -52,7 +54,7 @@ class UserSuggestedVote(models.Model):
 
 class AgendaVoteManager(models.Manager):
     db_month_trunc_functions = {
-        'sqlite3': {'monthfunc': "strftime('%%Y-%%m-01'", 'nowfunc': 'date()'},
+        'sqlite3': {'monthfunc': "strftime('%%Y-%%m-01 00:00:00'", 'nowfunc': 'date()'},
         'postgresql_psycopg2': {'monthfunc': "date_trunc('month'", 'nowfunc': 'now()'}
     }
 
@@ -68,6 +70,7 @@ class AgendaVoteManager(models.Manager):
 
         party_query = queries.BASE_PARTY_QUERY % db_functions
         cursor.execute(party_query)
+        AgendaScoreMatrix.invalidate()
 
 
 class AgendaVote(models.Model):
@@ -94,58 +97,20 @@ class AgendaVote(models.Model):
     def __unicode__(self):
         return u"%s %s" % (self.agenda, self.vote)
 
-    def update_monthly_counters(self):
-        agendaScore = float(self.score) * float(self.importance)
-        objMonth = dateMonthTruncate(self.vote.time)
-
-        summaryObjects = list(SummaryAgenda.objects.filter(agenda=self.agenda,
-                                                           month=objMonth).all())
-
-        agendaSummary = None
-        if not filter(lambda summary: summary.summary_type == 'AG', summaryObjects):
-            agendaSummary = SummaryAgenda(month=objMonth,
-                                          agenda=self.agenda,
-                                          summary_type='AG',
-                                          score=abs(agendaScore),
-                                          votes=1)
-        else:
-            existingAgenda = filter(lambda summary: summary.summary_type == 'AG', summaryObjects)[0]
-            existingAgenda.votes += 1
-            existingAgenda.score += abs(agendaScore)
-            existingAgenda.save()
-
-        agendasByMk = dict(map(lambda summary: (summary.mk_id, summary),
-                               filter(lambda summary: summary.summary_type == 'MK',
-                                      summaryObjects)))
-        newObjects = []
-        if agendaSummary:
-            newObjects.append(agendaSummary)
-        voters = defaultdict(list)
-        for vote_action in self.vote.actions.all():
-            mkSummary = agendasByMk.get(vote_action.member_id, None)
-            if not mkSummary:
-                mkSummary = SummaryAgenda(month=objMonth,
-                                          agenda=self.agenda,
-                                          summary_type='MK',
-                                          mk_id=vote_action.member_id,
-                                          votes=1,
-                                          score=agendaScore * (1 if vote_action.type == 'for' else -1),
-                                          for_votes=(1 if vote_action.type == 'for' else 0),
-                                          against_votes=(1 if vote_action.type == 'against' else 0))
-                newObjects.append(mkSummary)
-            else:
-                voters[vote_action.type].append(vote_action.member_id)
-
-        SummaryAgenda.objects.filter(agenda=self.agenda, mk_id__in=voters['for'], month=objMonth).update(
-            votes=F('votes') + 1, score=F('score') + agendaScore, for_votes=F('for_votes') + 1)
-        SummaryAgenda.objects.filter(agenda=self.agenda, mk_id__in=voters['against'], month=objMonth).update(
-            votes=F('votes') + 1, score=F('score') - agendaScore, against_votes=F('against_votes') + 1)
-        if newObjects:
-            SummaryAgenda.objects.bulk_create(newObjects)
+    def summary_cell(self):
+        """The (agenda id, month) SummaryAgenda cell this agenda vote counts in"""
+        return self.agenda_id, dateMonthTruncate(self.vote.time)
 
     def save(self, *args, **kwargs):
+        # an edit may move the agenda vote to another cell (changing the vote
+        # or agenda), so the cell it was counted in needs a rebuild too
+        cells = set()
+        if self.pk:
+            cells.update((agenda_id, dateMonthTruncate(time)) for agenda_id, time in
+                         AgendaVote.objects.filter(pk=self.pk).values_list('agenda_id', 'vote__time'))
         super(AgendaVote, self).save(*args, **kwargs)
-        self.update_monthly_counters()
+        cells.add(self.summary_cell())
+        SummaryAgenda.objects.recompute_cells(cells)
 
 
 class AgendaMeeting(models.Model):
@@ -228,8 +193,9 @@ class AgendaManager(models.Manager):
     def get_selected_for_instance(self, instance, user=None, top=3, bottom=3):
         # Returns interesting agendas for model instances such as: member, party
         agendas = list(self.get_relevant_for_user(user))
+        scores = self.get_scores_for_model(instance.__class__)
         for agenda in agendas:
-            agenda.score = agenda.__getattribute__('%s_score' % instance.__class__.__name__.lower())(instance)
+            agenda.score = scores.get(agenda.id, {}).get(instance.pk, (0.0, 0.0))[0]
             agenda.significance = agenda.score * agenda.num_followers
         agendas.sort(key=attrgetter('significance'))
         agendas = get_top_bottom(agendas, top, bottom)
@@ -268,26 +234,15 @@ class AgendaManager(models.Manager):
         return agendas
 
     def get_mks_values(self):
-        mks_values = cache.get('agendas_mks_values')
-        if not mks_values:
-            q = queries.agendas_mks_grade()
-            # outer join - add missing mks to agendas
-            newAgendaMkVotes = {}
-            # generates a set of all the current mk ids that have ever voted for any agenda
-            # its not perfect, but its better than creating another query to generate all known mkids
-            allMkIds = set(map(itemgetter(0), chain.from_iterable(q.values())))
-            for agendaId, agendaVotes in q.items():
-                # the newdict will have 0's for each mkid, the update will change the value for known mks
-                newDict = {}.fromkeys(allMkIds, (0, 0, 0))
-                newDict.update(
-                    dict(map(lambda (mkid, score, volume, numvotes): (mkid, (score, volume, numvotes)), agendaVotes)))
-                newAgendaMkVotes[agendaId] = newDict.items()
-            mks_values = {}
-            for agenda_id, scores in newAgendaMkVotes.items():
-                mks_values[agenda_id] = \
-                    map(lambda x: (x[1][0], dict(score=x[1][1][0], rank=x[0], volume=x[1][1][1], numvotes=x[1][1][2])),
-                        enumerate(sorted(scores, key=lambda x: x[1][0], reverse=True), 1))
-            cache.set('agendas_mks_values', mks_values, 1800)
+        matrix = AgendaScoreMatrix.get()
+        values = matrix.range_values(matrix.agenda_ids, matrix.mk_ids)
+        mks_values = {}
+        for i, agenda_id in enumerate(matrix.agenda_ids):
+            mks_values[agenda_id] = sorted(
+                [(mk_id, dict(score=round(values['score'][i, j], 2), rank=int(values['rank'][i, j]) + 1,
+                              volume=round(values['volume'][i, j], 2), numvotes=int(values['numvotes'][i, j])))
+                 for j, mk_id in enumerate(matrix.mk_ids)],
+                key=lambda (mk_id, mk_values): mk_values['rank'])
         return mks_values
 
     # def get_mks_values(self,ranges=None):
@@ -329,6 +284,70 @@ class AgendaManager(models.Manager):
     def get_all_party_values(self):
         return queries.getAllAgendaPartyVotes()
 
+    def get_scores_for_model(self, model):
+        """{agenda id: {instance pk: (score, volume)}} for all the agendas and
+        all the instances of model: Member, Party or CandidateList"""
+        return getattr(self, 'get_%s_scores' % model.__name__.lower())()
+
+    def get_member_scores(self):
+        """Members' scores and volumes since the start of the current knesset"""
+
+        def compute(matrix):
+            start = dateMonthTruncate(Knesset.objects.current_knesset().start_date)
+            values = matrix.range_values(matrix.agenda_ids, matrix.mk_ids, start)
+            return values['score'], values['volume'], matrix.mk_ids
+
+        return self._get_scores('member', compute)
+
+    def get_party_scores(self):
+        """Parties' scores and volumes over their current members, relative to
+        their number of seats"""
+
+        def compute(matrix):
+            members = defaultdict(list)
+            for mk_id, party_id in Member.objects.filter(current_party__isnull=False).values_list(
+                    'id', 'current_party_id'):
+                members[party_id].append(mk_id)
+            parties = list(Party.objects.values_list('id', 'number_of_seats'))
+            score, volume = matrix.group_values(matrix.agenda_ids,
+                                                [members[party_id] for party_id, seats in parties],
+                                                [seats or 0 for party_id, seats in parties])
+            return score, volume, [party_id for party_id, seats in parties]
+
+        return self._get_scores('party', compute)
+
+    def get_candidatelist_scores(self):
+        """Candidate lists' scores and volumes over their candidates that are
+        members, relative to the number of these members"""
+        from polyorg.models import Candidate
+
+        def compute(matrix):
+            members = defaultdict(set)
+            for candidate_list_id, mk_id in Candidate.objects.filter(person__mk__isnull=False).values_list(
+                    'candidates_list', 'person__mk'):
+                members[candidate_list_id].add(mk_id)
+            candidate_list_ids = members.keys()
+            score, volume = matrix.group_values(matrix.agenda_ids,
+                                                [members[cl_id] for cl_id in candidate_list_ids],
+                                                [len(members[cl_id]) for cl_id in candidate_list_ids])
+            return score, volume, candidate_list_ids
+
+        return self._get_scores('candidatelist', compute)
+
+    def _get_scores(self, kind, compute):
+        # all the scores of a kind are computed at once from the score
+        # matrix, and cached until the matrix changes
+        matrix = AgendaScoreMatrix.get()
+        cache_key = 'agenda_%s_scores_%s' % (kind, matrix.version)
+        scores = cache.get(cache_key)
+        if scores is None:
+            score, volume, instance_ids = compute(matrix)
+            scores = dict((agenda_id, dict((instance_id, (float(score[i, j]), float(volume[i, j])))
+                                           for j, instance_id in enumerate(instance_ids)))
+                          for i, agenda_id in enumerate(matrix.agenda_ids))
+            cache.set(cache_key, scores, settings.LONG_CACHE_TIME)
+        return scores
+
 
 class Agenda(models.Model):
     name = models.CharField(max_length=200)
@@ -363,75 +382,13 @@ class Agenda(models.Model):
         return ('agenda-detail-edit', [str(self.id)])
 
     def member_score(self, member):
-        values = self.get_mks_values(mks=[member])
-        if values:
-            if len(values) > 1:
-                raise Member.MultipleObjectsReturned
-            return values[0][1]['score']
-        else:
-            return 0.0
+        return Agenda.objects.get_member_scores().get(self.id, {}).get(member.id, (0.0, 0.0))[0]
 
     def party_score(self, party):
-        # Since we're already calculating python side, no need to do 2 queries
-        # with joins, select for and against, and calcualte the things
-        qs = AgendaVote.objects.filter(
-            agenda=self, vote__actions__member__in=party.members.all(),
-            vote__actions__type__in=['against', 'for']).extra(
-            select={'weighted_score': 'agendas_agendavote.score*agendas_agendavote.importance'}
-        ).values_list('weighted_score', 'vote__actions__type')
-
-        for_score = 0
-        against_score = 0
-
-        for score, action_type in qs:
-            if action_type == 'against':
-                against_score += score
-            else:
-                for_score += score
-
-        # max_score = sum([abs(x) for x in self.agendavotes.values_list('score', flat=True)]) * party.members.count()
-        # To save the queries, make sure to pass prefetch/select related
-        # Removed the values call, so that we can utilize the prefetched stuf
-        # This reduces the number of queries when called for example from
-        # AgendaResource.dehydrate
-        max_score = sum(abs(x.score * x.importance) for x in
-                        self.agendavotes.all()) * party.number_of_seats
-
-        if max_score > 0:
-            return (for_score - against_score) / max_score * 100
-        else:
-            return 0.0
+        return Agenda.objects.get_party_scores().get(self.id, {}).get(party.id, (0.0, 0.0))[0]
 
     def candidate_list_score(self, candidate_list):
-        # Since we're already calculating python side, no need to do 2 queries
-        # with joins, select for and against, and calcualte the things
-        qs = AgendaVote.objects.filter(
-            agenda=self, vote__actions__member__in=candidate_list.member_ids,
-            vote__actions__type__in=['against', 'for']).extra(
-            select={'weighted_score': 'agendas_agendavote.score*agendas_agendavote.importance'}
-        ).values_list('weighted_score', 'vote__actions__type')
-
-        for_score = 0
-        against_score = 0
-
-        for score, action_type in qs:
-            if action_type == 'against':
-                against_score += score
-            else:
-                for_score += score
-
-        # max_score = sum([abs(x) for x in self.agendavotes.values_list('score', flat=True)]) * party.members.count()
-        # To save the queries, make sure to pass prefetch/select related
-        # Removed the values call, so that we can utilize the prefetched stuf
-        # This reduces the number of queries when called for example from
-        # AgendaResource.dehydrate
-        max_score = sum(abs(x.score * x.importance) for x in
-                        self.agendavotes.all()) * len(candidate_list.member_ids)
-
-        if max_score > 0:
-            return (for_score - against_score) / max_score * 100
-        else:
-            return 0.0
+        return Agenda.objects.get_candidatelist_scores().get(self.id, {}).get(candidate_list.id, (0.0, 0.0))[0]
 
     def related_mk_votes(self, member):
         # Find all votes that
@@ -454,8 +411,9 @@ class Agenda(models.Model):
 
     def selected_instances(self, cls, top=3, bottom=3):
         instances = list(cls.objects.all())
+        scores = Agenda.objects.get_scores_for_model(cls).get(self.id, {})
         for instance in instances:
-            instance.score = self.__getattribute__('%s_score' % instance.__class__.__name__.lower())(instance)
+            instance.score = scores.get(instance.pk, (0.0, 0.0))[0]
         instances.sort(key=attrgetter('score'))
         instances = get_top_bottom(instances, top, bottom)
         instances['top'].sort(key=attrgetter('score'), reverse=True)
@@ -486,12 +444,14 @@ class Agenda(models.Model):
     def get_mks_totals(self, member):
         "Get count for each vote type for a specific member on this agenda"
 
-        # let's split qs to make it more readable
-        qs = VoteAction.objects.filter(member=member, type__in=('for', 'against'), vote__agendavotes__agenda=self)
-        qs = list(qs.values('type').annotate(total=Count('id')))
+        matrix = AgendaScoreMatrix.get()
+        values = matrix.range_values([self.id], [member.id])
+        qs = [{'type': vote_type, 'total': int(values[key][0, 0])}
+              for vote_type, key in (('for', 'numforvotes'), ('against', 'numagainstvotes'))
+              if values[key][0, 0]]
 
         totals = sum(x['total'] for x in qs)
-        qs.append({'type': 'no-vote', 'total': self.votes.count() - totals})
+        qs.append({'type': 'no-vote', 'total': matrix.num_agenda_votes(self.id) - totals})
 
         return qs
 
@@ -501,72 +461,32 @@ class Agenda(models.Model):
             ranges = [[dateMonthTruncate(Knesset.objects.current_knesset().start_date), None]]
         else:
             only_current_mks = False
-        mks_values = False
-        mk_ids = [mk.id for mk in mks] if mks else []
-
-        fullRange = ranges == [[None, None]]
-        if fullRange:
-            mks_values = cache.get('agenda_%d_mks_values' % self.id)
-            if mks_values and mks:
-                mks_values = [(mk_id, values)
-                              for (mk_id, values) in mks_values
-                              if mk_id in mk_ids]
-
-        if not mks_values:
-            # get list of mk ids
-            mk_ids = mk_ids or Membership.objects.membership_in_range(ranges, only_current_mks=only_current_mks)
-
-            # generate summary query
-            filters_folded = self.generateSummaryFilters(ranges, 'month', 'month')
-
-            # query summary
-            baseQuerySet = SummaryAgenda.objects.filter(agenda=self)
-            if filters_folded:
-                baseQuerySet.filter(filters_folded)
-            summaries = list(baseQuerySet)
-            # group summaries for respective ranges
-            summariesForRanges = []
-            for r in ranges:
-                summariesForRange = defaultdict(list)
-                for s in summaries:
-                    if (not r[0] or s.month >= r[0]) and \
-                            (not r[1] or s.month < r[1]):
-                        summariesForRange[s.summary_type].append(s)
-                summariesForRanges.append(summariesForRange)
-
-            # compute agenda measures, store results per MK
-            mk_results = dict(map(lambda mk_id: (mk_id, []), mk_ids))
-            for summaries in summariesForRanges:
-                agenda_data = summaries['AG']
-                total_votes = sum(map(attrgetter('votes'), agenda_data))
-                total_for_votes = sum(map(attrgetter('for_votes'), agenda_data))
-                total_against_votes = sum(map(attrgetter('against_votes'), agenda_data))
-                total_score = sum(map(attrgetter('score'), agenda_data))
-                current_mks_data = indexby(summaries['MK'], attrgetter('mk_id'))
-                # calculate results per mk
-                rangeMkResults = []
-                for mk_id in mk_results.keys():
-                    mk_data = current_mks_data[mk_id]
-                    if mk_data:
-                        mk_votes = sum(map(attrgetter('votes'), mk_data))
-                        mk_for_votes = sum(map(attrgetter('for_votes'), mk_data))
-                        mk_against_votes = sum(map(attrgetter('against_votes'), mk_data))
-                        mk_volume = 100 * mk_votes / total_votes
-                        mk_score = 100 * sum(map(attrgetter('score'), mk_data)) / total_score if total_score != 0 else 0
-                        rangeMkResults.append((mk_id, mk_votes, mk_for_votes, mk_against_votes, mk_score, mk_volume))
-                    else:
-                        rangeMkResults.append(tuple([mk_id] + [0] * 5))
-                # sort results by score descending
-                for rank, (mk_id, mk_votes, mk_for_votes, mk_against_votes, mk_score, mk_volume) in enumerate(
-                        sorted(rangeMkResults, key=itemgetter(4, 0), reverse=True)):
-                    mk_range_data = dict(score=mk_score, rank=rank, volume=mk_volume, numvotes=mk_votes,
-                                         numforvotes=mk_for_votes, numagainstvotes=mk_against_votes)
-                    if len(ranges) == 1:
-                        mk_results[mk_id] = mk_range_data
-                    else:
-                        mk_results[mk_id].append(mk_range_data)
-            if fullRange:
-                cache.set('agenda_%d_mks_values' % self.id, mks_values, 1800)
+
+        matrix = AgendaScoreMatrix.get()
+        if mks:
+            mk_ids = [mk.id for mk in mks]
+        else:
+            mk_ids = Membership.objects.membership_in_range(ranges, only_current_mks=only_current_mks)
+            if mk_ids is None:
+                mk_ids = matrix.mk_ids
+        mk_ids = sorted(set(mk_ids))
+
+        # compute agenda measures for all the mks of each range at once,
+        # store results per MK
+        mk_results = dict(map(lambda mk_id: (mk_id, []), mk_ids))
+        for start, end in ranges:
+            values = matrix.range_values([self.id], mk_ids, start, end)
+            for j, mk_id in enumerate(mk_ids):
+                mk_range_data = dict(score=float(values['score'][0, j]),
+                                     rank=int(values['rank'][0, j]),
+                                     volume=float(values['volume'][0, j]),
+                                     numvotes=int(values['numvotes'][0, j]),
+                                     numforvotes=int(values['numforvotes'][0, j]),
+                                     numagainstvotes=int(values['numagainstvotes'][0, j]))
+                if len(ranges) == 1:
+                    mk_results[mk_id] = mk_range_data
+                else:
+                    mk_results[mk_id].append(mk_range_data)
         if len(ranges) == 1:
             mk_results = sorted(mk_results.items(), key=lambda (k, v): v['rank'])
         return mk_results
@@ -630,6 +550,85 @@ SUMMARY_TYPES = (
 )
 
 
+class SummaryAgendaManager(models.Manager):
+    def recompute_cells(self, cells, mk_ids=None):
+        """Rebuild the summaries of the given (agenda id, month) cells.
+
+        The agenda votes and vote actions of the cells are fetched in one
+        query each, and the cells' rows are replaced with a single delete and
+        a single bulk insert, so the rest of the table is left untouched.
+        When mk_ids is given only the MK rows of these members are rebuilt,
+        which is all that changes when new vote actions arrive. The PR rows
+        of the cells are deleted and are not rebuilt here, compute_all
+        writes them again.
+        """
+        cells = set(cells)
+        if not cells:
+            return
+        cells_filter = reduce(operator.or_, [Q(agenda_id=agenda_id, month=month)
+                                             for agenda_id, month in cells])
+        votes_filter = reduce(operator.or_, [Q(agenda_id=agenda_id,
+                                               vote__time__gte=month,
+                                               vote__time__lt=month + relativedelta(months=1))
+                                             for agenda_id, month in cells])
+        agenda_votes = AgendaVote.objects.filter(votes_filter)
+
+        agenda_totals = defaultdict(lambda: [0.0, 0])
+        vote_weights = defaultdict(list)
+        for agenda_id, vote_id, score, importance, time in agenda_votes.values_list(
+                'agenda_id', 'vote_id', 'score', 'importance', 'vote__time'):
+            cell = (agenda_id, dateMonthTruncate(time))
+            agenda_totals[cell][0] += abs(score * importance)
+            agenda_totals[cell][1] += 1
+            vote_weights[vote_id].append((cell, score * importance))
+
+        actions = VoteAction.objects.filter(vote__in=agenda_votes.values('vote_id'),
+                                            type__in=('for', 'against'))
+        if mk_ids is not None:
+            actions = actions.filter(member__in=mk_ids)
+        mk_totals = defaultdict(lambda: [0.0, 0, 0, 0])
+        for vote_id, mk_id, action_type in actions.values_list('vote_id', 'member_id', 'type').distinct():
+            for cell, weight in vote_weights[vote_id]:
+                totals = mk_totals[cell + (mk_id,)]
+                if action_type == 'for':
+                    totals[0] += weight
+                    totals[2] += 1
+                else:
+                    totals[0] -= weight
+                    totals[3] += 1
+                totals[1] += 1
+
+        # counters of the AG rows follow the ones written by compute_all
+        summaries = []
+        if mk_ids is None:
+            summaries.extend(SummaryAgenda(agenda_id=agenda_id, month=month, summary_type='AG',
+                                           score=score, votes=votes, for_votes=votes, against_votes=votes)
+                             for (agenda_id, month), (score, votes) in agenda_totals.items())
+        else:
+            # the PR rows count the vote actions too
+            cells_filter &= Q(summary_type='MK', mk__in=mk_ids) | Q(summary_type='PR')
+        summaries.extend(SummaryAgenda(agenda_id=agenda_id, month=month, summary_type='MK', mk_id=mk_id,
+                                       score=score, votes=votes, for_votes=for_votes,
+                                       against_votes=against_votes)
+                         for (agenda_id, month, mk_id), (score, votes, for_votes, against_votes)
+                         in mk_totals.items())
+
+        with transaction.atomic():
+            self.filter(cells_filter).delete()
+            self.bulk_create(summaries)
+        AgendaScoreMatrix.invalidate()
+
+    def update_for_agenda_votes(self, agenda_votes):
+        """Reflect added, removed or edited agenda votes in the summaries"""
+        self.recompute_cells(agenda_vote.summary_cell() for agenda_vote in agenda_votes)
+
+    def update_for_votes(self, votes, mk_ids=None):
+        """Reflect new vote actions of already ascribed votes in the summaries"""
+        self.recompute_cells(((agenda_id, dateMonthTruncate(time)) for agenda_id, time in
+                              AgendaVote.objects.filter(vote__in=votes).values_list('agenda_id', 'vote__time')),
+                             mk_ids=mk_ids)
+
+
 class SummaryAgenda(models.Model):
     agenda = models.ForeignKey(Agenda, related_name='score_summaries')
     month = models.DateTimeField(db_index=True)
@@ -642,6 +641,8 @@ class SummaryAgenda(models.Model):
     db_created = models.DateTimeField(auto_now_add=True)
     db_updated = models.DateTimeField(auto_now=True)
 
+    objects = SummaryAgendaManager()
+
     def __unicode__(self):
         return "%s %s %s %s (%f,%d)" % (
         str(self.agenda_id), str(self.month), self.summary_type, str(self.mk_id) if self.mk else u'n/a', self.score,
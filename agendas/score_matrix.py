@@ -0,0 +1,209 @@
+'''
+In-memory agenda x member x month matrix of the agenda score summaries
+'''
+from __future__ import division
+import uuid
+
+import numpy as np
+from django.core.cache import cache
+
+
+def month_number(dt):
+    """Months since year 0 of the first month starting at or after dt"""
+    number = dt.year * 12 + dt.month - 1
+    if (dt.day, getattr(dt, 'hour', 0), getattr(dt, 'minute', 0),
+            getattr(dt, 'second', 0), getattr(dt, 'microsecond', 0)) != (1, 0, 0, 0, 0):
+        number += 1
+    return number
+
+
+class AgendaScoreMatrix(object):
+    """SummaryAgenda rows as running sums over a contiguous month axis.
+
+    Agenda measures are kept in an (agendas, months + 1) array per measure
+    and member measures in an (agendas, members, months + 1) array, so the
+    totals of any [start, end) month range for any set of agendas and
+    members are the difference of two slices.
+
+    The matrix is built once per process and rebuilt when the version
+    stored in the cache changes, which invalidate() does whenever the
+    summaries are recomputed. Without a shared cache only the
+    invalidations of this process are seen.
+    """
+
+    VERSION_CACHE_KEY = 'agenda_score_matrix_version'
+
+    _current = None
+    _version = None
+
+    def __init__(self, summaries, version=None):
+        """summaries is an iterable of (agenda_id, summary_type, mk_id,
+        month, score, votes, for_votes, against_votes) tuples"""
+        self.version = version
+        summaries = list(summaries)
+        agenda_rows = [s for s in summaries if s[1] == 'AG']
+        mk_rows = [s for s in summaries if s[1] == 'MK']
+
+        self.agenda_ids = sorted(set(s[0] for s in summaries))
+        self.mk_ids = sorted(set(s[2] for s in mk_rows))
+        self._agenda_index = dict((agenda_id, i) for i, agenda_id in enumerate(self.agenda_ids))
+        self._mk_index = dict((mk_id, i) for i, mk_id in enumerate(self.mk_ids))
+
+        months = [month_number(s[3]) for s in summaries]
+        self.first_month = min(months) if months else 0
+        num_months = max(months) - self.first_month + 1 if months else 0
+        shape = (len(self.agenda_ids), num_months + 1)
+
+        self.agenda_score = np.zeros(shape)
+        self.agenda_votes = np.zeros(shape, dtype=np.int32)
+        if agenda_rows:
+            agendas, months = self._positions(agenda_rows)
+            np.add.at(self.agenda_score, (agendas, months), [s[4] for s in agenda_rows])
+            np.add.at(self.agenda_votes, (agendas, months), [s[5] for s in agenda_rows])
+
+        shape = (len(self.agenda_ids), len(self.mk_ids), num_months + 1)
+        self.mk_score = np.zeros(shape)
+        self.mk_for_votes = np.zeros(shape, dtype=np.int32)
+        self.mk_against_votes = np.zeros(shape, dtype=np.int32)
+        if mk_rows:
+            agendas, months = self._positions(mk_rows)
+            mks = np.array([self._mk_index[s[2]] for s in mk_rows])
+            np.add.at(self.mk_score, (agendas, mks, months), [s[4] for s in mk_rows])
+            np.add.at(self.mk_for_votes, (agendas, mks, months), [s[6] for s in mk_rows])
+            np.add.at(self.mk_against_votes, (agendas, mks, months), [s[7] for s in mk_rows])
+
+        for values in (self.agenda_score, self.agenda_votes, self.mk_score,
+                       self.mk_for_votes, self.mk_against_votes):
+            np.cumsum(values, axis=-1, dtype=values.dtype, out=values)
+
+    def _positions(self, rows):
+        # values are added one month after their own, leaving index 0 as the
+        # zero running sum before the first month
+        agendas = np.array([self._agenda_index[s[0]] for s in rows])
+        months = np.array([month_number(s[3]) - self.first_month + 1 for s in rows])
+        return agendas, months
+
+    @classmethod
+    def build(cls, version=None):
+        from agendas.models import SummaryAgenda
+        return cls(SummaryAgenda.objects.values_list(
+            'agenda_id', 'summary_type', 'mk_id', 'month', 'score', 'votes', 'for_votes',
+            'against_votes').order_by(),
+            version=version)
+
+    @classmethod
+    def get(cls):
+        """Return the matrix of this process, rebuilding it if it is stale"""
+        version = cache.get(cls.VERSION_CACHE_KEY)
+        if version is None:
+            # there is no shared cache to track the version, or it was evicted:
+            # the last version set by this process is still current
+            version = cls._version or cls.invalidate()
+        current = cls._current
+        if current is None or current.version != version:
+            cls._current = current = cls.build(version)
+        return current
+
+    @classmethod
+    def invalidate(cls):
+        """Mark the matrix of every process as stale"""
+        version = cls._version = uuid.uuid4().hex
+        # kept until the next invalidation, so the processes that have not
+        # seen it yet do not take the version of their own matrix as current
+        cache.set(cls.VERSION_CACHE_KEY, version, None)
+        return version
+
+    def _month_range(self, start, end):
+        last = self.agenda_score.shape[1] - 1
+        t0 = 0 if start is None else min(max(month_number(start) - self.first_month, 0), last)
+        t1 = last if end is None else min(max(month_number(end) - self.first_month, 0), last)
+        return t0, max(t0, t1)
+
+    @staticmethod
+    def _lookup(index, ids):
+        """Positions in ids of the ones known to index, and their positions in the matrix"""
+        positions = [index.get(id) for id in ids]
+        return (np.array([i for i, pos in enumerate(positions) if pos is not None], dtype=int),
+                np.array([pos for pos in positions if pos is not None], dtype=int))
+
+    def _agenda_totals(self, agenda_ids, t0, t1):
+        known, agendas = self._lookup(self._agenda_index, agenda_ids)
+        score = np.zeros(len(agenda_ids))
+        votes = np.zeros(len(agenda_ids), dtype=np.int32)
+        score[known] = self.agenda_score[agendas, t1] - self.agenda_score[agendas, t0]
+        votes[known] = self.agenda_votes[agendas, t1] - self.agenda_votes[agendas, t0]
+        return known, agendas, score, votes
+
+    @staticmethod
+    def _percentage(values, totals):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(totals != 0, 100 * values / totals, 0.0)
+
+    def range_values(self, agenda_ids, mk_ids, start=None, end=None):
+        """Member measures for summaries with start <= month < end.
+
+        Returns a dict of (len(agenda_ids), len(mk_ids)) arrays: score and
+        volume (percentages of the agenda's total), rank (0 for the highest
+        score among the given members), numvotes, numforvotes and
+        numagainstvotes. Unknown agendas and members get zeros.
+        """
+        t0, t1 = self._month_range(start, end)
+        known_agendas, agendas, agenda_score, agenda_votes = self._agenda_totals(agenda_ids, t0, t1)
+        known_mks, mks = self._lookup(self._mk_index, mk_ids)
+
+        shape = (len(agenda_ids), len(mk_ids))
+        score = np.zeros(shape)
+        for_votes = np.zeros(shape, dtype=np.int32)
+        against_votes = np.zeros(shape, dtype=np.int32)
+        if len(agendas) and len(mks):
+            cells = np.ix_(known_agendas, known_mks)
+            positions = np.ix_(agendas, mks)
+            score[cells] = self.mk_score[positions + (t1,)] - self.mk_score[positions + (t0,)]
+            for_votes[cells] = self.mk_for_votes[positions + (t1,)] - self.mk_for_votes[positions + (t0,)]
+            against_votes[cells] = (self.mk_against_votes[positions + (t1,)] -
+                                    self.mk_against_votes[positions + (t0,)])
+        votes = for_votes + against_votes
+
+        score = self._percentage(score, agenda_score[:, None])
+        volume = self._percentage(votes, agenda_votes[:, None])
+
+        # highest score first, ties broken by the higher member id
+        ids = np.broadcast_to(np.array(mk_ids), shape) if len(mk_ids) else np.zeros(shape)
+        order = np.lexsort((ids, score), axis=-1)[:, ::-1]
+        rank = np.argsort(order, axis=-1)
+
+        return dict(score=score, volume=volume, rank=rank, numvotes=votes,
+                    numforvotes=for_votes, numagainstvotes=against_votes)
+
+    def group_values(self, agenda_ids, groups, sizes, start=None, end=None):
+        """Measures of groups of members, such as parties or candidate lists.
+
+        groups is a list of member id lists and sizes the number each group's
+        totals are normalized by (e.g. its number of seats). Returns the
+        score and volume of every agenda and group as two
+        (len(agenda_ids), len(groups)) arrays of percentages.
+        """
+        t0, t1 = self._month_range(start, end)
+        known_agendas, agendas, agenda_score, agenda_votes = self._agenda_totals(agenda_ids, t0, t1)
+
+        membership = np.zeros((len(self.mk_ids), len(groups)))
+        for i, mk_ids in enumerate(groups):
+            membership[self._lookup(self._mk_index, mk_ids)[1], i] = 1
+
+        shape = (len(agenda_ids), len(groups))
+        score = np.zeros(shape)
+        votes = np.zeros(shape)
+        if len(agendas):
+            score[known_agendas] = (self.mk_score[agendas, :, t1] - self.mk_score[agendas, :, t0]).dot(membership)
+            votes[known_agendas] = (self.mk_for_votes[agendas, :, t1] - self.mk_for_votes[agendas, :, t0] +
+                                    self.mk_against_votes[agendas, :, t1] -
+                                    self.mk_against_votes[agendas, :, t0]).dot(membership)
+
+        sizes = np.array(sizes, dtype=float)
+        return (self._percentage(score, agenda_score[:, None] * sizes),
+                self._percentage(votes, agenda_votes[:, None] * sizes))
+
+    def num_agenda_votes(self, agenda_id, start=None, end=None):
+        """Number of votes ascribed to the agenda in the month range"""
+        t0, t1 = self._month_range(start, end)
+        return int(self._agenda_totals([agenda_id], t0, t1)[3][0])
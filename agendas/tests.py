@@ -8,7 +8,10 @@ from django.contrib.sites.models import Site
 from django.utils import translation
 from django.conf import settings
 
-from models import Agenda, AgendaVote, AgendaBill, AgendaMeeting
+from dateutil.relativedelta import relativedelta
+
+from models import Agenda, AgendaVote, AgendaBill, AgendaMeeting, SummaryAgenda, dateMonthTruncate
+from score_matrix import AgendaScoreMatrix
 from laws.models import Vote, VoteAction, Bill
 from mks.models import Party, Member, Membership, Knesset
 from committees.models import Committee, CommitteeMeeting
@@ -352,6 +355,72 @@ I have a deadline''')
         res = self.client.get('/api/v2/agenda/%s/?format=json' % self.agenda_1.id)
         self.assertEqual(res.status_code, 200)
 
+    def test_agenda_vote_edit_updates_summaries(self):
+        self.agendavote_3.score = -1
+        self.agendavote_3.save()
+        agenda_summary = SummaryAgenda.objects.get(agenda=self.agenda_1, summary_type='AG')
+        self.assertEqual(agenda_summary.votes, 2)
+        self.assertEqual(agenda_summary.score, 2)
+        mk_summary = SummaryAgenda.objects.get(agenda=self.agenda_1, summary_type='MK', mk=self.mk_1)
+        self.assertEqual(mk_summary.votes, 2)
+        self.assertEqual(mk_summary.score, -2)
+
+    def test_agenda_vote_removal_updates_summaries(self):
+        self.agendavote_1.delete()
+        agenda_summary = SummaryAgenda.objects.get(agenda=self.agenda_1, summary_type='AG')
+        self.assertEqual(agenda_summary.votes, 1)
+        self.assertEqual(agenda_summary.score, 0.5)
+        mk_summary = SummaryAgenda.objects.get(agenda=self.agenda_1, summary_type='MK', mk=self.mk_1)
+        self.assertEqual(mk_summary.votes, 1)
+        self.assertEqual(mk_summary.score, 0.5)
+
+    def test_agenda_vote_edit_deletes_stale_party_summaries(self):
+        agenda_summary = SummaryAgenda.objects.get(agenda=self.agenda_1, summary_type='AG')
+        SummaryAgenda.objects.create(agenda=self.agenda_1, month=agenda_summary.month, summary_type='PR',
+                                     score=1, votes=1, for_votes=1, against_votes=0)
+        self.agendavote_3.score = -1
+        self.agendavote_3.save()
+        self.assertEqual(SummaryAgenda.objects.filter(agenda=self.agenda_1, summary_type='PR').count(), 0)
+
+    def test_new_vote_actions_update_summaries(self):
+        VoteAction.objects.create(vote=self.vote_2, member=self.mk_2, type='against',
+                                  party=self.mk_2.current_party)
+        SummaryAgenda.objects.update_for_votes([self.vote_2], mk_ids=[self.mk_2.id])
+        mk_summary = SummaryAgenda.objects.get(agenda=self.agenda_1, summary_type='MK', mk=self.mk_2)
+        self.assertEqual(mk_summary.votes, 1)
+        self.assertEqual(mk_summary.against_votes, 1)
+        self.assertEqual(mk_summary.score, -0.5)
+        # other members' rows are left as they were
+        self.assertEqual(SummaryAgenda.objects.get(agenda=self.agenda_1, summary_type='MK', mk=self.mk_1).score,
+                         -0.5)
+
+    def test_mks_values_for_ranges(self):
+        next_month = dateMonthTruncate(datetime.datetime.now()) + relativedelta(months=1)
+        mks_values = dict(self.agenda_1.get_mks_values(ranges=[[None, None], [next_month, None]],
+                                                       mks=[self.mk_1, self.mk_2]))
+        self.assertEqual(int(mks_values[self.mk_1.id][0]['score']), -33)
+        self.assertEqual(mks_values[self.mk_1.id][0]['numvotes'], 2)
+        self.assertEqual(mks_values[self.mk_1.id][0]['rank'], 1)
+        self.assertEqual(mks_values[self.mk_2.id][0]['rank'], 0)
+        self.assertEqual(mks_values[self.mk_1.id][1]['numvotes'], 0)
+        self.assertEqual(mks_values[self.mk_1.id][1]['score'], 0)
+
+    def test_score_matrix_is_kept_until_invalidated(self):
+        matrix = AgendaScoreMatrix.get()
+        self.assertIs(AgendaScoreMatrix.get(), matrix)
+        AgendaScoreMatrix.invalidate()
+        self.assertIsNot(AgendaScoreMatrix.get(), matrix)
+
+    def test_party_scores(self):
+        # party_1 has a single seat, mk_1 voted for both votes of agenda_1
+        self.assertAlmostEqual(self.agenda_1.party_score(self.party_1), -100.0 / 3)
+        self.assertAlmostEqual(self.agenda_2.party_score(self.party_1), 100.0)
+        scores = Agenda.objects.get_party_scores()
+        self.assertAlmostEqual(scores[self.agenda_1.id][self.party_1.id][1], 100.0)
+        selected = self.agenda_2.selected_instances(Party, top=1, bottom=0)
+        self.assertEqual(selected['top'], [self.party_1])
+        self.assertAlmostEqual(selected['top'][0].score, 100.0)
+
     def _validate_vote(self, vote):
         self.assertIn('id', vote, "Got vote with no id in agenda-todo")
         self.assertIn('url', vote, "Got vote with no url in agenda-todo")
@@ -9,7 +9,7 @@ from links.api import LinkResource
 from laws.api import BillResource, LawResource, VoteResource, VoteActionResource
 from agendas.api import AgendaResource, AgendaTodoResource
 from committees.api import CommitteeResource, CommitteeMeetingResource, ProtocolPartResource
-from auxiliary.api import PostResource, TagResource
+from auxiliary.api import PostResource, TagResource, SearchResource
 from events.api import EventResource
 from polyorg.api import CandidateListResource
 from persons.api import PersonResource
@@ -34,6 +34,7 @@ v2_api.register(CommitteeMeetingResource())
 v2_api.register(ProtocolPartResource())
 v2_api.register(PostResource())
 v2_api.register(TagResource())
+v2_api.register(SearchResource())
 v2_api.register(EventResource())
 v2_api.register(CandidateListResource())
 v2_api.register(PersonResource())
@@ -5,7 +5,7 @@ Api for planet and tags
 from tastypie.exceptions import InvalidFilterError
 from tastypie.constants import ALL
 import tastypie.fields as fields
-from apis.resources.base import BaseResource
+from apis.resources.base import BaseResource, BaseNonModelResource
 from planet.models import Feed, Post
 from mks.models import Member
 from links.models import Link
@@ -19,7 +19,9 @@ from django.db.utils import OperationalError
 
 from laws.models import Vote, Bill
 from committees.models import CommitteeMeeting
+from auxiliary import search as site_search
 from auxiliary.models import TagSynonym
+from ok_tag.models import TagUsage
 
 from operator import attrgetter
 
@@ -144,16 +146,19 @@ class TagResource(BaseResource):
 
     def build_filters(self, filters=None):
         filters = super(TagResource, self).build_filters(filters)
-        all_tags = list(set().union(*[Tag.objects.usage_for_model(model) for model in self.TAGGED_MODELS]))
-        filters['id__in'] = [tag.id for tag in all_tags] + [o['tag_id'] for o in
-                                                            TagSynonym.objects.all().values('tag_id')]
+        used_tag_ids = set(tag.id for tag in TagUsage.objects.cloud(self.TAGGED_MODELS))
+        filters['id__in'] = list(used_tag_ids) + [o['tag_id'] for o in
+                                                  TagSynonym.objects.all().values('tag_id')]
         return filters
 
     def dehydrate_absolute_url(self, bundle):
         return reverse('tag-detail', kwargs={'slug': bundle.obj.name})
 
     def dehydrate_number_of_items(self, bundle):
-        return bundle.obj.items.count()
+        # read once per request, for all the tags in the response
+        if not hasattr(bundle.request, '_tag_item_counts'):
+            bundle.request._tag_item_counts = TagUsage.objects.item_counts()
+        return bundle.request._tag_item_counts.get(bundle.obj.id, 0)
 
     def prepend_urls(self):
         return [
@@ -204,3 +209,65 @@ class TagResource(BaseResource):
             'tag', flat=True)
         tags = Tag.objects.filter(id__in=tags_ids)
         return self._create_response(request, tags)
+
+
+class SearchHit(object):
+    def __init__(self, result):
+        self.kind = result.kind
+        self.id = result.object.pk
+        self.score = result.score
+        self.title = unicode(result.object)
+        self.url = result.url
+        self.snippet = result.snippet
+
+
+class SearchHits(object):
+    """The results of a query, searched for page by page by the paginator"""
+
+    def __init__(self, query, kinds):
+        self.query = query
+        self.kinds = kinds
+        self._total = None
+
+    def count(self):
+        if self._total is None:
+            self._total = site_search.search(self.query, self.kinds, limit=0)[0]
+        return self._total
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, page):
+        if not isinstance(page, slice) or page.start is None or page.stop is None:
+            raise TypeError('search hits can only be sliced')
+        self._total, results = site_search.search(self.query, self.kinds, page.stop - page.start, page.start)
+        return [SearchHit(result) for result in results]
+
+
+class SearchResource(BaseNonModelResource):
+    ''' Full text search of protocols, bills, votes and mmm documents.
+        use ?q=<query>, and optionally kind=<kind> (protocol_part,
+        committee_meeting, vote, bill or mmm_document) one or more times
+    '''
+    kind = fields.CharField(attribute='kind')
+    id = fields.IntegerField(attribute='id')
+    score = fields.FloatField(attribute='score')
+    title = fields.CharField(attribute='title')
+    url = fields.CharField(attribute='url')
+    snippet = fields.CharField(attribute='snippet')
+
+    class Meta(BaseNonModelResource.Meta):
+        resource_name = 'search'
+        object_class = SearchHit
+        list_allowed_methods = ['get']
+        detail_allowed_methods = []
+        include_resource_uri = False
+
+    def obj_get_list(self, bundle, **kwargs):
+        query = bundle.request.GET.get('q', '')
+        if not query:
+            raise InvalidFilterError("the q parameter is required")
+        if not site_search.get_search_index().exists():
+            return []
+        kinds = [kind for kind in bundle.request.GET.getlist('kind') if kind in site_search.SEARCH_SOURCES] or None
+        return SearchHits(query, kinds)
@@ -0,0 +1,26 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auxiliary.search import SEARCH_SOURCES, get_search_index, rebuild_search_index
+
+
+class Command(BaseCommand):
+    args = '[kind ...]'
+    help = "Build the full text index of the site search, of all the kinds (%s) unless kinds are given" % (
+        ', '.join(SEARCH_SOURCES))
+
+    option_list = BaseCommand.option_list + (
+        make_option('--optimize', action='store_true', dest='optimize', default=False,
+                    help="only merge the segments of the existing index"),
+    )
+
+    def handle(self, *args, **options):
+        if options['optimize']:
+            get_search_index().optimize()
+            return
+        unknown = set(args) - set(SEARCH_SOURCES)
+        if unknown:
+            raise CommandError('unknown kinds: %s' % ', '.join(sorted(unknown)))
+        for kind, count in rebuild_search_index(list(args) or None).items():
+            self.stdout.write('indexed %d %s' % (count, kind))
@@ -3,6 +3,7 @@ from django.core.management.base import BaseCommand, CommandError
 from optparse import make_option
 from django.conf import settings
 from auxiliary.models import TagSynonym
+from ok_tag.models import deferred_bill_tag_propagation
 from tagging.models import Tag
 from django.db import IntegrityError
 from django.core.exceptions import ValidationError
@@ -21,6 +22,10 @@ class Command(BaseCommand):
     )
     
     def handle(self, *args, **options):
+        with deferred_bill_tag_propagation():
+            self._copy_tagged_items(options)
+
+    def _copy_tagged_items(self, options):
         self._options=options
         for ts in TagSynonym.objects.all():
             if ts.tag!=ts.synonym_tag and ts.synonym_tag.items.count()>0:
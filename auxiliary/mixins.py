@@ -1,7 +1,8 @@
 import csv
 import json
 
-from django.http import HttpResponse, Http404
+from django.db.models.query import QuerySet
+from django.http import HttpResponse, Http404, StreamingHttpResponse
 from django.views.generic import ListView
 from django.views.generic.list import BaseListView
 
@@ -54,8 +55,15 @@ class GetMoreView(ListView):
                             content_type='application/json')
 
 
+class _Echo(object):
+    """A file-like object for csv.writer, whose write returns the line"""
+
+    def write(self, value):
+        return value
+
+
 class CsvView(BaseListView):
-    """A view which generates CSV files with information for a model queryset.
+    """A view which streams CSV files with information for a model queryset.
     Important class members to set when inheriting:
       * model -- the model to display information from.
       * queryset -- the query performed on the model; defaults to all.
@@ -67,30 +75,81 @@ class CsvView(BaseListView):
         The attribute can be a attribute on the CsvView child or the model
         instance itself. If it's a callable it'll be called with (obj, attr)
         for the CsvView attribute or without params for the model attribute.
+      * column_queries -- what the columns read from the database, by
+        attribute: a dict with any of 'select_related', 'prefetch_related'
+        and 'annotate', e.g. {'proposers': {'prefetch_related': ['proposers']}}.
+        These are added to the queryset, so a column does not query per row.
+
+    The objects are read chunk_size at a time, and prepare_chunk can fetch
+    what the columns need for all the objects of a chunk together.
     """
 
     filename = None
     list_display = None
+    column_queries = {}
+    chunk_size = 500
 
     def dispatch(self, request):
         if None in (self.filename, self.list_display, self.model):
             raise Http404()
         self.request = request
-        response = HttpResponse(mimetype='text/csv')
+        response = StreamingHttpResponse(self.iter_csv(), content_type='text/csv')
         response['Content-Disposition'] = \
             'attachment; filename="{}"'.format(self.filename)
-
-        object_list = self.get_queryset()
-        self.prepare_csv_for_utf8(response)
-        writer = csv.writer(response, dialect='excel')
-        writer.writerow([title.encode('utf8')
-                         for _, title in self.list_display])
-        for obj in object_list:
-            row = [self.get_display_attr(obj, attr)
-                   for attr, _ in self.list_display]
-            writer.writerow([unicode(item).encode('utf8') for item in row])
         return response
 
+    def iter_csv(self):
+        writer = csv.writer(_Echo(), dialect='excel')
+        yield self.prepare_csv_for_utf8(_Echo())
+        yield writer.writerow([title.encode('utf8')
+                               for _, title in self.list_display])
+        for chunk in self.iter_chunks(self.get_queryset()):
+            self.prepare_chunk(chunk)
+            for obj in chunk:
+                row = [self.get_display_attr(obj, attr)
+                       for attr, _ in self.list_display]
+                yield writer.writerow([unicode(item).encode('utf8') for item in row])
+
+    def get_column_queryset(self, queryset):
+        """Add the select_related, prefetch_related and annotate of the
+        displayed columns to queryset"""
+        select_related, prefetch_related, annotations = [], [], {}
+        for attr, _ in self.list_display:
+            queries = self.column_queries.get(attr, {})
+            select_related.extend(queries.get('select_related', ()))
+            prefetch_related.extend(queries.get('prefetch_related', ()))
+            annotations.update(queries.get('annotate', {}))
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+        return queryset
+
+    def iter_chunks(self, object_list):
+        """Lists of up to chunk_size objects of object_list, in order.
+
+        The ids of a queryset are read first, and then the objects of each
+        chunk of ids with what their columns need, so the memory used and the
+        number of queries per chunk do not grow with the queryset.
+        """
+        if not isinstance(object_list, QuerySet):
+            object_list = list(object_list)
+            for i in range(0, len(object_list), self.chunk_size):
+                yield object_list[i:i + self.chunk_size]
+            return
+        ids = list(object_list.values_list('pk', flat=True))
+        queryset = self.get_column_queryset(object_list.order_by())
+        for i in range(0, len(ids), self.chunk_size):
+            chunk_ids = ids[i:i + self.chunk_size]
+            objects = dict((obj.pk, obj) for obj in queryset.filter(pk__in=chunk_ids))
+            yield [objects[pk] for pk in chunk_ids if pk in objects]
+
+    def prepare_chunk(self, objects):
+        """Called with each chunk of objects before its rows are written"""
+        pass
+
     def get_display_attr(self, obj, attr):
         """Return the display string for an attr, calling it if necessary."""
         display_attr = getattr(self, attr, None)
@@ -112,4 +171,4 @@ class CsvView(BaseListView):
         When Excel opens a CSV file, it assumes the encoding is ASCII. The BOM
         directs it to decode the file with utf-8.
         """
-        fileobj.write('\xef\xbb\xbf')
\ No newline at end of file
+        return fileobj.write('\xef\xbb\xbf')
\ No newline at end of file
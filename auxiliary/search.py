@@ -0,0 +1,223 @@
+# encoding: utf-8
+'''
+Full text search over the site's own texts, with the index of
+knesset.search_index stored in settings.SEARCH_INDEX_ROOT.
+
+The index is built by the build_search_index command. After it exists,
+saved and deleted objects are indexed by the signal handlers of their apps,
+and protocols are indexed as they are parsed.
+'''
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.models import get_model
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+
+from knesset.search_index import SearchIndex, Tokenizer, snippet
+
+import logging
+
+logger = logging.getLogger("open-knesset.auxiliary.search")
+
+
+class SearchSource(object):
+    """A model whose objects are indexed as documents of a kind"""
+
+    # objects per query when indexing
+    chunk_size = 2000
+
+    def __init__(self, kind, model_name, fields, select_related=(), url_field=None):
+        self.kind = kind
+        self.model_name = model_name
+        self.fields = fields
+        self.select_related = select_related
+        self.url_field = url_field
+
+    @property
+    def model(self):
+        return get_model(*self.model_name.split('.'))
+
+    def text(self, values):
+        return u'\n'.join(value for value in values if value)
+
+    def object_text(self, obj):
+        return self.text([getattr(obj, field) for field in self.fields])
+
+    def object_url(self, obj):
+        return getattr(obj, self.url_field) if self.url_field else obj.get_absolute_url()
+
+    def iter_texts(self, ids=None):
+        """Yield (object id, text) of all the objects, or of the given ids"""
+        queryset = self.model.objects.order_by('pk')
+        if ids is not None:
+            ids = sorted(ids)
+            for i in range(0, len(ids), self.chunk_size):
+                for row in queryset.filter(pk__in=ids[i:i + self.chunk_size]).values_list('pk', *self.fields):
+                    yield row[0], self.text(row[1:])
+            return
+        last_id = None
+        while True:
+            chunk = queryset if last_id is None else queryset.filter(pk__gt=last_id)
+            rows = list(chunk.values_list('pk', *self.fields)[:self.chunk_size])
+            for row in rows:
+                yield row[0], self.text(row[1:])
+            if len(rows) < self.chunk_size:
+                return
+            last_id = rows[-1][0]
+
+    def objects(self, ids):
+        return self.model.objects.select_related(*self.select_related).in_bulk(ids)
+
+
+SEARCH_SOURCES = OrderedDict((source.kind, source) for source in (
+    SearchSource('protocol_part', 'committees.ProtocolPart', ('header', 'body'), select_related=('meeting',)),
+    SearchSource('committee_meeting', 'committees.CommitteeMeeting', ('topics', 'protocol_text'),
+                 select_related=('committee',)),
+    SearchSource('vote', 'laws.Vote', ('title', 'summary', 'full_text')),
+    SearchSource('bill', 'laws.Bill', ('full_title',)),
+    SearchSource('mmm_document', 'mmm.Document', ('title',), url_field='url'),
+))
+
+SOURCES_BY_MODEL = dict((source.model_name.split('.')[1].lower(), source) for source in SEARCH_SOURCES.values())
+
+_indexes = {}
+
+
+def get_search_index():
+    path = settings.SEARCH_INDEX_ROOT
+    if path not in _indexes:
+        # imported here, since ok_tag depends on the models of the indexed apps
+        from ok_tag.tag_suggestions import prefixes
+        _indexes[path] = SearchIndex(path, Tokenizer(prefixes))
+    return _indexes[path]
+
+
+def index_objects(kind, ids=None, writer=None):
+    """Index all the objects of a kind, or the given ids. Returns the number
+    of objects indexed"""
+    source = SEARCH_SOURCES[kind]
+    own_writer = writer is None
+    if own_writer:
+        writer = get_search_index().writer()
+    count = 0
+    indexed_ids = set()
+    for object_id, text in source.iter_texts(ids):
+        writer.add(kind, object_id, text)
+        indexed_ids.add(object_id)
+        count += 1
+    # the given ids that do not exist any more
+    for object_id in set(ids or ()) - indexed_ids:
+        writer.delete(kind, object_id)
+    if own_writer:
+        writer.commit()
+    return count
+
+
+def rebuild_search_index(kinds=None):
+    index = get_search_index()
+    if kinds is None:
+        index.clear()
+    writer = index.writer()
+    counts = OrderedDict()
+    for kind in kinds or SEARCH_SOURCES:
+        counts[kind] = index_objects(kind, writer=writer)
+    writer.commit()
+    index.optimize()
+    return counts
+
+
+class _PendingIndexing(threading.local):
+    def __init__(self):
+        self.depth = 0
+        self.ids = {}  # kind: object ids to index again
+
+
+_pending = _PendingIndexing()
+
+
+@contextmanager
+def deferred_search_indexing():
+    """Index the objects saved or deleted in the block together when the
+    block ends, instead of one by one"""
+    _pending.depth += 1
+    try:
+        yield
+    finally:
+        _pending.depth -= 1
+        if _pending.depth == 0:
+            pending, _pending.ids = _pending.ids, {}
+            if pending:
+                try:
+                    writer = get_search_index().writer()
+                    for kind, ids in pending.items():
+                        index_objects(kind, ids, writer)
+                    writer.commit()
+                except (IOError, OSError):
+                    logger.exception('failed indexing %s', dict((kind, list(ids)) for kind, ids in pending.items()))
+
+
+def reindex(kind, ids):
+    """Index the objects of a kind again, if the index was built"""
+    if not get_search_index().exists():
+        return
+    if _pending.depth:
+        _pending.ids.setdefault(kind, set()).update(ids)
+    else:
+        try:
+            index_objects(kind, ids)
+        except (IOError, OSError):
+            logger.exception('failed indexing %s %s', kind, list(ids))
+
+
+def reindex_instance(sender, instance, raw=False, **kwargs):
+    """post_save and post_delete handler of the indexed models"""
+    if not raw:
+        reindex(SOURCES_BY_MODEL[sender.__name__.lower()].kind, [instance.pk])
+
+
+def reindex_meeting_parts(meeting):
+    """Index the protocol parts of a meeting, e.g. after they were parsed"""
+    # imported here, since committees.models depends on this module
+    from committees.models import ProtocolPart
+    with deferred_search_indexing():
+        reindex('committee_meeting', [meeting.pk])
+        reindex('protocol_part', ProtocolPart.objects.filter(meeting=meeting).values_list('id', flat=True))
+
+
+def snippet_html(pieces):
+    return mark_safe(u''.join(u'<em>%s</em>' % conditional_escape(fragment) if is_match
+                              else conditional_escape(fragment) for fragment, is_match in pieces))
+
+
+class SearchResult(object):
+    def __init__(self, kind, obj, score, snippet):
+        self.kind = kind
+        self.object = obj
+        self.score = score
+        self.snippet = snippet
+
+    @property
+    def url(self):
+        return SEARCH_SOURCES[self.kind].object_url(self.object)
+
+
+def search(query, kinds=None, limit=20, offset=0):
+    """Return (number of matches, [SearchResult]) of the query, best first"""
+    index = get_search_index()
+    total, matches = index.search(query, kinds, limit, offset)
+    ids = {}
+    for kind, object_id, score in matches:
+        ids.setdefault(kind, []).append(object_id)
+    objects = dict((kind, SEARCH_SOURCES[kind].objects(kind_ids)) for kind, kind_ids in ids.items())
+    terms = index.tokenizer.query_terms(query)
+    results = []
+    for kind, object_id, score in matches:
+        obj = objects[kind].get(object_id)
+        if obj is None:  # deleted since it was indexed
+            continue
+        pieces = snippet(index.tokenizer, SEARCH_SOURCES[kind].object_text(obj), terms)
+        results.append(SearchResult(kind, obj, score, snippet_html(pieces)))
+    return total, results
@@ -2,6 +2,7 @@
 from django.test.testcases import TestCase
 
 from auxiliary.mixins import CsvView
+from mks.models import Member, Party
 
 
 class CsvViewTest(TestCase):
@@ -17,12 +18,36 @@ class CsvViewTest(TestCase):
         list_display = (("value", "value"),
                         ("squared", "squared"))
 
+    class MemberCsvView(CsvView):
+        model = Member
+        filename = 'members.csv'
+        chunk_size = 2
+        list_display = (("name", "name"),
+                        ("party_name", "party"))
+        column_queries = {'party_name': {'select_related': ['current_party']}}
+
+        def party_name(self, member, attr):
+            return member.current_party.name
+
+        def get_queryset(self):
+            return Member.objects.order_by('-name')
+
     def test_csv_view(self):
         view = self.ConcreteCsvView()
         view.model = self.TestModel
         view.queryset = [self.TestModel(2), self.TestModel(3)]
         response = view.dispatch(None)
-        rows = response.content.splitlines()
+        rows = ''.join(response.streaming_content).splitlines()
         self.assertEqual(len(rows), 3)
         self.assertEqual(rows[1], '2,4')
-        self.assertEqual(rows[2], '3,9')
\ No newline at end of file
+        self.assertEqual(rows[2], '3,9')
+
+    def test_queryset_chunks(self):
+        party = Party.objects.create(name='party')
+        for name in 'abcde':
+            Member.objects.create(name=name, current_party=party)
+        response = self.MemberCsvView().dispatch(None)
+        # the ids, and one query for each chunk of 2 members with their party
+        with self.assertNumQueries(4):
+            rows = ''.join(response.streaming_content).splitlines()
+        self.assertEqual(rows[1:], ['e,party', 'd,party', 'c,party', 'b,party', 'a,party'])
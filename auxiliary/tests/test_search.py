@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*
+import datetime
+import shutil
+import tempfile
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from auxiliary import search as site_search
+from knesset.search_index import IndexWriter, SearchIndex, Tokenizer, snippet
+from laws.models import Vote, Bill
+
+
+class SearchIndexTest(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.index = SearchIndex(self.path, Tokenizer([u'ב', u'ה', u'ו']), max_segments=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_search(self):
+        writer = self.index.writer(buffer_size=2)
+        writer.add('vote', 1, u'חוק התקציב')
+        writer.add('vote', 2, u'תקציב המדינה ותקציב הביטחון')
+        writer.add('vote', 3, u'חוק החינוך')
+        writer.add('bill', 1, u'הצעת חוק התקציב')
+        writer.commit()
+        # merged down to max_segments
+        self.assertEqual(len(self.index.segments()), 2)
+
+        total, results = self.index.search(u'תקציב', kinds=['vote'])
+        self.assertEqual(total, 2)
+        # the vote that mentions the word more is first
+        self.assertEqual([(kind, object_id) for kind, object_id, score in results], [('vote', 2), ('vote', 1)])
+        self.assertEqual(self.index.search(u'חוק תקציב')[0], 2)
+        self.assertEqual(self.index.search(u'חוק תקציב', limit=1, offset=1)[1],
+                         self.index.search(u'חוק תקציב')[1][1:])
+
+        writer.delete('vote', 2)
+        writer.add('vote', 3, u'חוק התקציב החדש')
+        writer.commit()
+        self.assertEqual(sorted(object_id for kind, object_id, score in self.index.search(u'תקציב', ['vote'])[1]),
+                         [1, 3])
+        self.index.optimize()
+        self.assertEqual(len(self.index.segments()), 1)
+        self.assertEqual(self.index.search(u'תקציב', ['vote'])[0], 2)
+
+    def test_snippet(self):
+        pieces = snippet(self.index.tokenizer, u'היום דנה הכנסת בחוק התקציב של הממשלה', [u'תקציב'], size=3)
+        self.assertEqual(pieces, [(u'…', False), (u'התקציב', True), (u' של הממשלה', False)])
+
+
+class SiteSearchTest(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.settings_override = override_settings(SEARCH_INDEX_ROOT=self.path)
+        self.settings_override.enable()
+        self.vote = Vote.objects.create(title=u'הצבעה על חוק התקציב', time=datetime.datetime.now())
+        self.bill = Bill.objects.create(stage='1', title=u'חוק החינוך')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.path)
+
+    def test_search(self):
+        site_search.rebuild_search_index()
+        total, results = site_search.search(u'תקציב')
+        self.assertEqual(total, 1)
+        self.assertEqual(results[0].object, self.vote)
+        self.assertIn(u'<em>התקציב</em>', results[0].snippet)
+
+        # saved objects are indexed once the index exists
+        self.bill.title = u'חוק התקציב'
+        self.bill.save()
+        self.assertEqual(site_search.search(u'תקציב', kinds=['bill'])[0], 1)
+        self.vote.delete()
+        self.assertEqual(site_search.search(u'תקציב', kinds=['vote'])[0], 0)
+
+        res = self.client.get(reverse('site-search'), {'q': u'תקציב'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([result.object for result in res.context['results']], [self.bill])
+
+    def test_deferred_indexing_errors_do_not_fail_the_save(self):
+        site_search.rebuild_search_index()
+
+        def fail(writer):
+            raise IOError('no space left on device')
+
+        commit = IndexWriter.commit
+        IndexWriter.commit = fail
+        try:
+            with site_search.deferred_search_indexing():
+                self.bill.title = u'חוק התקציב'
+                self.bill.save()
+        finally:
+            IndexWriter.commit = commit
+        self.assertEqual(Bill.objects.get(id=self.bill.id).title, u'חוק התקציב')
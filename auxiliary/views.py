@@ -17,11 +17,13 @@ from django.views.decorators.http import require_http_methods
 from django.views.generic import TemplateView, DetailView, ListView
 from okscraper_django.models import ScraperRun
 
+from auxiliary import search as site_search
 from auxiliary.constants import COMING_SOON_MAIN_PAGE_EVENTS_TO_FETCH
 from committees.models import CommitteeMeeting
 from events.models import Event
 from laws.models import Vote, Bill
 from mks.models import Member
+from ok_tag.models import TagUsage
 
 from .forms import TidbitSuggestionForm, FeedbackSuggestionForm
 from .models import Tidbit
@@ -61,13 +63,7 @@ def help_page(request):
         context['vote'] = votes[random.randrange(votes.count())]
         context['bill'] = Bill.objects.all()[random.randrange(Bill.objects.count())]
 
-        tags_cloud = cache.get('tags_cloud', None)
-        if not tags_cloud:
-            # TODO: ugly hack, remove this import later, when I figure out why this is even needed here
-            from ok_tag.views import calculate_cloud_from_models
-            tags_cloud = calculate_cloud_from_models(Vote, Bill, CommitteeMeeting)
-            tags_cloud.sort(key=lambda x: x.name)
-            cache.set('tags_cloud', tags_cloud, settings.LONG_CACHE_TIME)
+        tags_cloud = TagUsage.objects.cloud([Vote, Bill, CommitteeMeeting])
         context['tags'] = random.sample(tags_cloud,
                                         min(len(tags_cloud), 8)
                                         ) if tags_cloud else None
@@ -188,6 +184,9 @@ def post_annotation(request):
         return HttpResponseForbidden(_("Sorry, you do not have the permission to annotate."))
 
 
+SEARCH_RESULTS_PER_PAGE = 20
+
+
 def search(request, lang='he'):
     # remove the 'cof' get variable from the query string so that the page
     # linked to by the javascript fallback doesn't think its inside an iframe.
@@ -195,13 +194,34 @@ def search(request, lang='he'):
     if 'cof' in mutable_get:
         del mutable_get['cof']
 
-    return render_to_response('search/search.html', RequestContext(request, {
+    context = {
         'query': request.GET.get('q'),
         'query_string': mutable_get.urlencode(),
         'has_search': True,
         'lang': lang,
         'cx': settings.GOOGLE_CUSTOM_SEARCH,
-    }))
+    }
+    # search the local index when it was built, google otherwise
+    if context['query'] and site_search.get_search_index().exists():
+        kinds = [kind for kind in request.GET.getlist('kind') if kind in site_search.SEARCH_SOURCES] or None
+        try:
+            page = max(1, int(request.GET.get('page', 1)))
+        except ValueError:
+            page = 1
+        total, results = site_search.search(context['query'], kinds, SEARCH_RESULTS_PER_PAGE,
+                                            (page - 1) * SEARCH_RESULTS_PER_PAGE)
+        page_query = request.GET.copy()
+        page_query.pop('page', None)
+        context.update({
+            'local_search': True,
+            'results': results,
+            'total': total,
+            'page': page,
+            'previous_page': page - 1 if page > 1 else None,
+            'next_page': page + 1 if page * SEARCH_RESULTS_PER_PAGE < total else None,
+            'page_query_string': page_query.urlencode(),
+        })
+    return render_to_response('search/search.html', RequestContext(request, context))
 
 
 def post_details(request, post_id):
@@ -1,4 +1,4 @@
-from django.db.models.signals import post_save,m2m_changed, pre_delete
+from django.db.models.signals import post_save,m2m_changed, pre_delete, post_delete
 from django.contrib.comments.signals import comment_was_posted
 from django.contrib.comments.models import Comment
 from django.contrib.contenttypes.models import ContentType
@@ -6,9 +6,14 @@ from planet.models import Feed, Post
 from actstream import action, follow
 from actstream.models import Action, Follow
 from annotatetext.models import Annotation
+from django.core.cache import cache
+from django.db.models import Q
+from auxiliary.search import reindex_instance
+from knesset.cache_invalidation import invalidated_by
 from knesset.utils import disable_for_loaddata
 from mks.models import Member
-from models import CommitteeMeeting, Topic
+from ok_tag.models import count_participants_activity
+from models import Committee, CommitteeMeeting, ProtocolPart, Topic, committee_detail_cache_keys
 
 cm_ct = None
 member_ct = None
@@ -54,6 +59,11 @@ def record_committee_presence(**kwargs):
                                  target_content_type=cm_ct).count()==0:
             action.send(m, verb='attended', target=meeting, description='committee meeting', timestamp=meeting.date)
 m2m_changed.connect(record_committee_presence, sender=CommitteeMeeting.mks_attended.through)
+m2m_changed.connect(count_participants_activity, sender=CommitteeMeeting.mks_attended.through)
+
+for indexed_model in (CommitteeMeeting, ProtocolPart):
+    post_save.connect(reindex_instance, sender=indexed_model)
+    post_delete.connect(reindex_instance, sender=indexed_model)
 
 @disable_for_loaddata
 def handle_annotation_save(sender, created, instance, **kwargs):
@@ -95,3 +105,59 @@ def delete_related_activities(sender, instance, **kwargs):
     Action.objects.filter(target_object_id=instance.id, verb__in=('annotated', 'comment-added')).delete()
 pre_delete.connect(delete_related_activities, sender=Annotation)
 pre_delete.connect(delete_related_activities, sender=Comment)
+
+
+@invalidated_by(Committee)
+def committee_cache_keys(instance):
+    return ['committee_%d_name' % instance.id] + committee_detail_cache_keys(instance.id)
+
+
+@invalidated_by(CommitteeMeeting)
+def committee_meeting_cache_keys(instance):
+    return committee_detail_cache_keys(instance.committee_id)
+
+
+@invalidated_by(Member)
+def member_committees_cache_keys(instance):
+    keys = []
+    for committee_id in Committee.objects.filter(
+            Q(members=instance) | Q(chairpersons=instance) | Q(replacements=instance)).values_list(
+            'id', flat=True).distinct():
+        keys.extend(committee_detail_cache_keys(committee_id))
+    return keys
+
+
+def committee_members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """m2m_changed handler of the members, chairpersons and replacements of
+    committees. The rows are written after the post_save of an admin save,
+    so the cached pages are deleted again once they are."""
+    if action not in ('post_add', 'post_remove', 'pre_clear', 'post_clear'):
+        return
+    if not reverse:
+        keys = committee_detail_cache_keys(instance.id)
+    elif pk_set:
+        keys = [key for committee_id in pk_set for key in committee_detail_cache_keys(committee_id)]
+    else:
+        # a member's committees are cleared, they are still there on pre_clear
+        keys = member_committees_cache_keys(instance)
+    if keys:
+        cache.delete_many(keys)
+for committee_members in (Committee.members, Committee.chairpersons, Committee.replacements):
+    m2m_changed.connect(committee_members_changed, sender=committee_members.through)
+
+
+def meeting_attendance_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """m2m_changed handler of the members attending committee meetings"""
+    if action not in ('post_add', 'post_remove', 'pre_clear', 'post_clear'):
+        return
+    if not reverse:
+        committee_ids = [instance.committee_id]
+    else:
+        meetings = CommitteeMeeting.objects.all()
+        # a member's meetings are cleared, they are still there on pre_clear
+        meetings = meetings.filter(id__in=pk_set) if pk_set else meetings.filter(mks_attended=instance)
+        committee_ids = set(meetings.values_list('committee_id', flat=True))
+    keys = [key for committee_id in committee_ids for key in committee_detail_cache_keys(committee_id)]
+    if keys:
+        cache.delete_many(keys)
+m2m_changed.connect(meeting_attendance_changed, sender=CommitteeMeeting.mks_attended.through)
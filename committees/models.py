@@ -19,7 +19,7 @@ from events.models import Event
 from links.models import Link
 from mks.models import Knesset
 from lobbyists.models import LobbyistCorporation
-from itertools import groupby
+from itertools import groupby, product
 from hebrew_numbers import gematria_to_int
 from mks.utils import get_all_mk_names
 from knesset_data.protocols.committee import \
@@ -30,6 +30,21 @@ COMMITTEE_PROTOCOL_PAGINATE_BY = 120
 
 logger = logging.getLogger("open-knesset.committees.models")
 
+# waffle flags that change the committee page, and so are part of its cache key
+COMMITTEE_DETAIL_FLAGS = ('show_member_presence',)
+
+
+def committee_detail_cache_key(committee_id, flags):
+    """Cache key of the committee page context, flags are the states of
+    COMMITTEE_DETAIL_FLAGS"""
+    return 'committee_detail_%d_%s' % (committee_id, ''.join('1' if flag else '0' for flag in flags))
+
+
+def committee_detail_cache_keys(committee_id):
+    """Cache keys of the committee page context for all the flag states"""
+    return [committee_detail_cache_key(committee_id, flags)
+            for flags in product((False, True), repeat=len(COMMITTEE_DETAIL_FLAGS))]
+
 
 class Committee(models.Model):
     name = models.CharField(max_length=256)
@@ -276,7 +291,11 @@ class CommitteeMeeting(models.Model):
 
     def create_protocol_parts(self, delete_existing=False, mks=None, mk_names=None):
         from knesset_data_django.committees.meetings import create_protocol_parts
-        create_protocol_parts(self, delete_existing, mks, mk_names)
+        from auxiliary.search import deferred_search_indexing, reindex_meeting_parts
+        with deferred_search_indexing():
+            create_protocol_parts(self, delete_existing, mks, mk_names)
+            # the parts may be created without signals
+            reindex_meeting_parts(self)
 
     def redownload_protocol(self):
         from knesset_data_django.committees.meetings import redownload_protocol
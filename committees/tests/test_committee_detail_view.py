@@ -13,7 +13,8 @@ from waffle import testutils as waffle_testutils
 from committees.tests.base import BaseCommitteeTestCase
 from laws.models import Bill
 from mks.models import Member, Knesset
-from committees.models import Committee, CommitteeMeeting, Topic
+from committees.models import Committee, CommitteeMeeting, Topic, committee_detail_cache_key
+from knesset.cache_invalidation import keys_for_instance
 
 just_id = lambda x: x.id
 APP = 'committees'
@@ -203,3 +204,9 @@ I have a deadline''')
 
         self.verify_presence_data_in_response(res,
                                               is_expected_in_response=False)
+
+    def test_committee_cache_keys_are_invalidated_by_meeting_save(self):
+        keys = keys_for_instance(self.meeting_1)
+        for flags in ((False,), (True,)):
+            self.assertIn(committee_detail_cache_key(self.committee_1.id, flags), keys)
+        self.assertNotIn(committee_detail_cache_key(self.committee_2.id, (False,)), keys)
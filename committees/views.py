@@ -2,7 +2,6 @@
 import colorsys
 import datetime
 import difflib
-import itertools
 import json
 import logging
 import re
@@ -12,6 +11,7 @@ import waffle
 import tagging
 from actstream import action
 from django.contrib import messages
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.contenttypes.models import ContentType
 from django.core.cache import cache
@@ -26,7 +26,7 @@ from django.utils.decorators import method_decorator
 from django.utils.translation import ugettext_lazy, ugettext as _
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.views.generic import DetailView, ListView
-from tagging.models import TaggedItem, Tag
+from tagging.models import TaggedItem
 
 import models
 import ok_tag.tag_suggestions
@@ -40,7 +40,9 @@ from lobbyists.models import Lobbyist
 from mks.models import Member
 from mks.utils import get_all_mk_names
 from mmm.models import Document
-from models import Committee, CommitteeMeeting, Topic
+from models import (Committee, CommitteeMeeting, Topic, COMMITTEE_DETAIL_FLAGS,
+                    committee_detail_cache_key)
+from ok_tag.models import TagUsage
 from ok_tag.views import BaseTagMemberListView
 from knesset_data_django.committees import members_by_presence
 
@@ -55,7 +57,7 @@ class CommitteeListView(ListView):
 
     def get_context_data(self, **kwargs):
         context = super(CommitteeListView, self).get_context_data(**kwargs)
-        context['tags_cloud'] = Tag.objects.cloud_for_model(CommitteeMeeting)
+        context['tags_cloud'] = TagUsage.objects.cloud([CommitteeMeeting])
         if waffle.flag_is_active(self.request, 'show_committee_topics'):
             context = self._add_topics_to_context(context)
 
@@ -84,7 +86,6 @@ class CommitteeDetailView(DetailView):
     queryset = Committee.objects.prefetch_related('members', 'chairpersons',
                                                   'replacements', 'events',
                                                   'meetings', ).all()
-    view_cache_key = 'committee_detail_%d'
     SEE_ALL_THRESHOLD = 10
 
     def get_context_data(self, *args, **kwargs):
@@ -93,12 +94,33 @@ class CommitteeDetailView(DetailView):
         cm.sorted_mmm_documents = cm.mmm_documents.order_by(
             '-publication_date')[:self.SEE_ALL_THRESHOLD]
 
-        cached_context = cache.get(self.view_cache_key % cm.id, {})
+        # the cached context is deleted when the committee, its meetings or
+        # its members change, see committees.listeners
+        flags = [waffle.flag_is_active(self.request, flag) for flag in COMMITTEE_DETAIL_FLAGS]
+        cache_key = committee_detail_cache_key(cm.id, flags)
+        cached_context = cache.get(cache_key, {})
         if not cached_context:
             self._build_context_data(cached_context, cm)
-            # cache.set('committee_detail_%d' % cm.id, cached_context,
-            #           settings.LONG_CACHE_TIME)
+            cache.set(cache_key, cached_context, settings.LONG_CACHE_TIME)
         context.update(cached_context)
+        # the links, the meetings relative to now, the annotations and the
+        # topics change without invalidating the cached context
+        Link.objects.attach_links(context['members'])
+        future_meetings, more_future_meetings_available = cm.future_meetings(
+            limit=self.SEE_ALL_THRESHOLD)
+        context['future_meetings_list'] = future_meetings
+        context[
+            'more_future_meetings_available'] = more_future_meetings_available
+        cur_date = datetime.datetime.now()
+        not_yet_published_meetings, more_unpublished_available = cm.protocol_not_yet_published_meetings(
+            end_date=cur_date, limit=self.SEE_ALL_THRESHOLD)
+        context[
+            'protocol_not_yet_published_list'] = not_yet_published_meetings
+        context[
+            'more_unpublished_available'] = more_unpublished_available
+        context['annotations'] = cm.annotations.order_by('-timestamp')
+        if waffle.flag_is_active(self.request, 'show_committee_topics'):
+            context['topics'] = cm.topic_set.summary()[:5]
 
         return context
 
@@ -111,35 +133,13 @@ class CommitteeDetailView(DetailView):
             members = members_by_presence(cm, current_only=True)
         else:
             cached_context['show_member_presence'] = False
-            members = cm.members_by_name(current_only=True)
-
-        links = list(Link.objects.for_model(Member))
-        links_by_member = {}
-        for k, g in itertools.groupby(links, lambda x: x.object_pk):
-            links_by_member[str(k)] = list(g)
-        for member in members:
-            member.cached_links = links_by_member.get(str(member.pk), [])
+            members = list(cm.members_by_name(current_only=True))
+
         cached_context['members'] = members
         recent_meetings, more_meetings_available = cm.recent_meetings(
             limit=self.SEE_ALL_THRESHOLD)
         cached_context['meetings_list'] = recent_meetings
         cached_context['more_meetings_available'] = more_meetings_available
-        future_meetings, more_future_meetings_available = cm.future_meetings(
-            limit=self.SEE_ALL_THRESHOLD)
-        cached_context['future_meetings_list'] = future_meetings
-        cached_context[
-            'more_future_meetings_available'] = more_future_meetings_available
-        cur_date = datetime.datetime.now()
-        not_yet_published_meetings, more_unpublished_available = cm.protocol_not_yet_published_meetings(
-            end_date=cur_date, limit=self.SEE_ALL_THRESHOLD)
-        cached_context[
-            'protocol_not_yet_published_list'] = not_yet_published_meetings
-        cached_context[
-            'more_unpublished_available'] = more_unpublished_available
-        cached_context['annotations'] = cm.annotations.order_by('-timestamp')
-        if waffle.flag_is_active(self.request, 'show_committee_topics'):
-            cached_context['topics'] = cm.topic_set.summary()[:5]
-
 
 
 class MeetingDetailView(DetailView):
@@ -241,12 +241,7 @@ class MeetingDetailView(DetailView):
             members = cm.mks_attended.order_by('name')
             context['show_member_presence'] = False
 
-        links = list(Link.objects.for_model(Member))
-        links_by_member = {}
-        for k, g in itertools.groupby(links, lambda x: x.object_pk):
-            links_by_member[str(k)] = list(g)
-        for member in members:
-            member.cached_links = links_by_member.get(str(member.pk), [])
+        Link.objects.attach_links(members)
         context['members'] = members
 
         meeting_text = [cm.topics] + [part.body for part in cm.parts.all()]
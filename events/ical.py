@@ -0,0 +1,122 @@
+# encoding: utf-8
+"""
+iCalendar feeds of the events.
+
+The VEVENT block of each event is rendered once and cached by the event's pk
+and version, which every save changes, and the feeds are concatenations of
+these blocks. Which events are in the feed of a committee, a member or a
+person is read from one cached index of all the events, which is deleted
+whenever an event, its persons or a person change, so serving a feed reads
+the database only to render the events that are not cached. Events changed
+with QuerySet.update() should get a new version and invalidate_for_instances,
+like other bulk writes.
+"""
+import hashlib
+from collections import defaultdict, namedtuple
+from datetime import datetime
+
+import vobject
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+
+from events.models import Event
+
+EVENT_INDEX_CACHE_KEY = 'events_ical_index'
+
+# what vobject writes around the components of an iCalendar
+CALENDAR_HEADER = 'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//PYVOBJECT//NONSGML Version 1//EN\r\n'
+CALENDAR_FOOTER = 'END:VCALENDAR\r\n'
+
+IndexedEvent = namedtuple('IndexedEvent', 'pk when version committee_id person_ids member_ids')
+
+
+class EventIndex(object):
+    """The events ordered by time with what the feeds select them by"""
+
+    def __init__(self, events, built):
+        self.events = events
+        self.built = built
+
+    def select(self, committee_id=None, member_id=None, person_id=None, future_only=True, now=None):
+        """The events of a feed, and when the feed last changed: when the
+        index was built, or when its last past event started"""
+        events = [event for event in self.events
+                  if (committee_id is None or event.committee_id == committee_id) and
+                  (member_id is None or member_id in event.member_ids) and
+                  (person_id is None or person_id in event.person_ids)]
+        modified = self.built
+        if future_only:
+            now = now or datetime.now()
+            past = [event for event in events if event.when <= now]
+            if past:
+                modified = max(modified, past[-1].when)
+            events = events[len(past):]
+        return events, modified
+
+
+def build_event_index():
+    committee_type = ContentType.objects.get_by_natural_key('committees', 'committee')
+    person_ids = defaultdict(set)
+    member_ids = defaultdict(set)
+    for event_id, person_id, member_id in Event.who.through.objects.values_list('event', 'person', 'person__mk'):
+        person_ids[event_id].add(person_id)
+        if member_id is not None:
+            member_ids[event_id].add(member_id)
+    events = []
+    for pk, when, version, which_type_id, which_pk in Event.objects.order_by('when', 'id').values_list(
+            'id', 'when', 'version', 'which_type', 'which_pk'):
+        committee_id = None
+        if which_type_id == committee_type.id and which_pk and which_pk.isdigit():
+            committee_id = int(which_pk)
+        events.append(IndexedEvent(pk, when, version, committee_id,
+                                   frozenset(person_ids[pk]), frozenset(member_ids[pk])))
+    return EventIndex(events, datetime.now())
+
+
+def get_event_index():
+    index = cache.get(EVENT_INDEX_CACHE_KEY)
+    if index is None:
+        index = build_event_index()
+        cache.set(EVENT_INDEX_CACHE_KEY, index, settings.LONG_CACHE_TIME)
+    return index
+
+
+def vevent_cache_key(pk, version, summary_length):
+    return 'events_vevent_%d_%d_%d' % (pk, version, summary_length)
+
+
+def render_vevent(event, summary_length):
+    """The serialized VEVENT block of an event"""
+    cal = vobject.iCalendar()
+    event.add_vevent_to_ical(cal, summary_length=summary_length)
+    text = cal.serialize()
+    if isinstance(text, unicode):
+        text = text.encode('utf8')
+    start = text.index('BEGIN:VEVENT')
+    end = text.index('\n', text.index('END:VEVENT')) + 1
+    return text[start:end]
+
+
+def feed_etag(events, summary_length):
+    digest = hashlib.md5(str(summary_length))
+    for event in events:
+        digest.update(vevent_cache_key(event.pk, event.version, summary_length))
+    return digest.hexdigest()
+
+
+def render_feed(events, summary_length):
+    """The iCalendar of the indexed events, from the cached blocks"""
+    keys = dict((vevent_cache_key(event.pk, event.version, summary_length), event.pk) for event in events)
+    blocks = dict((keys[key], block) for key, block in cache.get_many(keys.keys()).items())
+    missing = [event.pk for event in events if event.pk not in blocks]
+    rendered = {}
+    for i in range(0, len(missing), 500):
+        for event in Event.objects.filter(pk__in=missing[i:i + 500]):
+            block = render_vevent(event, summary_length)
+            rendered[vevent_cache_key(event.pk, event.version, summary_length)] = block
+            blocks[event.pk] = block
+    if rendered:
+        cache.set_many(rendered, settings.LONG_CACHE_TIME)
+    return ''.join([CALENDAR_HEADER] + [blocks[event.pk] for event in events if event.pk in blocks] +
+                   [CALENDAR_FOOTER])
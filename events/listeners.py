@@ -0,0 +1,17 @@
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed
+
+from knesset.cache_invalidation import invalidated_by
+from persons.models import Person
+from ical import EVENT_INDEX_CACHE_KEY
+from models import Event
+
+
+@invalidated_by(Event, Person)
+def event_index_cache_keys(instance):
+    return [EVENT_INDEX_CACHE_KEY]
+
+
+def event_persons_changed(sender, **kwargs):
+    cache.delete(EVENT_INDEX_CACHE_KEY)
+m2m_changed.connect(event_persons_changed, sender=Event.who.through)
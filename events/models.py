@@ -55,6 +55,8 @@ class Event(models.Model):
     cancelled = models.BooleanField(default=False)
     update_date = models.DateTimeField(blank=True, null=True)
     link = models.URLField(blank=True, null=True)
+    # changed on every save, the calendar feeds cache the rendered events by it
+    version = models.PositiveIntegerField(default=0)
 
     objects = EventManager()
 
@@ -75,30 +77,44 @@ class Event(models.Model):
     def get_absolute_url(self):
         return ('event-detail', [str(self.id)])
 
+    def save(self, **kwargs):
+        if not self.when_over:
+            # the end of the meeting is not always known, guess it
+            self.when_over = self.when + timedelta(hours=2)
+            self.when_over_guessed = True
+        self.version += 1
+        super(Event, self).save(**kwargs)
+
     def add_vevent_to_ical(self, cal, summary_length):
         """
         adds itself as a vevent to @cal.
         cal should be a vobject.iCalendar
         """
         vevent = cal.add('vevent')
+        # a stable uid, so calendar clients update the event instead of
+        # adding it again
+        vevent.add('uid').value = 'event-%s@oknesset.org' % self.pk
+        if self.update_date:
+            vevent.add('dtstamp').value = self.update_date
         vevent.add('dtstart').value = self.when
         warnings = []
-        if not self.when_over:
-            # this can happen if you migrated so you have when_over but
-            # have not run parse_future_committee_meetings yet.
-            self.when_over = self.when + timedelta(hours=2)
-            self.when_over_guessed = True
-            self.save()
-        if self.when_over_guessed:
+        # events saved before when_over was added may still miss it
+        when_over = self.when_over or self.when + timedelta(hours=2)
+        if self.when_over_guessed or not self.when_over:
             warnings.append(ugettext('no end date data - guessed it to be 2 hours after start'))
         # TODO: add `geo` to the Event model
         # FLOAT:FLOAT lon:lat, up to 6 digits, degrees.
         vevent.add('geo').value = '31.777067;35.205495'
         vevent.add('x-pk').value = str(self.pk)
-        vevent.add('dtend').value = self.when_over
+        vevent.add('dtend').value = when_over
         vevent.add('summary').value = self.get_summary(summary_length)
         vevent.add('location').value = self.where
+        description = self.what
         if warnings:
-            self.what = '\n'.join((self.what, '', ugettext('oknesset warnings:'), ''))
-            self.what += '\n'.join(warnings)
-        vevent.add('description').value = self.what
+            description = '\n'.join((self.what, '', ugettext('oknesset warnings:'), ''))
+            description += '\n'.join(warnings)
+        vevent.add('description').value = description
+
+
+# force signal connections
+from listeners import *
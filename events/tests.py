@@ -14,8 +14,11 @@ import vobject
 from django.test import TestCase
 from django.utils import translation
 from django.core.urlresolvers import reverse
+from django.db.models import F
 
+from knesset.cache_invalidation import invalidate_for_instances
 from models import Event
+from persons.models import Person
 
 
 class ViewTest(TestCase):
@@ -37,6 +40,39 @@ class ViewTest(TestCase):
         self.assertEqual(res.context['in_hours'], 2)
         self.assertEqual(res.context['in_minutes'], 33)
 
+    def testICalendar(self):
+        # events saved before when_over was added are not changed by the feed
+        Event.objects.filter(pk=self.ev3.pk).update(when_over=None, version=F('version') + 1)
+        invalidate_for_instances([self.ev3])
+        res = self.client.get(reverse('event-icalendar'))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Type'], 'text/calendar; charset=utf-8')
+        cal = vobject.readOne(res.content)
+        self.assertEqual(sorted(int(vevent.x_pk.value) for vevent in cal.vevent_list),
+                         sorted([self.ev2.pk, self.ev3.pk]))
+        self.assertIsNone(Event.objects.get(pk=self.ev3.pk).when_over)
+
+        res = self.client.get(reverse('event-icalendar'), HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, 304)
+
+    def testSaveKeepsUpdateDate(self):
+        update_date = datetime.datetime(2015, 1, 1)
+        event = Event.objects.create(when=datetime.datetime.now(), what='scraped', update_date=update_date)
+        version = event.version
+        event.save()
+        event = Event.objects.get(pk=event.pk)
+        self.assertEqual(event.update_date, update_date)
+        self.assertEqual(event.version, version + 1)
+        event.delete()
+
+    def testPersonICalendar(self):
+        person = Person.objects.create(name='person')
+        self.ev3.who.add(person)
+        res = self.client.get(reverse('event-person-icalendar', kwargs={'person_id': person.id}))
+        self.assertEqual(res.status_code, 200)
+        cal = vobject.readOne(res.content)
+        self.assertEqual([int(vevent.x_pk.value) for vevent in cal.vevent_list], [self.ev3.pk])
+
     def tearDown(self):
         self.ev1.delete()
         self.ev2.delete()
@@ -1,8 +1,12 @@
 from django.conf import settings
 from django.conf.urls import url, patterns
-from views import EventDetailView, MoreUpcomingEventsView
+from views import EventDetailView, MoreUpcomingEventsView, icalendar
 
 urlpatterns = patterns('',
     url(r'^(?P<pk>\d+)/$', EventDetailView.as_view(), name='event-detail'),
     url(r'^more_upcoming/$', MoreUpcomingEventsView.as_view(), name='more-upcoming-events'),
+    url(r'^ical/$', icalendar, name='event-icalendar'),
+    url(r'^ical/committee/(?P<committee_id>\d+)/$', icalendar, name='event-committee-icalendar'),
+    url(r'^ical/member/(?P<member_id>\d+)/$', icalendar, name='event-member-icalendar'),
+    url(r'^ical/person/(?P<person_id>\d+)/$', icalendar, name='event-person-icalendar'),
 )
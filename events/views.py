@@ -1,14 +1,14 @@
 # Create your views here.
 
 from datetime import datetime
-import vobject
 
-from django.conf import settings
 from django.http import HttpResponse
+from django.views.decorators.http import condition
 
 from auxiliary.mixins import GetMoreView
 from hashnav.detail import DetailView
 
+from ical import get_event_index, feed_etag, render_feed
 from models import Event
 
 
@@ -40,21 +40,29 @@ class MoreUpcomingEventsView(GetMoreView):
         return Event.objects.get_upcoming()
 
 
-def icalendar(request, summary_length=50, future_only=True):
+def _feed(request, future_only, **filters):
+    # the selection is shared by the etag, the last modified date and the view
+    if not hasattr(request, '_event_feed'):
+        filters = dict((name, int(value)) for name, value in filters.items() if value is not None)
+        request._event_feed = get_event_index().select(future_only=future_only, **filters)
+    return request._event_feed
+
+
+def _feed_etag(request, summary_length=50, future_only=True, **filters):
+    events, _ = _feed(request, future_only, **filters)
+    return feed_etag(events, int(summary_length))
+
+
+def _feed_last_modified(request, summary_length=50, future_only=True, **filters):
+    _, modified = _feed(request, future_only, **filters)
+    return modified
+
+
+@condition(etag_func=_feed_etag, last_modified_func=_feed_last_modified)
+def icalendar(request, summary_length=50, future_only=True, committee_id=None, member_id=None, person_id=None):
     """
-    return a single icalendar file, default to future_only.
+    return a single icalendar file, default to future_only. The events can be
+    limited to the ones of a committee, a member or a person.
     """
-    summary_length = int(summary_length)
-    cal = vobject.iCalendar()
-    now = datetime.now()
-    for e in Event.objects.all():
-        # TODO - use a proper query once I recall the syntax (actually the
-        # implementation of is_future makes this query pretty bad, since it
-        # will execute multiple times - to do this properly I need some sort of
-        # select * from table where start_date > $now, then now is only
-        # calculated once, and this should be log(N) time (assuming an ordered
-        # index on start_date)
-        if future_only and e.when <= now:
-            continue
-        e.add_vevent_to_ical(cal, summary_length=summary_length)
-    return HttpResponse(cal.serialize())
+    events, _ = _feed(request, future_only, committee_id=committee_id, member_id=member_id, person_id=person_id)
+    return HttpResponse(render_feed(events, int(summary_length)), content_type='text/calendar; charset=utf-8')
@@ -0,0 +1,75 @@
+# encoding: utf-8
+"""
+Aho-Corasick keyword matching: finds the occurrences of many keywords in a
+text with a single pass over the text, instead of searching for each
+keyword separately.
+"""
+from collections import deque
+
+
+class KeywordMatcher(object):
+    """Automaton of keywords, each with an associated value.
+
+    >>> matcher = KeywordMatcher([('he', 1), ('she', 2), ('hers', 3)])
+    >>> sorted(matcher.values_in('ushers'))
+    [1, 2, 3]
+    """
+
+    def __init__(self, keywords=()):
+        self._goto = [{}]
+        self._fail = [0]
+        self._keyword_values = [[]]
+        self._values = None
+        for keyword, value in keywords:
+            self.add(keyword, value)
+
+    def add(self, keyword, value=None):
+        """Add a keyword, empty keywords are ignored"""
+        if not keyword:
+            return
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._keyword_values.append([])
+            state = next_state
+        self._keyword_values[state].append(value)
+        self._values = None
+
+    def _build(self):
+        # breadth first, so the failure state of a state is built before it
+        self._values = list(self._keyword_values)
+        queue = deque(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                # keywords ending at the failure state also end here
+                self._values[next_state] = self._values[next_state] + self._values[self._fail[next_state]]
+
+    def iter_matches(self, text):
+        """Yield (end index, value) for every occurrence of a keyword in text"""
+        if self._values is None:
+            self._build()
+        goto, fail, values = self._goto, self._fail, self._values
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for value in values[state]:
+                yield i + 1, value
+
+    def values_in(self, text):
+        """The values of the keywords that occur in text, without repetitions"""
+        return set(value for end, value in self.iter_matches(text))
@@ -0,0 +1,63 @@
+# encoding: utf-8
+"""
+Invalidation of cached values when the models they are built from change.
+
+A function that returns the cache keys made stale by a changed instance is
+registered for the models the cached values depend on:
+
+    @invalidated_by(VoteAction)
+    def member_page_keys(instance):
+        return [member_fragment_cache_key(instance.member_id, 'stats')]
+
+Saving or deleting an instance of any of these models then deletes the
+keys, so cached values can live long without being served stale.
+"""
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+
+import logging
+
+logger = logging.getLogger("open-knesset.cache_invalidation")
+
+_key_functions = defaultdict(list)
+
+
+def invalidated_by(*models):
+    """Register the decorated function as returning the cache keys that a
+    saved or deleted instance of models invalidates"""
+
+    def register(func):
+        for model in models:
+            if model not in _key_functions:
+                post_save.connect(invalidate_for_instance, sender=model, dispatch_uid='cache_invalidation')
+                post_delete.connect(invalidate_for_instance, sender=model, dispatch_uid='cache_invalidation')
+            _key_functions[model].append(func)
+        return func
+
+    return register
+
+
+def keys_for_instance(instance):
+    keys = set()
+    for func in _key_functions.get(instance.__class__, []):
+        keys.update(func(instance))
+    return keys
+
+
+def invalidate_for_instance(sender, instance, **kwargs):
+    keys = keys_for_instance(instance)
+    if keys:
+        logger.debug('invalidating %d cache keys for %s %s', len(keys), sender.__name__, instance.pk)
+        cache.delete_many(list(keys))
+
+
+def invalidate_for_instances(instances):
+    """Delete the cache keys of instances changed without sending signals,
+    e.g. by QuerySet.update()"""
+    keys = set()
+    for instance in instances:
+        keys.update(keys_for_instance(instance))
+    if keys:
+        cache.delete_many(list(keys))
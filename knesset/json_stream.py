@@ -0,0 +1,110 @@
+# encoding: utf-8
+"""
+Reading of large JSON files without loading them whole: the items of chosen
+arrays are decoded one at a time as the file is read.
+
+    >>> from StringIO import StringIO
+    >>> f = StringIO('{"meta": {"v": 2}, "objects": {"docs": [{"id": 1}, {"id": 2}]}}')
+    >>> for path, value in iter_json(f, [('objects', 'docs')]):
+    ...     print '.'.join(path), value
+    meta {u'v': 2}
+    objects.docs {u'id': 1}
+    objects.docs {u'id': 2}
+"""
+import codecs
+import json
+import re
+
+_WHITESPACE = re.compile(r'\s*')
+_DELIMITERS = u' \t\r\n,:]}'
+
+
+class _Reader(object):
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = u''
+        self.position = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+        # a character may be split between chunks
+        self.text_decoder = codecs.getincrementaldecoder('utf8')()
+
+    def fill(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+        if isinstance(chunk, str):
+            chunk = self.text_decoder.decode(chunk, final=self.eof)
+        # drop what was already read
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+
+    def peek(self):
+        """The next character that is not whitespace"""
+        while True:
+            self.position = _WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if self.eof:
+                raise ValueError('unexpected end of JSON')
+            self.fill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError('expected %r at %d of the buffer' % (char, self.position))
+        self.position += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except ValueError:
+                if self.eof:
+                    raise
+            else:
+                # a number may go on in the next chunk
+                if self.eof or (end < len(self.buffer) and self.buffer[end] in _DELIMITERS):
+                    self.position = end
+                    return value
+            self.fill()
+
+
+def _iter_value(reader, path, stream_paths):
+    if path in stream_paths and reader.peek() == '[':
+        reader.position += 1
+        if reader.peek() == ']':
+            reader.position += 1
+            return
+        while True:
+            yield path, reader.value()
+            if reader.peek() == ']':
+                reader.position += 1
+                return
+            reader.expect(',')
+    elif any(stream_path[:len(path)] == path for stream_path in stream_paths) and reader.peek() == '{':
+        reader.expect('{')
+        if reader.peek() == '}':
+            reader.position += 1
+            return
+        while True:
+            key = reader.value()
+            reader.expect(':')
+            for item in _iter_value(reader, path + (key,), stream_paths):
+                yield item
+            if reader.peek() == '}':
+                reader.position += 1
+                return
+            reader.expect(',')
+    else:
+        yield path, reader.value()
+
+
+def iter_json(f, stream_paths, chunk_size=64 * 1024):
+    """Yield (path, value) pairs of the JSON document in the file f, where path
+    is a tuple of object keys. The items of the arrays at stream_paths are
+    yielded one by one, the other values are yielded whole, along the way to
+    the arrays."""
+    reader = _Reader(f, chunk_size)
+    return _iter_value(reader, (), set(tuple(path) for path in stream_paths))
@@ -0,0 +1,495 @@
+# encoding: utf-8
+"""
+In-process full text index, ranked with BM25.
+
+The index is a directory of immutable segments, each a set of .npy arrays
+that are memory mapped when searched:
+
+    <segment>.terms.npy            utf-8 bytes of the sorted terms
+    <segment>.term_offsets.npy     start of each term in terms, and the end
+    <segment>.postings_offsets.npy start of the postings of each term, and the end
+    <segment>.docs.npy             document numbers of the postings, sorted per term
+    <segment>.tfs.npy              term frequencies of the postings
+    <segment>.keys.npy             key of each document, see document_key()
+    <segment>.lengths.npy          number of words in each document
+    <segment>.deleted.npy          documents deleted or replaced since
+
+segments.json lists the segments and the document kinds. Writers add new
+segments and mark replaced documents as deleted under a lock, and replace
+segments.json atomically, so searches never block. Small segments are
+merged when there are too many of them.
+"""
+from __future__ import division
+
+import errno
+import fcntl
+import heapq
+import json
+import math
+import os
+import re
+import uuid
+from bisect import bisect_left
+from collections import defaultdict, Counter
+from contextlib import contextmanager
+
+import numpy as np
+
+# words, including acronyms such as ח"כ and the hebrew vowel marks
+WORD_RE = re.compile(u'[\\w\u0591-\u05c7]+(?:["\'\u05f3\u05f4][\\w\u0591-\u05c7]+)*', re.UNICODE)
+# vowel and cantillation marks and the quotes of acronyms, removed from words
+STRIP_RE = re.compile(u'[\u0591-\u05c7"\'\u05f3\u05f4]')
+
+# object ids are below 2 ** 40, the kind is in the bits above them
+KIND_SHIFT = 40
+
+SEGMENT_PARTS = ('terms', 'term_offsets', 'postings_offsets', 'docs', 'tfs', 'keys', 'lengths')
+
+
+def document_key(kind_code, object_id):
+    return (kind_code << KIND_SHIFT) | object_id
+
+
+class Tokenizer(object):
+    """Splits texts to normalized words.
+
+    A word that starts with one of the prefixes, e.g. the hebrew ב, ה or ו,
+    is indexed both as is and without the prefix, so searching for a word
+    finds it with or without a prefix.
+    """
+
+    def __init__(self, prefixes=(), min_word_length=2):
+        # longest first, so מה is tried before מ
+        self.prefixes = sorted(set(prefix for prefix in prefixes if prefix), key=len, reverse=True)
+        self.min_word_length = min_word_length
+
+    def normalize(self, word):
+        return STRIP_RE.sub(u'', word).lower()
+
+    def iter_words(self, text):
+        """Yield (start, end, normalized word) of the words in text"""
+        for match in WORD_RE.finditer(text or u''):
+            word = self.normalize(match.group())
+            if word:
+                yield match.start(), match.end(), word
+
+    def word_terms(self, word):
+        terms = [word]
+        for prefix in self.prefixes:
+            if word.startswith(prefix) and len(word) - len(prefix) >= self.min_word_length:
+                terms.append(word[len(prefix):])
+        return terms
+
+    def document_terms(self, text):
+        """Return ({term: frequency}, number of words) of text"""
+        terms = Counter()
+        length = 0
+        for start, end, word in self.iter_words(text):
+            length += 1
+            terms.update(self.word_terms(word))
+        return terms, length
+
+    def query_terms(self, query):
+        """The distinct words of a query, in their order"""
+        terms = []
+        for start, end, word in self.iter_words(query):
+            if word not in terms:
+                terms.append(word)
+        return terms
+
+
+def snippet(tokenizer, text, terms, size=30):
+    """The part of text with the most occurrences of terms, as a list of
+    (fragment, is match) pieces. size is the number of words in the part"""
+    terms = set(terms)
+    words = list(tokenizer.iter_words(text))
+    if not words:
+        return []
+    matches = [i for i, (start, end, word) in enumerate(words)
+               if any(term in terms for term in tokenizer.word_terms(word))]
+    # the window of size words that starts at a match and covers most matches
+    first, best = 0, 0
+    for i, position in enumerate(matches):
+        covered = bisect_left(matches, position + size) - i
+        if covered > best:
+            first, best = position, covered
+    # start a few words before the first match, for context
+    first = max(0, min(first - size // 5, len(words) - size))
+    last = min(len(words), first + size) - 1
+    matched = set(matches)
+    pieces = [(u'…', False)] if first > 0 else []
+    position = words[first][0]
+    for i in range(first, last + 1):
+        start, end, word = words[i]
+        if i in matched:
+            if start > position:
+                pieces.append((text[position:start], False))
+            pieces.append((text[start:end], True))
+            position = end
+    pieces.append((text[position:words[last][1]], False))
+    if last < len(words) - 1:
+        pieces.append((u'…', False))
+    return [(fragment, is_match) for fragment, is_match in pieces if fragment]
+
+
+class _Terms(object):
+    """The sorted terms of a segment as a sequence, for bisect"""
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+
+class Segment(object):
+    def __init__(self, path, name):
+        self.name = name
+        for part in SEGMENT_PARTS:
+            setattr(self, part, np.load(os.path.join(path, '%s.%s.npy' % (name, part)), mmap_mode='r'))
+        deleted_path = os.path.join(path, '%s.deleted.npy' % name)
+        if os.path.exists(deleted_path):
+            self.deleted = np.load(deleted_path)
+        else:
+            self.deleted = np.zeros(len(self.keys), dtype=bool)
+        self.live = ~self.deleted
+        self.doc_count = int(self.live.sum())
+        self.total_length = int(self.lengths[self.live].sum())
+        self.sorted_terms = _Terms(self.terms, self.term_offsets)
+
+    def term_index(self, term):
+        term = term.encode('utf-8')
+        i = bisect_left(self.sorted_terms, term)
+        if i < len(self.sorted_terms) and self.sorted_terms[i] == term:
+            return i
+        return None
+
+    def postings(self, term_index):
+        start, end = self.postings_offsets[term_index], self.postings_offsets[term_index + 1]
+        return self.docs[start:end], self.tfs[start:end]
+
+    def iter_terms(self, tag=None):
+        """Yield (term, tag, term index) of the terms, in order"""
+        for i in range(len(self.sorted_terms)):
+            yield self.sorted_terms[i], tag, i
+
+
+def _write_segment(path, name, postings, keys, lengths):
+    """Write a segment of postings, {term bytes: (docs array, tfs array)}"""
+    terms = sorted(postings)
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    postings_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    for i, term in enumerate(terms):
+        term_offsets[i + 1] = term_offsets[i] + len(term)
+        postings_offsets[i + 1] = postings_offsets[i] + len(postings[term][0])
+    arrays = {
+        'terms': np.frombuffer(b''.join(terms), dtype=np.uint8),
+        'term_offsets': term_offsets,
+        'postings_offsets': postings_offsets,
+        'docs': np.concatenate([postings[term][0] for term in terms] or [np.zeros(0)]).astype(np.int32),
+        'tfs': np.concatenate([postings[term][1] for term in terms] or [np.zeros(0)]).astype(np.int32),
+        'keys': np.asarray(keys, dtype=np.int64),
+        'lengths': np.asarray(lengths, dtype=np.int32),
+    }
+    for part in SEGMENT_PARTS:
+        np.save(os.path.join(path, '%s.%s.npy' % (name, part)), arrays[part])
+
+
+def _save_atomically(file_path, write):
+    tmp_path = '%s.%s.tmp' % (file_path, uuid.uuid4().hex)
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.rename(tmp_path, file_path)
+
+
+class IndexWriter(object):
+    """Adds and deletes documents, which are searchable after commit()"""
+
+    def __init__(self, index, buffer_size=50000):
+        self.index = index
+        self.buffer_size = buffer_size
+        self._reset()
+
+    def _reset(self):
+        self._documents = {}  # key: (terms, length)
+        self._deleted = set()
+
+    def add(self, kind, object_id, text):
+        """Add a document, replacing the one with the same kind and id"""
+        key = document_key(self.index.kind_code(kind), object_id)
+        self._documents[key] = self.index.tokenizer.document_terms(text)
+        self._deleted.add(key)
+        if len(self._documents) >= self.buffer_size:
+            self.commit()
+
+    def delete(self, kind, object_id):
+        key = document_key(self.index.kind_code(kind), object_id)
+        self._documents.pop(key, None)
+        self._deleted.add(key)
+
+    def commit(self):
+        if not self._documents and not self._deleted:
+            return
+        with self.index.lock():
+            manifest = self.index.read_manifest()
+            self.index.delete_keys(manifest, self._deleted)
+            if self._documents:
+                keys = sorted(self._documents)
+                term_docs = defaultdict(list)
+                lengths = []
+                for doc, key in enumerate(keys):
+                    terms, length = self._documents[key]
+                    lengths.append(length)
+                    for term, tf in terms.iteritems():
+                        term_docs[term.encode('utf-8')].append((doc, tf))
+                postings = dict((term, (np.array([doc for doc, tf in docs]), np.array([tf for doc, tf in docs])))
+                                for term, docs in term_docs.iteritems())
+                name = 'segment_%s' % uuid.uuid4().hex
+                _write_segment(self.index.path, name, postings, keys, lengths)
+                manifest['segments'].append(name)
+            self.index.merge_segments(manifest)
+            self.index.write_manifest(manifest)
+        self._reset()
+
+
+class SearchIndex(object):
+    """A full text index of documents, each of a kind (e.g. 'vote') and an
+    integer object id"""
+
+    MANIFEST = 'segments.json'
+
+    # BM25 parameters
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, path, tokenizer=None, max_segments=10):
+        self.path = path
+        self.tokenizer = tokenizer or Tokenizer()
+        self.max_segments = max_segments
+        self._manifest_version = None
+        self._segments = []
+        self._kinds = []
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, self.MANIFEST))
+
+    @contextmanager
+    def lock(self):
+        if not os.path.isdir(self.path):
+            try:
+                os.makedirs(self.path)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        with open(os.path.join(self.path, 'lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read_manifest(self):
+        try:
+            with open(os.path.join(self.path, self.MANIFEST)) as f:
+                return json.load(f)
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return {'kinds': [], 'segments': []}
+
+    def write_manifest(self, manifest):
+        _save_atomically(os.path.join(self.path, self.MANIFEST), lambda f: json.dump(manifest, f))
+
+    def kind_code(self, kind):
+        """The number of a kind of documents, added to the index if needed"""
+        if kind not in self._kinds:
+            self._kinds = self.read_manifest()['kinds']
+        if kind not in self._kinds:
+            with self.lock():
+                manifest = self.read_manifest()
+                if kind not in manifest['kinds']:
+                    manifest['kinds'].append(kind)
+                    self.write_manifest(manifest)
+                self._kinds = manifest['kinds']
+        return self._kinds.index(kind)
+
+    def writer(self, buffer_size=50000):
+        return IndexWriter(self, buffer_size)
+
+    def segments(self):
+        """The current segments, opened again when a writer changed them"""
+        manifest_path = os.path.join(self.path, self.MANIFEST)
+        for attempt in range(3):
+            try:
+                stat = os.stat(manifest_path)
+                # the manifest is replaced by a new file on every change
+                version = (stat.st_ino, stat.st_mtime)
+                if version != self._manifest_version:
+                    manifest = self.read_manifest()
+                    self._segments = [Segment(self.path, name) for name in manifest['segments']]
+                    self._kinds = manifest['kinds']
+                    self._manifest_version = version
+                return self._segments
+            except (IOError, OSError) as e:
+                # a merge removed a segment after the manifest was read
+                if e.errno != errno.ENOENT:
+                    raise
+                if not os.path.exists(manifest_path):
+                    return []
+        raise IOError(errno.ENOENT, 'the index is changing too fast to be read', self.path)
+
+    def delete_keys(self, manifest, keys):
+        """Mark the documents with the given keys as deleted in the segments
+        of manifest"""
+        if not keys:
+            return
+        keys = np.array(sorted(keys), dtype=np.int64)
+        for name in manifest['segments']:
+            segment = Segment(self.path, name)
+            deleted = segment.deleted | np.in1d(segment.keys, keys)
+            if (deleted != segment.deleted).any():
+                _save_atomically(os.path.join(self.path, '%s.deleted.npy' % name),
+                                 lambda f: np.save(f, deleted))
+
+    def merge_segments(self, manifest, force=False):
+        """Merge the smallest segments while there are too many of them, or
+        all of them if force is given"""
+        segments = [Segment(self.path, name) for name in manifest['segments']]
+        if force:
+            to_merge = segments
+        elif len(segments) > self.max_segments:
+            to_merge = sorted(segments, key=lambda segment: segment.doc_count)[:len(segments) - self.max_segments + 1]
+        else:
+            return
+        if len(to_merge) < 2 and not (to_merge and to_merge[0].deleted.any()):
+            return
+
+        # the new document numbers of the live documents of each segment
+        new_docs = []
+        base = 0
+        for segment in to_merge:
+            numbers = np.cumsum(segment.live) - 1 + base
+            new_docs.append(numbers)
+            base += segment.doc_count
+        keys = np.concatenate([segment.keys[segment.live] for segment in to_merge])
+        lengths = np.concatenate([segment.lengths[segment.live] for segment in to_merge])
+
+        postings = {}
+        merged_terms = heapq.merge(*[segment.iter_terms(n) for n, segment in enumerate(to_merge)])
+        current, parts = None, []
+        for term, n, i in merged_terms:
+            if term != current:
+                self._add_merged_postings(postings, current, parts)
+                current, parts = term, []
+            docs, tfs = to_merge[n].postings(i)
+            live = to_merge[n].live[docs]
+            parts.append((new_docs[n][docs[live]], tfs[live]))
+        self._add_merged_postings(postings, current, parts)
+
+        name = 'segment_%s' % uuid.uuid4().hex
+        _write_segment(self.path, name, postings, keys, lengths)
+        merged_names = set(segment.name for segment in to_merge)
+        manifest['segments'] = [segment for segment in manifest['segments'] if segment not in merged_names] + [name]
+        # the merged segments are removed after the new manifest is written
+        self.write_manifest(manifest)
+        for segment_name in merged_names:
+            for part in SEGMENT_PARTS + ('deleted',):
+                try:
+                    os.remove(os.path.join(self.path, '%s.%s.npy' % (segment_name, part)))
+                except OSError as e:
+                    if e.errno != errno.ENOENT:
+                        raise
+
+    def _add_merged_postings(self, postings, term, parts):
+        parts = [(docs, tfs) for docs, tfs in parts if len(docs)]
+        if term is not None and parts:
+            postings[term] = (np.concatenate([docs for docs, tfs in parts]),
+                              np.concatenate([tfs for docs, tfs in parts]))
+
+    def optimize(self):
+        """Merge all the segments into one, without the deleted documents"""
+        with self.lock():
+            manifest = self.read_manifest()
+            self.merge_segments(manifest, force=True)
+            self.write_manifest(manifest)
+
+    def clear(self):
+        """Delete all the documents"""
+        with self.lock():
+            manifest = self.read_manifest()
+            names = manifest['segments']
+            manifest['segments'] = []
+            self.write_manifest(manifest)
+            for name in names:
+                for part in SEGMENT_PARTS + ('deleted',):
+                    path = os.path.join(self.path, '%s.%s.npy' % (name, part))
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def search(self, query, kinds=None, limit=20, offset=0):
+        """Return (number of matches, [(kind, object id, score)]) of the
+        documents that contain all the words of the query, best first"""
+        terms = self.tokenizer.query_terms(query)
+        segments = self.segments() if self.exists() else []
+        if not terms or not segments:
+            return 0, []
+        doc_count = sum(segment.doc_count for segment in segments)
+        if not doc_count:
+            return 0, []
+        average_length = sum(segment.total_length for segment in segments) / doc_count
+        term_indexes = [[segment.term_index(term) for term in terms] for segment in segments]
+        idfs = []
+        for t in range(len(terms)):
+            df = sum(int(segment.postings_offsets[indexes[t] + 1] - segment.postings_offsets[indexes[t]])
+                     for segment, indexes in zip(segments, term_indexes) if indexes[t] is not None)
+            # df counts deleted documents too, until they are merged away
+            df = min(df, doc_count)
+            idfs.append(math.log(1 + (doc_count - df + 0.5) / (df + 0.5)))
+        kind_codes = None
+        if kinds is not None:
+            kind_codes = np.array([self._kinds.index(kind) for kind in kinds if kind in self._kinds], dtype=np.int64)
+
+        total = 0
+        candidates = []
+        for segment, indexes in zip(segments, term_indexes):
+            if None in indexes:
+                continue
+            # intersect the postings, rarest term first
+            order = sorted(range(len(terms)), key=lambda t: segment.postings_offsets[indexes[t] + 1] -
+                           segment.postings_offsets[indexes[t]])
+            docs, scores = None, None
+            for t in order:
+                term_docs, tfs = segment.postings(indexes[t])
+                if docs is None:
+                    docs, tfs = np.asarray(term_docs), np.asarray(tfs)
+                    scores = np.zeros(len(docs))
+                else:
+                    positions = np.searchsorted(term_docs, docs)
+                    positions[positions == len(term_docs)] = 0
+                    found = term_docs[positions] == docs if len(term_docs) else np.zeros(len(docs), dtype=bool)
+                    docs, scores, tfs = docs[found], scores[found], np.asarray(tfs)[positions[found]]
+                lengths = segment.lengths[docs]
+                scores = scores + idfs[t] * tfs * (self.k1 + 1) / (
+                    tfs + self.k1 * (1 - self.b + self.b * lengths / average_length))
+            keep = segment.live[docs]
+            if kind_codes is not None:
+                keep &= np.in1d(segment.keys[docs] >> KIND_SHIFT, kind_codes)
+            docs, scores = docs[keep], scores[keep]
+            total += len(docs)
+            needed = offset + limit
+            if not needed:
+                continue
+            if len(docs) > needed:
+                # the best documents, with all those tied with the last of them
+                lowest = -np.partition(-scores, needed - 1)[needed - 1]
+                best = scores >= lowest
+                docs, scores = docs[best], scores[best]
+            candidates.extend(zip(scores.tolist(), segment.keys[docs].tolist()))
+        candidates.sort(key=lambda candidate: (-candidate[0], candidate[1]))
+        results = [(self._kinds[key >> KIND_SHIFT], key & ((1 << KIND_SHIFT) - 1), score)
+                   for score, key in candidates[offset:offset + limit]]
+        return total, results
@@ -50,6 +50,12 @@ PROJECT_ROOT = os.path.abspath(os.path.join(
 
 DATA_ROOT = os.path.join(PROJECT_ROOT, 'data', '')
 
+# The full text index of the site search, see auxiliary/search.py
+SEARCH_INDEX_ROOT = os.path.join(DATA_ROOT, 'search_index')
+
+# The votes x members matrix of the vote actions, see laws/vote_matrix.py
+VOTE_MATRIX_ROOT = os.path.join(DATA_ROOT, 'vote_matrix')
+
 # Absolute path to the directory that holds media.
 # Example: "/home/media/media.lawrence.com/"
 MEDIA_ROOT = os.path.join(PROJECT_ROOT, 'media', '')
@@ -1,21 +1,26 @@
 # encoding: utf-8
-from django.db.models.signals import m2m_changed, post_save
+from django.db.models.signals import m2m_changed, post_save, post_delete
 from django.contrib.contenttypes.models import ContentType
 from actstream import action
 from actstream.models import Action
 from tagging.models import TaggedItem
 
+from auxiliary.search import reindex_instance
+from knesset.cache_invalidation import invalidated_by
 from knesset.utils import cannonize, disable_for_loaddata
 from laws.models.bill import Bill
 from laws.models.candidate_list_model_statistics import CandidateListVotingStatistics
 from laws.models.member_voting_statistics import MemberVotingStatistics
 from laws.models.party_voting_statistics import PartyVotingStatistics
 from laws.models.proposal import PrivateProposal
+from laws.models.vote import Vote
 from laws.models.vote_action import VoteAction
+from laws.vote_matrix import update_vote_matrix_for_vote_action
 from mks.models import Member, Party
+from mks.utils import member_fragment_cache_keys, member_list_cache_key
 
 from polyorg.models import CandidateList
-from ok_tag.models import add_tags_to_related_objects
+from ok_tag.models import propagate_bill_tags, count_participants_activity, TagMemberActivity
 
 def record_bill_proposal(**kwargs):
     if kwargs['action'] != "post_add":
@@ -52,6 +57,34 @@ post_save.connect(record_vote_action, sender=VoteAction,
                   dispatch_uid='vote_action_record_member')
 
 
+def _count_vote_action_tag_activity(vote_action, sign):
+    try:
+        vote = vote_action.vote
+    except Vote.DoesNotExist:  # deleted with its vote
+        return
+    TagMemberActivity.objects.update_for_participants(vote, [vote_action.member_id], sign)
+
+
+def count_vote_action_tag_activity(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _count_vote_action_tag_activity(instance, 1)
+
+
+def uncount_vote_action_tag_activity(sender, instance, **kwargs):
+    _count_vote_action_tag_activity(instance, -1)
+
+
+post_save.connect(count_vote_action_tag_activity, sender=VoteAction)
+post_delete.connect(uncount_vote_action_tag_activity, sender=VoteAction)
+post_save.connect(update_vote_matrix_for_vote_action, sender=VoteAction)
+post_delete.connect(update_vote_matrix_for_vote_action, sender=VoteAction)
+m2m_changed.connect(count_participants_activity, sender=Bill.proposers.through)
+
+for indexed_model in (Vote, Bill):
+    post_save.connect(reindex_instance, sender=indexed_model)
+    post_delete.connect(reindex_instance, sender=indexed_model)
+
+
 @disable_for_loaddata
 def handle_candiate_list_save(sender, created, instance, **kwargs):
     if instance._state.db == 'default':
@@ -81,7 +114,19 @@ post_save.connect(handle_mk_save, sender=Member)
 
 def add_tags_to_bill_related_objects(sender, instance, **kwargs):
     bill_ct = ContentType.objects.get_for_model(instance)
-    for ti in TaggedItem.objects.filter(content_type=bill_ct, object_id=instance.id):
-        add_tags_to_related_objects(sender, ti, **kwargs)
+    propagate_bill_tags(added=TaggedItem.objects.filter(content_type=bill_ct, object_id=instance.id).values_list(
+        'tag', 'object_id'))
+
+post_save.connect(add_tags_to_bill_related_objects, sender=Bill)
+
+
+@invalidated_by(VoteAction)
+def vote_action_cache_keys(instance):
+    return member_fragment_cache_keys(instance.member_id, ['stats', 'actions']) + [
+        member_list_cache_key('votes'), 'api_v2_member_votes_%d' % instance.member_id]
+
 
-post_save.connect(add_tags_to_bill_related_objects, sender=Bill)
\ No newline at end of file
+@invalidated_by(Bill)
+def bill_cache_keys(instance):
+    return ['debated_bills'] + [member_list_cache_key(stat_type) for stat_type in
+                                ('bills_proposed', 'bills_pre', 'bills_first', 'bills_approved')]
@@ -0,0 +1,11 @@
+from django.core.management.base import NoArgsCommand
+
+from laws.vote_matrix import build_vote_matrix
+
+
+class Command(NoArgsCommand):
+    help = "Build the votes x members matrix of the vote actions, read by the vote exports"
+
+    def handle_noargs(self, **options):
+        matrix = build_vote_matrix()
+        self.stdout.write('%d votes, %d vote actions' % (len(matrix), matrix.nnz()))
@@ -1,16 +1,22 @@
 # encoding: utf-8
 import os, csv
+from collections import defaultdict
 from operator import attrgetter
+from django.contrib.contenttypes.models import ContentType
 from django.core.management.base import NoArgsCommand
 from django.conf import settings
 
-from tagging.models import Tag
+from tagging.models import Tag, TaggedItem
 
 from mks.models import Member
 from laws.models import Vote, Bill
+from laws.vote_matrix import get_vote_matrix
 
 
 class Command(NoArgsCommand):
+    # votes per slice of the vote matrix
+    chunk_size = 1000
+
     def handle_noargs(self, **options):
         mks = Member.objects.order_by('current_party__is_coalition', 'current_party__name') \
             .values('id', 'name', 'current_party__name')
@@ -50,27 +56,24 @@ class Command(NoArgsCommand):
             header.append(tag.id)
         tag_writer.writerow(header)
 
-        for vote in Vote.objects.iterator():
-            row = [vote.id, vote.time, vote.title.encode('utf8')]
-            mks_for = vote.get_voters_id('for')
-            mks_against = vote.get_voters_id('against')
-            for mk in mks:
-                if mk['id'] in mks_for:
-                    row.append(1)
-                elif mk['id'] in mks_against:
-                    row.append(-1)
-                else:
-                    row.append(0)
-            mk_writer.writerow(row)
+        vote_ct = ContentType.objects.get_for_model(Vote)
+        vote_tag_ids = defaultdict(set)
+        for vote_id, tag_id in TaggedItem.objects.filter(content_type=vote_ct).values_list('object_id', 'tag_id'):
+            vote_tag_ids[vote_id].add(tag_id)
+
+        votes = list(Vote.objects.values_list('id', 'time', 'title'))
+        # the for and against votes of the mks are read from the vote matrix
+        matrix = get_vote_matrix([vote[0] for vote in votes])
+        mk_ids = [mk['id'] for mk in mks]
+        for i in range(0, len(votes), self.chunk_size):
+            chunk = votes[i:i + self.chunk_size]
+            mk_votes = matrix.dense([vote[0] for vote in chunk], mk_ids, abstain=0)
+            for (vote_id, vote_time, vote_title), mk_row in zip(chunk, mk_votes):
+                row = [vote_id, vote_time, vote_title.encode('utf8')]
+                mk_writer.writerow(row + mk_row.tolist())
 
-            row = [vote.id, vote.time, vote.title.encode('utf8')]
-            tags = vote.tags
-            for tag in all_tags:
-                if tag in tags:
-                    row.append(1)
-                else:
-                    row.append(0)
-            tag_writer.writerow(row)
+                tag_ids = vote_tag_ids[vote_id]
+                tag_writer.writerow(row + [1 if tag.id in tag_ids else 0 for tag in all_tags])
 
         f.close()
         f2.close()
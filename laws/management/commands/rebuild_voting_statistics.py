@@ -0,0 +1,15 @@
+# encoding: utf-8
+from django.core.management.base import BaseCommand
+
+from laws.models import DailyVotingStatistics
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily voting statistics of all members from the vote actions"
+
+    def handle(self, *args, **options):
+        DailyVotingStatistics.objects.rebuild()
+        logger.info('Rebuilt {0} daily voting statistics rows'.format(DailyVotingStatistics.objects.count()))
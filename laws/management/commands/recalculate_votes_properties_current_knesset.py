@@ -31,7 +31,4 @@ class Command(BaseCommand):
             logger.info("Not updating the db, dry run was specified")
             return
 
-        for vote in votes_to_update:
-
-            vote.update_vote_properties()
-            logger.info(u'Recalculated vote properties for {0}'.format(vote))
+        Vote.objects.update_vote_properties(votes_to_update)
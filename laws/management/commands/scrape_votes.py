@@ -5,12 +5,16 @@ from django.db import transaction
 from knesset_data.dataservice.votes import Vote as DataserviceVote
 from knesset_data.html_scrapers.votes import HtmlVote
 from laws.models import Vote, VoteAction
+from laws.vote_matrix import deferred_vote_matrix_update
 from simple.constants import KNESSET_VOTE_PAGE
 from simple.scrapers import hebrew_strftime
 from simple.scrapers.base_scraper_commands import BaseKnessetDataserviceCollectionCommand
 from mks.models import Member
+from mks.party_stats import PartyStatistics
 from simple.management.commands.syncdata import Command as SyncdataCommand
 from links.models import Link
+from agendas.models import SummaryAgenda
+from ok_tag.models import VoteKeyphraseTagger
 from django.contrib.contenttypes.models import ContentType
 
 logger = getLogger(__name__)
@@ -40,6 +44,19 @@ class Command(BaseKnessetDataserviceCollectionCommand):
 
     help = "Scrape votes data from the knesset"
 
+    _scraped_vote_ids = None
+
+    def _handle_noargs(self, **options):
+        self._scraped_vote_ids = []
+        try:
+            # the vote matrix rows of all the scraped votes are written at once
+            with deferred_vote_matrix_update():
+                super(Command, self)._handle_noargs(**options)
+        finally:
+            # tag all the scraped votes at once
+            if self._scraped_vote_ids:
+                VoteKeyphraseTagger().tag_votes(self._scraped_vote_ids)
+
     @transaction.atomic
     def _update_or_create_vote(self, dataservice_vote, oknesset_vote=None):
         vote_kwargs = self._get_dataservice_model_kwargs(dataservice_vote)
@@ -50,7 +67,11 @@ class Command(BaseKnessetDataserviceCollectionCommand):
             oknesset_vote = Vote.objects.create(**vote_kwargs)
         self._add_vote_actions(dataservice_vote, oknesset_vote)
         oknesset_vote.update_vote_properties()
+        SummaryAgenda.objects.update_for_votes([oknesset_vote])
+        PartyStatistics.invalidate()
         SyncdataCommand().find_synced_protocol(oknesset_vote)
+        if self._scraped_vote_ids is not None:
+            self._scraped_vote_ids.append(oknesset_vote.id)
 
         Link.objects.get_or_create(
             title=u'ההצבעה באתר הכנסת',
@@ -97,25 +118,26 @@ class Command(BaseKnessetDataserviceCollectionCommand):
 
     def recreate_objects(self, vote_ids):
         recreated_votes = []
-        for vote_id in vote_ids:
-            logger.info('Attempting rescraping for vote id %s' % vote_id)
-            try:
-                try:
-                    oknesset_vote = Vote.objects.get(id=int(vote_id))
-                except Vote.DoesNotExist:
-                    raise VoteScraperException('Vote to recreate does not exist %s' % vote_id)
-                vote_src_id = oknesset_vote.src_id
+        with deferred_vote_matrix_update():
+            for vote_id in vote_ids:
+                logger.info('Attempting rescraping for vote id %s' % vote_id)
                 try:
-                    dataservice_vote = self.DATASERVICE_CLASS.get(vote_src_id)
-                except Exception:
-                    raise VoteScraperException('Failure to fetch knesset data dto for vote id %s' % vote_id)
-                VoteAction.objects.filter(vote=oknesset_vote).delete()
-                Link.objects.filter(content_type=ContentType.objects.get_for_model(oknesset_vote),
-                                    object_pk=oknesset_vote.id).delete()
-                recreated_votes.append(self._update_or_create_vote(dataservice_vote, oknesset_vote))
-                logger.info('Success rescraping for vote id %s' % vote_id)
-            except VoteScraperException:
-                logger.exception('Vote scraper exception for vote %s' % vote_id)
+                    try:
+                        oknesset_vote = Vote.objects.get(id=int(vote_id))
+                    except Vote.DoesNotExist:
+                        raise VoteScraperException('Vote to recreate does not exist %s' % vote_id)
+                    vote_src_id = oknesset_vote.src_id
+                    try:
+                        dataservice_vote = self.DATASERVICE_CLASS.get(vote_src_id)
+                    except Exception:
+                        raise VoteScraperException('Failure to fetch knesset data dto for vote id %s' % vote_id)
+                    VoteAction.objects.filter(vote=oknesset_vote).delete()
+                    Link.objects.filter(content_type=ContentType.objects.get_for_model(oknesset_vote),
+                                        object_pk=oknesset_vote.id).delete()
+                    recreated_votes.append(self._update_or_create_vote(dataservice_vote, oknesset_vote))
+                    logger.info('Success rescraping for vote id %s' % vote_id)
+                except VoteScraperException:
+                    logger.exception('Vote scraper exception for vote %s' % vote_id)
         return recreated_votes
 
     def _get_validate_first_object_title(self, dataservice_object):
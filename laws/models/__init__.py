@@ -6,13 +6,14 @@ from laws.models.law import Law
 from laws.models.proposal import BillProposal, GovProposal, PrivateProposal, KnessetProposal
 from laws.models.vote import Vote
 from laws.models.member_voting_statistics import MemberVotingStatistics
+from laws.models.daily_voting_statistics import DailyVotingStatistics
 from laws.models.vote_action import VoteAction
 from laws.listeners import *
 
 __all__ = [
     Vote, Law, VoteAction, Bill, BillProposal, GovProposal, PrivateProposal, KnessetProposal,
     CandidateListVotingStatistics, BillBudgetEstimation, GovLegislationCommitteeDecision, MemberVotingStatistics,
-    get_debated_bills
+    DailyVotingStatistics, get_debated_bills
 ]
 
 
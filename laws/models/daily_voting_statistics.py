@@ -0,0 +1,125 @@
+# encoding: utf-8
+import datetime
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models import Sum, Q
+
+from laws.models.vote_action import VoteAction
+import logging
+
+logger = logging.getLogger("open-knesset.laws.models")
+
+COUNT_FIELDS = ('votes_count', 'against_party_count', 'against_coalition_count', 'against_opposition_count')
+
+
+def _day_range(day):
+    start = datetime.datetime.combine(day, datetime.time())
+    return start, start + datetime.timedelta(days=1)
+
+
+class DailyVotingStatisticsManager(models.Manager):
+    def recompute_days(self, days, member_ids=None):
+        """Rebuild the rows of the given days from the vote actions.
+
+        When member_ids is given only the rows of those members are rebuilt.
+        """
+        days = sorted(set(days))
+        if not days:
+            return
+        time_filter = Q()
+        for day in days:
+            start, end = _day_range(day)
+            time_filter |= Q(vote__time__gte=start, vote__time__lt=end)
+        actions = VoteAction.objects.filter(time_filter)
+        if member_ids is not None:
+            actions = actions.filter(member__in=member_ids)
+
+        counts = defaultdict(lambda: dict.fromkeys(COUNT_FIELDS, 0))
+        for member_id, time, action_type, against_party, against_coalition, against_opposition in \
+                actions.order_by().values_list('member_id', 'vote__time', 'type', 'against_party',
+                                               'against_coalition', 'against_opposition'):
+            if action_type == 'no-vote':
+                continue
+            row = counts[(member_id, time.date())]
+            row['votes_count'] += 1
+            row['against_party_count'] += against_party
+            row['against_coalition_count'] += against_coalition
+            row['against_opposition_count'] += against_opposition
+
+        with transaction.atomic():
+            stale = self.filter(date__in=days)
+            if member_ids is not None:
+                stale = stale.filter(member__in=member_ids)
+            stale.delete()
+            self.bulk_create([DailyVotingStatistics(member_id=day_member_id, date=day, **day_counts)
+                              for (day_member_id, day), day_counts in counts.items()])
+
+    def update_for_votes(self, votes, member_ids=None):
+        """Rebuild the rows of the days of the given votes (ids or instances)"""
+        from laws.models.vote import Vote
+        vote_ids = [getattr(vote, 'pk', vote) for vote in votes]
+        days = set()
+        for i in range(0, len(vote_ids), 500):
+            days.update(time.date() for time in Vote.objects.filter(
+                id__in=vote_ids[i:i + 500]).values_list('time', flat=True))
+        self.recompute_days(days, member_ids)
+
+    def rebuild(self):
+        """Rebuild all rows, a month of votes at a time"""
+        from laws.models.vote import Vote
+        days = sorted(set(time.date() for time in Vote.objects.values_list('time', flat=True)))
+        with transaction.atomic():
+            self.all().delete()
+            months = defaultdict(list)
+            for day in days:
+                months[(day.year, day.month)].append(day)
+            for month in sorted(months):
+                self.recompute_days(months[month])
+
+    def _since(self, from_date):
+        qs = self.all()
+        if from_date:
+            if isinstance(from_date, datetime.datetime):
+                from_date = from_date.date()
+            qs = qs.filter(date__gte=from_date)
+        return qs
+
+    def totals(self, from_date=None, **filters):
+        """Sums of the counts of the rows matching filters, since from_date"""
+        totals = self._since(from_date).filter(**filters).aggregate(
+            **dict((field + '_sum', Sum(field)) for field in COUNT_FIELDS))
+        return dict((field, totals[field + '_sum'] or 0) for field in COUNT_FIELDS)
+
+    def totals_by(self, field, from_date=None, **filters):
+        """Sums of the counts grouped by field, e.g. 'member' or 'member__current_party'"""
+        rows = self._since(from_date).filter(**filters).order_by().values(field).annotate(
+            **dict((count_field + '_sum', Sum(count_field)) for count_field in COUNT_FIELDS))
+        return dict((row[field], dict((count_field, row[count_field + '_sum'] or 0) for count_field in COUNT_FIELDS))
+                    for row in rows)
+
+
+class DailyVotingStatistics(models.Model):
+    """How many times a member voted, and voted against their party, the
+    coalition or the opposition, on a single day.
+
+    Counts over any period are sums over a few rows of this table instead
+    of counts over the vote actions. Rows are rebuilt whenever the
+    properties of votes are recalculated.
+    """
+
+    class Meta:
+        app_label = 'laws'
+        unique_together = (('member', 'date'),)
+
+    member = models.ForeignKey('mks.Member', related_name='daily_voting_statistics')
+    date = models.DateField(db_index=True)
+    votes_count = models.IntegerField(default=0)
+    against_party_count = models.IntegerField(default=0)
+    against_coalition_count = models.IntegerField(default=0)
+    against_opposition_count = models.IntegerField(default=0)
+
+    objects = DailyVotingStatisticsManager()
+
+    def __unicode__(self):
+        return u"%s %s" % (self.member.name, self.date)
@@ -1,9 +1,7 @@
 # encoding: utf-8
-from django.conf import settings
-from django.core.cache import cache
 from django.db import models
 
-from laws.models.vote_action import VoteAction
+from laws.models.daily_voting_statistics import DailyVotingStatistics
 import logging
 
 logger = logging.getLogger("open-knesset.laws.models")
@@ -16,47 +14,43 @@ class MemberVotingStatistics(models.Model):
 
     member = models.OneToOneField('mks.Member', related_name='voting_statistics')
 
+    def counts(self, from_date=None):
+        return DailyVotingStatistics.objects.totals(from_date, member=self.member_id)
+
     def votes_against_party_count(self, from_date=None):
-        if from_date:
-            return VoteAction.objects.filter(member=self.member, against_party=True, vote__time__gt=from_date).count()
-        return VoteAction.objects.filter(member=self.member, against_party=True).count()
+        return self.counts(from_date)['against_party_count']
 
     def votes_count(self, from_date=None):
-        if from_date:
-            return VoteAction.objects.filter(member=self.member, vote__time__gt=from_date).exclude(
-                type='no-vote').count()
-        vc = cache.get('votes_count_%d' % self.member.id)
-        if not vc:
-            vc = VoteAction.objects.filter(member=self.member).exclude(type='no-vote').count()
-            cache.set('votes_count_%d' % self.member.id, vc, settings.LONG_CACHE_TIME)
-        return vc
+        return self.counts(from_date)['votes_count']
 
     def average_votes_per_month(self):
         if hasattr(self, '_average_votes_per_month'):
             return self._average_votes_per_month
-        st = self.member.service_time()
-        self._average_votes_per_month = (30.0 * self.votes_count() / st) if st else 0
+        self._average_votes_per_month = self.votes_per_month(self.member, self.votes_count())
         return self._average_votes_per_month
 
+    @staticmethod
+    def votes_per_month(member, votes_count):
+        st = member.service_time()
+        return (30.0 * votes_count / st) if st else 0
+
     def discipline(self, from_date=None):
-        total_votes = self.votes_count(from_date)
+        counts = self.counts(from_date)
+        total_votes = counts['votes_count']
         if total_votes <= 3:  # not enough data
             return None
-        votes_against_party = self.votes_against_party_count(from_date)
-        return round(100.0 * (total_votes - votes_against_party) / total_votes, 1)
+        return round(100.0 * (total_votes - counts['against_party_count']) / total_votes, 1)
 
     def coalition_discipline(self,
                              from_date=None):  # if party is in opposition this actually returns opposition_discipline
-        total_votes = self.votes_count(from_date)
+        counts = self.counts(from_date)
+        total_votes = counts['votes_count']
         if total_votes <= 3:  # not enough data
             return None
         if self.member.current_party.is_coalition:
-            v = VoteAction.objects.filter(member=self.member, against_coalition=True)
+            votes_against_coalition = counts['against_coalition_count']
         else:
-            v = VoteAction.objects.filter(member=self.member, against_opposition=True)
-        if from_date:
-            v = v.filter(vote__time__gt=from_date)
-        votes_against_coalition = v.count()
+            votes_against_coalition = counts['against_opposition_count']
         return round(100.0 * (total_votes - votes_against_coalition) / total_votes, 1)
 
     def __unicode__(self):
@@ -1,8 +1,9 @@
 # encoding: utf-8
 from django.db import models
+from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
 
-from laws.models.vote_action import VoteAction
+from laws.models.daily_voting_statistics import DailyVotingStatistics
 from mks.models import Knesset
 import logging
 
@@ -16,18 +17,17 @@ class PartyVotingStatistics(models.Model):
 
     party = models.OneToOneField('mks.Party', related_name='voting_statistics')
 
-    def votes_against_party_count(self):
+    @cached_property
+    def counts(self):
+        """Counts of the votes of the party's members in the current knesset"""
         d = Knesset.objects.current_knesset().start_date
-        return VoteAction.objects.filter(
-            vote__time__gt=d,
-            member__current_party=self.party,
-            against_party=True).count()
+        return DailyVotingStatistics.objects.totals(d, member__current_party=self.party_id)
+
+    def votes_against_party_count(self):
+        return self.counts['against_party_count']
 
     def votes_count(self):
-        d = Knesset.objects.current_knesset().start_date
-        return VoteAction.objects.filter(
-            member__current_party=self.party,
-            vote__time__gt=d).exclude(type='no-vote').count()
+        return self.counts['votes_count']
 
     def votes_per_seat(self):
         return round(float(self.votes_count()) / self.party.number_of_seats, 1)
@@ -42,19 +42,12 @@ class PartyVotingStatistics(models.Model):
 
     def coalition_discipline(self):  # if party is in opposition this actually
         # returns opposition_discipline
-        d = Knesset.objects.current_knesset().start_date
         total_votes = self.votes_count()
         if total_votes:
             if self.party.is_coalition:
-                votes_against_coalition = VoteAction.objects.filter(
-                    vote__time__gt=d,
-                    member__current_party=self.party,
-                    against_coalition=True).count()
+                votes_against_coalition = self.counts['against_coalition_count']
             else:
-                votes_against_coalition = VoteAction.objects.filter(
-                    vote__time__gt=d,
-                    member__current_party=self.party,
-                    against_opposition=True).count()
+                votes_against_coalition = self.counts['against_opposition_count']
             return round(100.0 * (total_votes - votes_against_coalition) /
                          total_votes, 1)
         return _('N/A')
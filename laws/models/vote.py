@@ -8,13 +8,12 @@ from django.db import models
 from django.utils.translation import ugettext_lazy as _
 from tagging.models import TaggedItem, Tag
 
-from laws import constants
 from laws.enums import VOTE_TYPES
-from laws.helpers import resolve_vote_type_by_title
 from laws.models.bill import Bill
+from laws.models.daily_voting_statistics import DailyVotingStatistics
 from laws.models.vote_action import VoteAction
 from laws.vote_choices import TYPE_CHOICES
-from mks.models import Party, Member
+from mks.models import Member
 
 from tagvotes.models import TagVote
 import logging
@@ -71,6 +70,20 @@ class VoteManager(models.Manager):
                 bills_first__isnull=False).exclude(bill_approved__isnull=False)
         return qs
 
+    def update_vote_properties(self, votes, chunk_size=500):
+        """Recalculate the properties of many votes, chunk_size votes at a time.
+
+        Returns the number of votes updated.
+        """
+        from laws.vote_properties import VotePropertiesCalculator
+        calculator = VotePropertiesCalculator()
+        vote_ids = list(votes.order_by('time', 'id').values_list('id', flat=True))
+        for i in range(0, len(vote_ids), chunk_size):
+            calculator.update_votes(vote_ids[i:i + chunk_size])
+            logger.info(u'Recalculated vote properties for {0} of {1} votes'.format(
+                min(i + chunk_size, len(vote_ids)), len(vote_ids)))
+        return len(vote_ids)
+
 
 class Vote(models.Model):
     meeting_number = models.IntegerField(null=True, blank=True)
@@ -193,102 +206,10 @@ class Vote(models.Model):
         return tf
 
     def update_vote_properties(self):
-        # TODO: this can be heavily optimized. somewhere sometimes..
-        party_ids = Party.objects.values_list('id', flat=True)
-        d = self.time.date()
-        party_is_coalition = dict(zip(
-            party_ids,
-            [x.is_coalition_at(self.time.date())
-             for x in Party.objects.all()]
-        ))
-
-        def party_at_or_error(member, vote_date):
-            party = member.party_at(vote_date)
-            if party:
-                return party
-            else:
-                raise Exception(
-                    'could not find which party member %s belonged to during vote %s' % (member.pk, self.pk))
-
-        for_party_ids = [party_at_or_error(va.member, vote_date=d).id for va in self.for_votes()]
-        party_for_votes = [sum([x == party_id for x in for_party_ids]) for party_id in party_ids]
-
-        against_party_ids = [party_at_or_error(va.member, vote_date=d).id for va in self.against_votes()]
-        party_against_votes = [sum([x == party_id for x in against_party_ids]) for party_id in party_ids]
-
-        party_stands_for = [float(for_votes) > constants.STANDS_FOR_THRESHOLD * (for_votes + against_votes) for (for_votes, against_votes) in
-                            zip(party_for_votes, party_against_votes)]
-        party_stands_against = [float(against_votes) > constants.STANDS_FOR_THRESHOLD * (for_votes + against_votes) for (for_votes, against_votes) in
-                                zip(party_for_votes, party_against_votes)]
-
-        party_stands_for = dict(zip(party_ids, party_stands_for))
-        party_stands_against = dict(zip(party_ids, party_stands_against))
-
-        coalition_for_votes = sum([x for (x, y) in zip(party_for_votes, party_ids) if party_is_coalition[y]])
-        coalition_against_votes = sum([x for (x, y) in zip(party_against_votes, party_ids) if party_is_coalition[y]])
-        opposition_for_votes = sum([x for (x, y) in zip(party_for_votes, party_ids) if not party_is_coalition[y]])
-        opposition_against_votes = sum(
-            [x for (x, y) in zip(party_against_votes, party_ids) if not party_is_coalition[y]])
-
-        coalition_total_votes = coalition_for_votes + coalition_against_votes
-        coalition_stands_for = (
-            float(coalition_for_votes) > constants.STANDS_FOR_THRESHOLD * (coalition_total_votes))
-        coalition_stands_against = float(coalition_against_votes) > constants.STANDS_FOR_THRESHOLD * (
-            coalition_total_votes)
-        opposition_total_votes = opposition_for_votes + opposition_against_votes
-        opposition_stands_for = float(opposition_for_votes) > constants.STANDS_FOR_THRESHOLD * opposition_total_votes
-        opposition_stands_against = float(
-            opposition_against_votes) > constants.STANDS_FOR_THRESHOLD * opposition_total_votes
-
-        # a set of all MKs that proposed bills this vote is about.
-        proposers = [set(b.proposers.all()) for b in self.bills()]
-        if proposers:
-            proposers = reduce(lambda x, y: set.union(x, y), proposers)
-
-        against_party_count = 0
-        against_coalition_count = 0
-        against_opposition_count = 0
-        against_own_bill_count = 0
-        for va in VoteAction.objects.filter(vote=self):
-            va.against_party = False
-            va.against_coalition = False
-            va.against_opposition = False
-            va.against_own_bill = False
-            voting_member_party_at_vote = party_at_or_error(va.member, vote_date=d)
-            vote_action_member_party_id = voting_member_party_at_vote.id
-            if party_stands_for[vote_action_member_party_id] and va.type == 'against':
-                va.against_party = True
-                against_party_count += 1
-            if party_stands_against[vote_action_member_party_id] and va.type == 'for':
-                va.against_party = True
-                against_party_count += 1
-            if voting_member_party_at_vote.is_coalition_at(self.time.date()):
-                if (coalition_stands_for and va.type == 'against') or (coalition_stands_against and va.type == 'for'):
-                    va.against_coalition = True
-                    against_coalition_count += 1
-            else:
-                if (opposition_stands_for and va.type == 'against') or (opposition_stands_against and va.type == 'for'):
-                    va.against_opposition = True
-                    against_opposition_count += 1
-
-            if va.member in proposers and va.type == 'against':
-                va.against_own_bill = True
-                against_own_bill_count += 1
-
-            va.save()
-
-        self.against_party = against_party_count
-        self.against_coalition = against_coalition_count
-        self.against_opposition = against_opposition_count
-        self.against_own_bill = against_own_bill_count
-        self.votes_count = VoteAction.objects.filter(vote=self).count()
-        self.for_votes_count = VoteAction.objects.filter(vote=self, type='for').count()
-        self.against_votes_count = VoteAction.objects.filter(vote=self, type='against').count()
-        self.abstain_votes_count = VoteAction.objects.filter(vote=self, type='abstain').count()
-        self.controversy = min(self.for_votes_count or 0,
-                               self.against_votes_count or 0)
-        self.vote_type = resolve_vote_type_by_title(self.title)
-        self.save()
+        from laws.vote_properties import VotePropertiesCalculator
+        fields = VotePropertiesCalculator().update_votes([self.id])[self.id]
+        for name, value in fields.items():
+            setattr(self, name, value)
 
     def redownload_votes_page(self):
         from simple.management.commands.syncdata import Command as SyncdataCommand
@@ -304,38 +225,54 @@ class Vote(models.Model):
             'did not vote': u'no-vote',
         }
         html_votes = HtmlVote.get_from_vote_id(self.src_id).member_votes
-        for vote_type in ['for', 'against', 'abstain']:
-            expected_member_ids = [int(member_id) for member_id, member_vote_type in html_votes if
-                                   resolve_vote_types[member_vote_type] == vote_type]
-            actual_member_ids = [int(member_id) for member_id in
-                                 self.actions.filter(type=vote_type).values_list('member_id', flat=True)]
-            if len(expected_member_ids) > len(actual_member_ids):
-                missing_member_ids = [member_id for member_id in expected_member_ids if
-                                      member_id not in actual_member_ids]
-                for member_id in missing_member_ids:
-                    logger.info('fixing for member id %s' % member_id)
-                    vote_action, created = VoteAction.objects.get_or_create(member=Member.objects.get(pk=member_id),
-                                                                            vote=self, defaults={'type': vote_type})
-                    if created:
-                        vote_action.save()
-            elif len(expected_member_ids) != len(actual_member_ids):
-                raise Exception(
-                    'strange mismatch in members, actual has more members then expected, this is unexpected')
+        fixed_member_ids = []
+        from laws.vote_matrix import deferred_vote_matrix_update
+        with deferred_vote_matrix_update():
+            for vote_type in ['for', 'against', 'abstain']:
+                expected_member_ids = [int(member_id) for member_id, member_vote_type in html_votes if
+                                       resolve_vote_types[member_vote_type] == vote_type]
+                actual_member_ids = [int(member_id) for member_id in
+                                     self.actions.filter(type=vote_type).values_list('member_id', flat=True)]
+                if len(expected_member_ids) > len(actual_member_ids):
+                    missing_member_ids = [member_id for member_id in expected_member_ids if
+                                          member_id not in actual_member_ids]
+                    for member_id in missing_member_ids:
+                        logger.info('fixing for member id %s' % member_id)
+                        vote_action, created = VoteAction.objects.get_or_create(member=Member.objects.get(pk=member_id),
+                                                                                vote=self, defaults={'type': vote_type})
+                        if created:
+                            vote_action.save()
+                            fixed_member_ids.append(member_id)
+                elif len(expected_member_ids) != len(actual_member_ids):
+                    raise Exception(
+                        'strange mismatch in members, actual has more members then expected, this is unexpected')
+        if fixed_member_ids:
+            from agendas.models import SummaryAgenda
+            SummaryAgenda.objects.update_for_votes([self], mk_ids=fixed_member_ids)
+            DailyVotingStatistics.objects.update_for_votes([self], member_ids=fixed_member_ids)
 
     def reparse_members_from_votes_page(self, page=None):
         from simple.management.commands.syncdata import Command as SyncdataCommand
         page = self.redownload_votes_page() if page is None else page
         syncdata = SyncdataCommand()
         results = syncdata.read_member_votes(page, return_ids=True)
-        for (voter_id, voter_party, vote) in results:
-            try:
-                member = Member.objects.get(pk=int(voter_id))
-            except Exception:
-
-                logger.exception("reparse vote member exception for vote %s member %s" % (self.pk, member.pk))
-                continue
-
-            va, created = VoteAction.objects.get_or_create(vote=self, member=member,
-                                                           defaults={'type': vote, 'party': member.current_party})
-            if created:
-                va.save()
+        added_member_ids = []
+        from laws.vote_matrix import deferred_vote_matrix_update
+        with deferred_vote_matrix_update():
+            for (voter_id, voter_party, vote) in results:
+                try:
+                    member = Member.objects.get(pk=int(voter_id))
+                except Exception:
+
+                    logger.exception("reparse vote member exception for vote %s member %s" % (self.pk, member.pk))
+                    continue
+
+                va, created = VoteAction.objects.get_or_create(vote=self, member=member,
+                                                               defaults={'type': vote, 'party': member.current_party})
+                if created:
+                    va.save()
+                    added_member_ids.append(member.pk)
+        if added_member_ids:
+            from agendas.models import SummaryAgenda
+            SummaryAgenda.objects.update_for_votes([self], mk_ids=added_member_ids)
+            DailyVotingStatistics.objects.update_for_votes([self], member_ids=added_member_ids)
@@ -0,0 +1,73 @@
+# encoding: utf-8
+import shutil
+import tempfile
+from datetime import datetime
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from laws.models import Vote, VoteAction
+from laws.vote_matrix import (FOR, AGAINST, ABSTAIN, build_vote_matrix, deferred_vote_matrix_update,
+                              get_vote_matrix, get_vote_matrix_store, update_vote_matrix)
+from mks.models import Party, Member
+
+
+class VoteMatrixTest(TestCase):
+    def setUp(self):
+        super(VoteMatrixTest, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.settings_override = override_settings(VOTE_MATRIX_ROOT=self.path)
+        self.settings_override.enable()
+        self.party = Party.objects.create(name='party')
+        self.mks = [Member.objects.create(name='mk %d' % i, current_party=self.party) for i in range(3)]
+        self.vote_1 = Vote.objects.create(title='vote 1', time=datetime(2011, 1, 1))
+        self.vote_2 = Vote.objects.create(title='vote 2', time=datetime(2011, 2, 1))
+        for mk, vote_type in zip(self.mks, ['for', 'against', 'abstain']):
+            VoteAction.objects.create(vote=self.vote_1, member=mk, type=vote_type, party=self.party)
+        VoteAction.objects.create(vote=self.vote_2, member=self.mks[0], type='no-vote', party=self.party)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.path)
+        super(VoteMatrixTest, self).tearDown()
+
+    def test_build_and_update(self):
+        matrix = build_vote_matrix()
+        mk_ids = [mk.id for mk in reversed(self.mks)]
+        self.assertEqual(matrix.dense([self.vote_1.id, self.vote_2.id], mk_ids).tolist(),
+                         [[ABSTAIN, AGAINST, FOR], [0, 0, 0]])
+        self.assertEqual(matrix.dense([self.vote_1.id], mk_ids, abstain=0).tolist(), [[0, AGAINST, FOR]])
+
+        VoteAction.objects.filter(vote=self.vote_2).update(type='for')
+        vote_3 = Vote.objects.create(title='vote 3', time=datetime(2011, 3, 1))
+        # bulk_create sends no post_save
+        VoteAction.objects.bulk_create([VoteAction(vote=vote_3, member=self.mks[1], type='against',
+                                                   party=self.party)])
+        update_vote_matrix([self.vote_2.id])
+        matrix = get_vote_matrix_store().load()
+        self.assertEqual(len(matrix), 2)
+        self.assertEqual(matrix.dense([self.vote_2.id, vote_3.id], mk_ids).tolist(), [[0, 0, FOR], [0, 0, 0]])
+
+        # votes missing from the matrix are read when asked for
+        matrix = get_vote_matrix([vote_3.id])
+        self.assertEqual(len(matrix), 3)
+        self.assertEqual(list(matrix.row(vote_3.id)[0]), [self.mks[1].id])
+
+    def test_vote_action_changes_update_the_matrix(self):
+        build_vote_matrix()
+        mk_ids = [mk.id for mk in self.mks]
+        vote_action = VoteAction.objects.get(vote=self.vote_2)
+        vote_action.type = 'against'
+        vote_action.save()
+        VoteAction.objects.get(vote=self.vote_1, member=self.mks[0]).delete()
+        matrix = get_vote_matrix_store().load()
+        self.assertEqual(matrix.dense([self.vote_1.id, self.vote_2.id], mk_ids).tolist(),
+                         [[0, AGAINST, ABSTAIN], [AGAINST, 0, 0]])
+
+        with deferred_vote_matrix_update():
+            VoteAction.objects.create(vote=self.vote_2, member=self.mks[1], type='for', party=self.party)
+            # the rows are written when the block ends
+            self.assertEqual(get_vote_matrix_store().load().dense([self.vote_2.id], mk_ids).tolist(),
+                             [[AGAINST, 0, 0]])
+        self.assertEqual(get_vote_matrix_store().load().dense([self.vote_2.id], mk_ids).tolist(),
+                         [[AGAINST, FOR, 0]])
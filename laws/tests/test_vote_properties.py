@@ -0,0 +1,96 @@
+# encoding: utf-8
+from datetime import date, datetime
+
+from django.test import TestCase
+
+from laws.helpers import MissingVotePartyException
+from laws.models import Vote, VoteAction, Bill, DailyVotingStatistics
+from mks.models import Party, Member, Membership, CoalitionMembership, Knesset
+
+
+class VotePropertiesTest(TestCase):
+    def setUp(self):
+        super(VotePropertiesTest, self).setUp()
+        self.knesset = Knesset.objects.create(number=1, start_date=date(2010, 1, 1))
+        self.coalition_party = Party.objects.create(name='coalition', number_of_seats=4, knesset=self.knesset)
+        self.opposition_party = Party.objects.create(name='opposition', number_of_seats=1, knesset=self.knesset)
+        CoalitionMembership.objects.create(party=self.coalition_party, start_date=date(2010, 1, 1))
+
+        self.coalition_mks = [Member.objects.create(name='coalition mk %d' % i, current_party=self.coalition_party)
+                              for i in range(4)]
+        self.opposition_mk = Member.objects.create(name='opposition mk', current_party=self.opposition_party)
+        for mk in self.coalition_mks:
+            Membership.objects.create(member=mk, party=self.coalition_party)
+        Membership.objects.create(member=self.opposition_mk, party=self.opposition_party)
+
+        self.vote_1 = Vote.objects.create(title='vote 1', time=datetime(2011, 1, 1))
+        self.vote_2 = Vote.objects.create(title='vote 2', time=datetime(2011, 2, 1))
+        self.bill = Bill.objects.create(stage='1', title='bill')
+        self.bill.proposers.add(self.coalition_mks[3])
+        self.bill.pre_votes.add(self.vote_1)
+
+        for mk in self.coalition_mks[:3]:
+            VoteAction.objects.create(vote=self.vote_1, member=mk, type='for',
+                                      party=self.coalition_party)
+        self.dissenter = VoteAction.objects.create(vote=self.vote_1, member=self.coalition_mks[3], type='against',
+                                                    party=self.coalition_party)
+        VoteAction.objects.create(vote=self.vote_1, member=self.opposition_mk, type='for',
+                                  party=self.opposition_party)
+        for mk in self.coalition_mks[:2]:
+            VoteAction.objects.create(vote=self.vote_2, member=mk, type='against',
+                                      party=self.coalition_party)
+        VoteAction.objects.create(vote=self.vote_2, member=self.opposition_mk, type='abstain',
+                                  party=self.opposition_party)
+
+    def test_update_many_votes(self):
+        count = Vote.objects.update_vote_properties(Vote.objects.all(), chunk_size=1)
+        self.assertEqual(count, 2)
+
+        vote_1 = Vote.objects.get(pk=self.vote_1.pk)
+        self.assertEqual((vote_1.votes_count, vote_1.for_votes_count, vote_1.against_votes_count,
+                          vote_1.abstain_votes_count, vote_1.controversy), (5, 4, 1, 0, 1))
+        self.assertEqual((vote_1.against_party, vote_1.against_coalition, vote_1.against_opposition,
+                          vote_1.against_own_bill), (1, 1, 0, 1))
+
+        dissenter = VoteAction.objects.get(pk=self.dissenter.pk)
+        self.assertTrue(dissenter.against_party)
+        self.assertTrue(dissenter.against_coalition)
+        self.assertFalse(dissenter.against_opposition)
+        self.assertTrue(dissenter.against_own_bill)
+        self.assertEqual(VoteAction.objects.filter(vote=self.vote_1, against_party=True).count(), 1)
+
+        vote_2 = Vote.objects.get(pk=self.vote_2.pk)
+        self.assertEqual((vote_2.votes_count, vote_2.for_votes_count, vote_2.against_votes_count,
+                          vote_2.abstain_votes_count, vote_2.controversy), (3, 0, 2, 1, 0))
+        self.assertEqual(vote_2.against_party, 0)
+
+    def test_update_single_vote(self):
+        self.vote_1.update_vote_properties()
+        self.assertEqual(self.vote_1.against_party, 1)
+        self.assertEqual(Vote.objects.get(pk=self.vote_1.pk).against_own_bill, 1)
+
+    def test_daily_voting_statistics(self):
+        Vote.objects.update_vote_properties(Vote.objects.all())
+        self.assertEqual(DailyVotingStatistics.objects.filter(member=self.coalition_mks[0]).count(), 2)
+
+        dissenter_statistics = self.coalition_mks[3].voting_statistics
+        self.assertEqual(dissenter_statistics.votes_count(), 1)
+        self.assertEqual(dissenter_statistics.votes_against_party_count(), 1)
+        self.assertEqual(self.coalition_mks[0].voting_statistics.votes_count(date(2011, 1, 2)), 1)
+        # abstaining counts as voting
+        self.assertEqual(self.opposition_mk.voting_statistics.votes_count(), 2)
+
+        party_statistics = self.coalition_party.voting_statistics
+        self.assertEqual(party_statistics.votes_count(), 6)
+        self.assertEqual(party_statistics.votes_against_party_count(), 1)
+        self.assertEqual(party_statistics.discipline(), 83.3)
+
+        # removing an action and recalculating the vote updates the counts
+        VoteAction.objects.filter(vote=self.vote_2, member=self.coalition_mks[0]).delete()
+        self.vote_2.update_vote_properties()
+        self.assertEqual(self.coalition_mks[0].voting_statistics.votes_count(), 1)
+
+    def test_missing_party(self):
+        mk = Member.objects.create(name='partyless mk')
+        VoteAction.objects.create(vote=self.vote_2, member=mk, type='for', party=self.opposition_party)
+        self.assertRaises(MissingVotePartyException, self.vote_2.update_vote_properties)
@@ -6,14 +6,12 @@ import os
 import difflib
 import logging
 
-import itertools
 import tagging
 import voting
 from actstream import action
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.urlresolvers import reverse
-from django.db import DatabaseError
 from django.http import (HttpResponseRedirect, HttpResponse, Http404,
                          HttpResponseBadRequest, HttpResponseForbidden)
 from django.views.decorators.http import require_http_methods
@@ -27,6 +25,7 @@ from tagging.models import Tag, TaggedItem
 
 from agendas.models import Agenda, UserSuggestedVote, Link
 from laws.vote_choices import BILL_STAGE_CHOICES
+from ok_tag.models import TagUsage
 from ok_tag.views import BaseTagMemberListView
 from auxiliary.mixins import CsvView
 from forms import VoteSelectForm, BillSelectForm, BudgetEstimateForm
@@ -53,7 +52,7 @@ def bill_tags_cloud(request, min_posts_count=1):
         title = _('Bills by %(member)s by tag') % {'member': member.name}
     else:
         title = _('Bills by tag')
-        tags_cloud = Tag.objects.cloud_for_model(Bill)
+        tags_cloud = TagUsage.objects.cloud([Bill])
     return render_to_response(
         "laws/bill_tags_cloud.html",
         {"tags_cloud": tags_cloud, "title": title, "member": member},
@@ -142,7 +141,7 @@ def vote_tags_cloud(request, min_posts_count=1):
         title = _('Votes by %(member)s by tag') % {'member': member.name}
     else:
         title = _('Votes by tag')
-        tags_cloud = Tag.objects.cloud_for_model(Vote)
+        tags_cloud = TagUsage.objects.cloud([Vote])
     return render_to_response(
         "laws/vote_tags_cloud.html",
         {"tags_cloud": tags_cloud, "title": title, "member": member},
@@ -284,19 +283,15 @@ class BillCsvView(CsvView):
                     ('proposers', _('Proposers')),
                     ('joiners', _('Joiners')))
 
-    def get_queryset(self, **kwargs):
-        try:
-            return self.model.objects.select_related('law',
-                                                     'first_vote',
-                                                     'approval_vote') \
-                .prefetch_related('joiners',
-                                  'proposers',
-                                  'pre_votes',
-                                  'first_committee_meetings',
-                                  'second_committee_meetings')
-        except DatabaseError:  # sqlite can't prefetch this query, because it has
-            # too many objects
-            return self.model.objects.all()
+    column_queries = {
+        'pre_votes': {'prefetch_related': ['pre_votes']},
+        'first_committee_meetings': {'prefetch_related': ['first_committee_meetings__committee']},
+        'first_vote': {'select_related': ['first_vote']},
+        'second_committee_meetings': {'prefetch_related': ['second_committee_meetings__committee']},
+        'approval_vote': {'select_related': ['approval_vote']},
+        'proposers': {'prefetch_related': ['proposers']},
+        'joiners': {'prefetch_related': ['joiners']},
+    }
 
     def community_meeting_gen(self, obj, attr):
         '''
@@ -364,12 +359,7 @@ class BillDetailView(DetailView):
 
         # compute data for user votes on this bill
         proposers = bill.proposers.select_related('current_party')
-        links = list(Link.objects.for_model(Member))
-        links_by_member = {}
-        for k, g in itertools.groupby(links, lambda x: x.object_pk):
-            links_by_member[str(k)] = list(g)
-        for proposer in proposers:
-            proposer.cached_links = links_by_member.get(str(proposer.pk), [])
+        Link.objects.attach_links(proposers)
         context['proposers'] = proposers
         votes = voting.models.Vote.objects.get_object_votes(bill)
         if 1 not in votes: votes[1] = 0
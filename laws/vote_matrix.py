@@ -0,0 +1,321 @@
+# encoding: utf-8
+"""
+Sparse votes x members matrix of the vote actions, stored as memory mapped
+compressed sparse rows:
+
+    <generation>.vote_ids.npy    sorted ids of the votes, one row each
+    <generation>.indptr.npy      start of the entries of each row, and the end
+    <generation>.member_ids.npy  member of each entry, sorted per row
+    <generation>.values.npy      FOR, AGAINST or ABSTAIN of each entry
+
+vote_matrix.json names the current generation. Updates write a new
+generation under a lock and replace vote_matrix.json atomically, so readers
+never block and keep the arrays they mapped.
+
+The matrix is built by the build_vote_matrix command with one scan of the
+vote actions. The rows of a vote are read again when its vote actions are
+saved or deleted, and the commands that bulk insert vote actions update the
+rows of the synced votes.
+"""
+import errno
+import fcntl
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+
+from laws.models import Vote, VoteAction
+
+import logging
+
+logger = logging.getLogger("open-knesset.laws.vote_matrix")
+
+FOR = 1
+AGAINST = -1
+ABSTAIN = 2
+# values of the vote action types, no-vote actions are not stored
+VOTE_TYPE_VALUES = {u'for': FOR, u'against': AGAINST, u'abstain': ABSTAIN}
+
+MATRIX_PARTS = ('vote_ids', 'indptr', 'member_ids', 'values')
+
+
+class VoteMatrix(object):
+    """Votes x members matrix of FOR, AGAINST and ABSTAIN, 0 elsewhere"""
+
+    def __init__(self, vote_ids, indptr, member_ids, values):
+        self.vote_ids = vote_ids
+        self.indptr = indptr
+        self.member_ids = member_ids
+        self.values = values
+
+    @classmethod
+    def from_actions(cls, vote_ids, actions):
+        """Build the rows of vote_ids from (vote id, member id, type) tuples
+        ordered by vote id and member id. Votes without actions get empty
+        rows."""
+        entry_votes = []
+        entry_members = []
+        entry_values = []
+        for vote_id, member_id, vote_type in actions:
+            value = VOTE_TYPE_VALUES.get(vote_type)
+            if value is not None:
+                entry_votes.append(vote_id)
+                entry_members.append(member_id)
+                entry_values.append(value)
+        entry_votes = np.array(entry_votes, dtype=np.int32)
+        vote_ids = np.union1d(np.asarray(list(vote_ids), dtype=np.int32), entry_votes).astype(np.int32)
+        indptr = np.searchsorted(entry_votes, vote_ids, side='right').astype(np.int64)
+        return cls(vote_ids, np.concatenate(([0], indptr)),
+                   np.array(entry_members, dtype=np.int32), np.array(entry_values, dtype=np.int8))
+
+    def __len__(self):
+        return len(self.vote_ids)
+
+    def __contains__(self, vote_id):
+        i = np.searchsorted(self.vote_ids, vote_id)
+        return i < len(self.vote_ids) and self.vote_ids[i] == vote_id
+
+    def nnz(self):
+        return int(self.indptr[-1])
+
+    def row(self, vote_id):
+        """(member ids, values) of a vote, empty for an unknown vote"""
+        i = np.searchsorted(self.vote_ids, vote_id)
+        if i == len(self.vote_ids) or self.vote_ids[i] != vote_id:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int8)
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.member_ids[start:end], self.values[start:end]
+
+    def _entries(self, rows):
+        """Indexes of the entries of rows, and the row of each"""
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        row_of_entry = np.repeat(np.arange(len(rows)), lengths)
+        # the offset of each entry within its row
+        offsets = np.arange(len(row_of_entry)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return np.repeat(starts, lengths) + offsets, row_of_entry
+
+    def voters(self, vote_ids):
+        """Sorted ids of the members with values in the votes"""
+        vote_ids = np.asarray(vote_ids, dtype=np.int32)
+        if not len(vote_ids) or not len(self.vote_ids):
+            return np.zeros(0, dtype=np.int32)
+        rows = np.minimum(np.searchsorted(self.vote_ids, vote_ids), len(self.vote_ids) - 1)
+        entries, _ = self._entries(rows[self.vote_ids[rows] == vote_ids])
+        return np.unique(self.member_ids[entries]).astype(np.int32)
+
+    def dense(self, vote_ids, member_ids, abstain=ABSTAIN):
+        """len(vote_ids) x len(member_ids) int8 array of the values, with the
+        value given for abstain. Unknown votes and members are 0"""
+        vote_ids = np.asarray(vote_ids, dtype=np.int32)
+        member_ids = np.asarray(member_ids, dtype=np.int32)
+        result = np.zeros((len(vote_ids), len(member_ids)), dtype=np.int8)
+        if not len(vote_ids) or not len(member_ids) or not len(self.vote_ids):
+            return result
+        rows = np.minimum(np.searchsorted(self.vote_ids, vote_ids), len(self.vote_ids) - 1)
+        found = self.vote_ids[rows] == vote_ids
+        entries, entry_rows = self._entries(rows[found])
+        entry_rows = np.flatnonzero(found)[entry_rows]
+        member_order = np.argsort(member_ids, kind='mergesort')
+        sorted_members = member_ids[member_order]
+        entry_members = self.member_ids[entries]
+        columns = np.minimum(np.searchsorted(sorted_members, entry_members), len(member_ids) - 1)
+        wanted = sorted_members[columns] == entry_members
+        values = self.values[entries][wanted]
+        if abstain != ABSTAIN:
+            values = np.where(values == ABSTAIN, abstain, values).astype(np.int8)
+        result[entry_rows[wanted], member_order[columns[wanted]]] = values
+        return result
+
+    def replace_rows(self, other):
+        """A new matrix with the rows of the votes of other replacing or
+        added to these"""
+        kept_rows = np.flatnonzero(~np.in1d(self.vote_ids, other.vote_ids))
+        kept_entries, _ = self._entries(kept_rows)
+        vote_ids = np.concatenate((self.vote_ids[kept_rows], other.vote_ids))
+        lengths = np.concatenate((np.diff(self.indptr)[kept_rows], np.diff(other.indptr)))
+        member_ids = np.concatenate((self.member_ids[kept_entries], other.member_ids))
+        values = np.concatenate((self.values[kept_entries], other.values))
+        # reorder the rows by vote id, keeping the entries of each row together
+        order = np.argsort(vote_ids, kind='mergesort')
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+        indptr = np.concatenate(([0], np.cumsum(lengths[order]))).astype(np.int64)
+        moved = VoteMatrix(vote_ids, np.concatenate((starts, [len(member_ids)])), member_ids, values)
+        entries, _ = moved._entries(order)
+        return VoteMatrix(vote_ids[order].astype(np.int32), indptr,
+                          member_ids[entries].astype(np.int32), values[entries].astype(np.int8))
+
+
+def _save_atomically(file_path, write):
+    tmp_path = '%s.%s.tmp' % (file_path, uuid.uuid4().hex)
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.rename(tmp_path, file_path)
+
+
+class VoteMatrixStore(object):
+    """The persisted vote matrix in a directory"""
+
+    MANIFEST = 'vote_matrix.json'
+
+    def __init__(self, path):
+        self.path = path
+        self._matrix = None
+        self._manifest_version = None
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, self.MANIFEST))
+
+    @contextmanager
+    def lock(self):
+        if not os.path.isdir(self.path):
+            try:
+                os.makedirs(self.path)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        with open(os.path.join(self.path, 'lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _generation(self):
+        with open(os.path.join(self.path, self.MANIFEST)) as f:
+            return json.load(f)['generation']
+
+    def load(self):
+        """The current matrix, mapped again when it was changed since, or
+        None if it was not built"""
+        manifest_path = os.path.join(self.path, self.MANIFEST)
+        for attempt in range(3):
+            try:
+                stat = os.stat(manifest_path)
+                # the manifest is replaced by a new file on every change
+                version = (stat.st_ino, stat.st_mtime)
+                if version != self._manifest_version:
+                    generation = self._generation()
+                    self._matrix = VoteMatrix(*[
+                        np.load(os.path.join(self.path, '%s.%s.npy' % (generation, part)), mmap_mode='r')
+                        for part in MATRIX_PARTS])
+                    self._manifest_version = version
+                return self._matrix
+            except (IOError, OSError) as e:
+                # an update removed the generation after the manifest was read
+                if e.errno != errno.ENOENT:
+                    raise
+                if not os.path.exists(manifest_path):
+                    return None
+        raise IOError(errno.ENOENT, 'the vote matrix is changing too fast to be read', self.path)
+
+    def save(self, matrix):
+        """Make matrix the current one, call under lock()"""
+        generation = uuid.uuid4().hex
+        for part in MATRIX_PARTS:
+            np.save(os.path.join(self.path, '%s.%s.npy' % (generation, part)), getattr(matrix, part))
+        _save_atomically(os.path.join(self.path, self.MANIFEST),
+                         lambda f: json.dump({'generation': generation}, f))
+        for name in os.listdir(self.path):
+            if name.endswith('.npy') and not name.startswith(generation + '.'):
+                os.remove(os.path.join(self.path, name))
+
+
+def _vote_actions(vote_ids=None):
+    """(vote id, member id, type) of the vote actions, ordered"""
+    actions = VoteAction.objects.order_by('vote', 'member').values_list('vote', 'member', 'type')
+    if vote_ids is None:
+        for row in actions.iterator():
+            yield row
+        return
+    vote_ids = sorted(vote_ids)
+    for i in range(0, len(vote_ids), 500):
+        for row in actions.filter(vote__in=vote_ids[i:i + 500]):
+            yield row
+
+
+_stores = {}
+
+
+def get_vote_matrix_store():
+    path = settings.VOTE_MATRIX_ROOT
+    if path not in _stores:
+        _stores[path] = VoteMatrixStore(path)
+    return _stores[path]
+
+
+def build_vote_matrix():
+    """Build the matrix of all the votes with one scan of the vote actions"""
+    store = get_vote_matrix_store()
+    matrix = VoteMatrix.from_actions(Vote.objects.values_list('id', flat=True), _vote_actions())
+    with store.lock():
+        store.save(matrix)
+    logger.info('built the vote matrix of %d votes, %d entries', len(matrix), matrix.nnz())
+    return matrix
+
+
+class _PendingVotes(threading.local):
+    def __init__(self):
+        self.deferred = 0
+        self.vote_ids = set()
+
+
+_pending_votes = _PendingVotes()
+
+
+@contextmanager
+def deferred_vote_matrix_update():
+    """Collect the votes updated inside the block, and write their rows in a
+    single new generation when it ends"""
+    _pending_votes.deferred += 1
+    try:
+        yield
+    finally:
+        _pending_votes.deferred -= 1
+        if not _pending_votes.deferred:
+            vote_ids, _pending_votes.vote_ids = _pending_votes.vote_ids, set()
+            _update_rows(vote_ids)
+
+
+def update_vote_matrix(vote_ids):
+    """Read again the rows of the votes, if the matrix was built"""
+    if _pending_votes.deferred:
+        _pending_votes.vote_ids.update(vote_ids)
+    else:
+        _update_rows(vote_ids)
+
+
+def _update_rows(vote_ids):
+    store = get_vote_matrix_store()
+    if not store.exists():
+        return
+    vote_ids = set(vote_ids)
+    if not vote_ids:
+        return
+    rows = VoteMatrix.from_actions(vote_ids, _vote_actions(vote_ids))
+    with store.lock():
+        store.save(store.load().replace_rows(rows))
+
+
+def get_vote_matrix(vote_ids=()):
+    """The vote matrix, built if needed, with the rows of vote_ids that are
+    missing from it added"""
+    store = get_vote_matrix_store()
+    matrix = store.load()
+    if matrix is None:
+        return build_vote_matrix()
+    missing = np.setdiff1d(np.asarray(list(vote_ids), dtype=np.int32), matrix.vote_ids)
+    if len(missing):
+        _update_rows(missing.tolist())
+        matrix = store.load()
+    return matrix
+
+
+def update_vote_matrix_for_vote_action(sender, instance, raw=False, **kwargs):
+    """post_save and post_delete handler of vote actions"""
+    if not raw:
+        update_vote_matrix([instance.vote_id])
@@ -0,0 +1,188 @@
+# encoding: utf-8
+"""
+Batch calculation of the properties of votes: the number of members who
+voted against their party, the coalition or the opposition, or against
+their own bill, and the vote counters.
+"""
+import datetime
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+
+from knesset.cache_invalidation import invalidate_for_instances
+from laws import constants
+from laws.helpers import resolve_vote_type_by_title, MissingVotePartyException
+from laws.models.bill import Bill
+from laws.models.daily_voting_statistics import DailyVotingStatistics
+from laws.models.vote_action import VoteAction
+from mks.models import Membership, CoalitionMembership
+
+import logging
+
+logger = logging.getLogger("open-knesset.laws.vote_properties")
+
+VOTE_ACTION_FLAGS = ('against_party', 'against_coalition', 'against_opposition', 'against_own_bill')
+VOTE_ACTION_TYPES = ('for', 'against', 'abstain')
+
+
+def _in_period(start_date, end_date, date):
+    return (not start_date or start_date <= date) and (not end_date or end_date >= date)
+
+
+class VotePropertiesCalculator(object):
+    """Calculates the properties of many votes at once.
+
+    Memberships and coalition periods are loaded once, and the properties of
+    each batch of votes are computed from all of their vote actions with
+    grouped array operations, instead of the per vote action queries of
+    party_at and is_coalition_at.
+    """
+
+    def __init__(self):
+        self._memberships = defaultdict(list)
+        # same order as party_at, latest membership first
+        for member_id, party_id, start_date, end_date in Membership.objects.values_list(
+                'member_id', 'party_id', 'start_date', 'end_date'):
+            self._memberships[member_id].append((start_date, end_date, party_id))
+        for memberships in self._memberships.values():
+            memberships.sort(key=lambda m: m[0] or datetime.date.max, reverse=True)
+
+        self._coalition_memberships = defaultdict(list)
+        for party_id, start_date, end_date in CoalitionMembership.objects.values_list(
+                'party_id', 'start_date', 'end_date'):
+            self._coalition_memberships[party_id].append((start_date, end_date))
+
+        self._party_at = {}
+        self._is_coalition_at = {}
+
+    def party_at(self, member_id, date):
+        key = (member_id, date)
+        if key not in self._party_at:
+            self._party_at[key] = next((party_id for start_date, end_date, party_id in self._memberships[member_id]
+                                        if _in_period(start_date, end_date, date)), None)
+        return self._party_at[key]
+
+    def is_coalition_at(self, party_id, date):
+        key = (party_id, date)
+        if key not in self._is_coalition_at:
+            self._is_coalition_at[key] = any(_in_period(start_date, end_date, date)
+                                             for start_date, end_date in self._coalition_memberships[party_id])
+        return self._is_coalition_at[key]
+
+    def _proposers(self, vote_ids):
+        """(vote id, member id) of the proposers of the bills each vote is about"""
+        vote_ids = set(vote_ids)
+        proposers = set()
+        for relation in ('pre_votes', 'first_vote', 'approval_vote'):
+            for vote_id, member_id in Bill.objects.filter(**{relation + '__in': vote_ids}).values_list(
+                    relation, 'proposers'):
+                if vote_id in vote_ids and member_id is not None:
+                    proposers.add((vote_id, member_id))
+        return proposers
+
+    def calculate(self, votes, actions, proposers):
+        """Return the vote fields per vote id and the flags per vote action id.
+
+        votes is a list of (id, time, title), actions a list of (id, vote id,
+        member id, type) and proposers a set of (vote id, member id).
+        """
+        vote_index = dict((vote_id, i) for i, (vote_id, time, title) in enumerate(votes))
+        vote_dates = [time.date() for vote_id, time, title in votes]
+
+        action_votes = np.array([vote_index[a[1]] for a in actions], dtype=int)
+        action_types = np.array([a[3] for a in actions], dtype=object)
+        is_for = action_types == 'for'
+        is_against = action_types == 'against'
+
+        parties = []
+        for action_id, vote_id, member_id, action_type in actions:
+            party_id = self.party_at(member_id, vote_dates[vote_index[vote_id]])
+            if party_id is None:
+                raise MissingVotePartyException(
+                    'could not find which party member %s belonged to during vote %s' % (member_id, vote_id))
+            parties.append(party_id)
+        party_ids = sorted(set(parties))
+        party_index = dict((party_id, i) for i, party_id in enumerate(party_ids))
+        action_parties = np.array([party_index[party_id] for party_id in parties], dtype=int)
+        is_coalition = np.array([self.is_coalition_at(party_id, vote_dates[vote_index[a[1]]])
+                                 for party_id, a in zip(parties, actions)], dtype=bool)
+        is_proposer = np.array([(a[1], a[2]) in proposers for a in actions], dtype=bool)
+
+        num_votes = len(votes)
+
+        def count(mask, groups=action_votes, size=num_votes):
+            return np.bincount(groups[mask], minlength=size) if len(groups) else np.zeros(size, dtype=int)
+
+        def stands(for_votes, against_votes):
+            total = for_votes + against_votes
+            return (for_votes > constants.STANDS_FOR_THRESHOLD * total,
+                    against_votes > constants.STANDS_FOR_THRESHOLD * total)
+
+        # party stands per (vote, party)
+        cells = action_votes * len(party_ids) + action_parties
+        num_cells = num_votes * len(party_ids)
+        party_stands_for, party_stands_against = stands(count(is_for, cells, num_cells),
+                                                        count(is_against, cells, num_cells))
+        coalition_stands_for, coalition_stands_against = stands(count(is_for & is_coalition),
+                                                                count(is_against & is_coalition))
+        opposition_stands_for, opposition_stands_against = stands(count(is_for & ~is_coalition),
+                                                                  count(is_against & ~is_coalition))
+
+        def against(stands_for, stands_against, groups):
+            return (stands_for[groups] & is_against) | (stands_against[groups] & is_for)
+
+        flags = dict(
+            against_party=against(party_stands_for, party_stands_against, cells),
+            against_coalition=is_coalition & against(coalition_stands_for, coalition_stands_against, action_votes),
+            against_opposition=~is_coalition & against(opposition_stands_for, opposition_stands_against,
+                                                       action_votes),
+            against_own_bill=is_proposer & is_against,
+        )
+
+        vote_counts = dict((flag, count(flags[flag])) for flag in VOTE_ACTION_FLAGS)
+        vote_counts['votes_count'] = count(np.ones(len(actions), dtype=bool))
+        for action_type in VOTE_ACTION_TYPES:
+            vote_counts['%s_votes_count' % action_type] = count(action_types == action_type)
+
+        vote_fields = {}
+        for i, (vote_id, time, title) in enumerate(votes):
+            fields = dict((name, int(values[i])) for name, values in vote_counts.items())
+            fields['controversy'] = min(fields['for_votes_count'], fields['against_votes_count'])
+            fields['vote_type'] = resolve_vote_type_by_title(title)
+            vote_fields[vote_id] = fields
+
+        action_flags = dict((a[0], tuple(bool(flags[flag][j]) for flag in VOTE_ACTION_FLAGS))
+                            for j, a in enumerate(actions))
+        return vote_fields, action_flags
+
+    def update_votes(self, vote_ids):
+        """Calculate and save the properties of the given votes.
+
+        Only the vote actions whose flags changed are written, with one
+        update per combination of flags. Returns the vote fields per vote id.
+        """
+        from laws.models.vote import Vote
+        vote_ids = list(vote_ids)
+        votes = list(Vote.objects.filter(id__in=vote_ids).order_by().values_list('id', 'time', 'title'))
+        actions = list(VoteAction.objects.filter(vote__in=vote_ids).order_by().values_list(
+            'id', 'vote_id', 'member_id', 'type', *VOTE_ACTION_FLAGS))
+        vote_fields, action_flags = self.calculate(votes, [a[:4] for a in actions], self._proposers(vote_ids))
+
+        changed_actions = defaultdict(list)
+        for action in actions:
+            if action_flags[action[0]] != tuple(action[4:]):
+                changed_actions[action_flags[action[0]]].append(action[0])
+
+        with transaction.atomic():
+            for flags, action_ids in changed_actions.items():
+                for i in range(0, len(action_ids), 500):
+                    VoteAction.objects.filter(id__in=action_ids[i:i + 500]).update(
+                        **dict(zip(VOTE_ACTION_FLAGS, flags)))
+            for vote_id, fields in vote_fields.items():
+                Vote.objects.filter(id=vote_id).update(**fields)
+            DailyVotingStatistics.objects.update_for_votes(vote_ids)
+        # the updates above send no signals
+        member_ids = set(action[2] for action in actions)
+        invalidate_for_instances(VoteAction(member_id=member_id) for member_id in member_ids)
+        return vote_fields
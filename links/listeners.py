@@ -0,0 +1,15 @@
+from knesset.cache_invalidation import invalidated_by
+from managers import links_cache_key
+from models import Link, LinkType
+
+
+@invalidated_by(Link)
+def link_cache_keys(instance):
+    return [links_cache_key(instance.content_type_id, instance.object_pk)]
+
+
+@invalidated_by(LinkType)
+def link_type_cache_keys(instance):
+    # the cached links hold their type
+    return [links_cache_key(content_type_id, object_pk) for content_type_id, object_pk in
+            Link.objects.filter(link_type=instance).values_list('content_type', 'object_pk').distinct()]
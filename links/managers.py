@@ -1,8 +1,14 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 from django.contrib.contenttypes.models import ContentType
 from django.utils.encoding import force_unicode
 
 
+def links_cache_key(content_type_id, object_pk):
+    return 'links_%s_%s' % (content_type_id, object_pk)
+
+
 class LinksManager(models.Manager):
 
     def for_model(self, model):
@@ -16,3 +22,36 @@ class LinksManager(models.Manager):
         if isinstance(model, models.Model):
             qs = qs.filter(object_pk=force_unicode(model._get_pk_val()))
         return qs
+
+    def for_objects(self, model, pks):
+        """
+        The active links of the objects of model with pks, as a dict of
+        object pk (unicode) to a list of links. The links of each object are
+        cached until one of them is saved or deleted, the ones missing from the
+        cache are read in one query.
+        """
+        ct = ContentType.objects.get_for_model(model)
+        keys = dict((links_cache_key(ct.id, force_unicode(pk)), force_unicode(pk)) for pk in pks)
+        links = dict((keys[key], value) for key, value in cache.get_many(keys.keys()).items())
+        missing = sorted(set(keys.values()) - set(links))
+        if missing:
+            read = dict((pk, []) for pk in missing)
+            for i in range(0, len(missing), 500):
+                for link in self.for_model(model).filter(object_pk__in=missing[i:i + 500]).order_by('id'):
+                    read[link.object_pk].append(link)
+            cache.set_many(dict((links_cache_key(ct.id, pk), value) for pk, value in read.items()),
+                           settings.LONG_CACHE_TIME)
+            links.update(read)
+        return links
+
+    def attach_links(self, objects):
+        """
+        Set the cached_links of model instances of one model, which the links
+        template tags display, to their links.
+        """
+        objects = list(objects)
+        if not objects:
+            return
+        links = self.for_objects(objects[0].__class__, [obj.pk for obj in objects])
+        for obj in objects:
+            obj.cached_links = links[force_unicode(obj.pk)]
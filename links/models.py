@@ -70,3 +70,7 @@ class ModelWithLinks():
     def get_links(self):
         # TODO: this is not tested.
         return Link.objects.filter(active=True, content_object=self)
+
+
+# force signal connections
+from listeners import *
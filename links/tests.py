@@ -8,6 +8,9 @@ from django.core.urlresolvers import reverse
 from django.core.files import File
 from django.contrib.sites.models import Site
 from django.template import Template, Context
+from django.contrib.contenttypes.models import ContentType
+from knesset.cache_invalidation import keys_for_instance
+from links.managers import links_cache_key
 from links.models import Link, LinkType, ModelWithLinks
 from mks.models import Member, Knesset
 
@@ -68,6 +71,21 @@ class TestModels(unittest.TestCase):
         self.assertEqual(self.link.link_type, self.default_link)
         self.assertEqual(self.link.__unicode__(), u'google: http://www.google.com/')
 
+    def testForObjects(self):
+        other_mk = Member.objects.create(name='other MK')
+        links = Link.objects.for_objects(Member, [self.mk.pk, other_mk.pk])
+        self.assertEqual(links, {unicode(self.mk.pk): [self.link], unicode(other_mk.pk): []})
+        members = list(Member.objects.filter(pk__in=[self.mk.pk, other_mk.pk]).order_by('pk'))
+        Link.objects.attach_links(members)
+        self.assertEqual([member.cached_links for member in members], [[self.link], []])
+        other_mk.delete()
+
+    def testCacheKeys(self):
+        ct = ContentType.objects.get_for_model(Member)
+        key = links_cache_key(ct.id, self.mk.pk)
+        self.assertIn(key, keys_for_instance(self.link))
+        self.assertIn(key, keys_for_instance(self.default_link))
+
     def tearDown(self):
         self.knesset.delete()
         self.default_link.delete()
@@ -105,9 +105,8 @@ class MemberAdmin(ImportExportModelAdmin):
 
     def save_model(self, request, obj, form, change):
         super(MemberAdmin, self).save_model(request, obj, form, change)
-        # Delete the cache of the current member after updating:
-        cache.delete('mk_%d' % obj.id)
-        # Delete the template key
+        # The member page cache is deleted by the post_save signal, see
+        # mks.listeners. Delete the template key
         obj_url = urllib.unquote(obj.get_absolute_url())
         if not isinstance(obj_url, unicode):
             obj_url = obj_url.decode('utf-8')
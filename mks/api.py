@@ -2,7 +2,6 @@
 Api for the members app
 '''
 import urllib
-import math
 import logging
 from django.core.urlresolvers import reverse
 from django.core.cache import cache
@@ -15,6 +14,7 @@ from tagging.models import Tag
 from tagging.utils import calculate_cloud
 from apis.resources.base import BaseResource, BaseNonModelResource
 from models import Member, Party, Knesset
+from utils import MemberDistributionIndex
 from agendas.models import Agenda
 from video.utils import get_videos_queryset
 from video.api import VideoResource
@@ -298,27 +298,8 @@ class MemberResource(BaseResource):
         SCALE = 5
         member = bundle.obj
 
-        rel_location = cache.get('average_presence_location_%d' % member.id)
-        if not rel_location:
-
-            presence_list = sorted(map(lambda member: member.average_weekly_presence_hours,
-                                       Member.objects.all()))
-            presence_groups = int(math.ceil(len(presence_list) / float(SCALE)))
-
-            # Generate cache for all members
-            for mk in Member.objects.all():
-                avg = mk.average_weekly_presence_hours
-                if avg:
-                    mk_location = 1 + (presence_list.index(avg) / presence_groups)
-                else:
-                    mk_location = 0
-
-                cache.set('average_presence_location_%d' % mk.id, mk_location, 60 * 60 * 24)
-
-                if mk.id == member.id:
-                    rel_location = mk_location
-
-        return rel_location
+        return MemberDistributionIndex.get().scale_location(
+            'average_weekly_presence_hours', member.average_weekly_presence_hours, SCALE)
 
     def build_filters(self, filters=None):
         if filters is None:
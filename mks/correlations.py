@@ -0,0 +1,81 @@
+'''
+Voting agreement of every pair of members, computed from the vote matrix
+'''
+from __future__ import division
+import datetime
+
+import numpy as np
+from django.db import transaction
+
+from laws.models import Vote
+from laws.vote_matrix import FOR, AGAINST, get_vote_matrix
+from mks.models import Member, Correlation
+
+import logging
+
+logger = logging.getLogger("open-knesset.mks.correlations")
+
+
+def member_correlations(matrix, vote_ids, min_votes=1):
+    """Agreement of the members who voted for or against in the votes.
+
+    Returns (member_ids, scores, together): scores[i, j] is the number of
+    votes in which members i and j voted the same way less the number in
+    which they voted oppositely, and together[i, j] the number of votes in
+    which both voted for or against. Members with fewer than min_votes such
+    votes are left out.
+    """
+    vote_ids = np.asarray(list(vote_ids), dtype=np.int32)
+    member_ids = matrix.voters(vote_ids)
+    votes = matrix.dense(vote_ids, member_ids)
+    # +1 for, -1 against, 0 otherwise; the products of two members' columns
+    # are +1 when they agree and -1 when they disagree
+    stands = (votes == FOR).astype(np.float64) - (votes == AGAINST)
+    voted = (stands != 0).astype(np.float64)
+    enough = voted.sum(axis=0) >= min_votes
+    stands, voted, member_ids = stands[:, enough], voted[:, enough], member_ids[enough]
+    scores = np.dot(stands.T, stands)
+    together = np.dot(voted.T, voted)
+    return member_ids, np.rint(scores).astype(np.int64), np.rint(together).astype(np.int64)
+
+
+def _window_vote_ids(knesset=None, from_date=None, to_date=None):
+    votes = Vote.objects.all()
+    if knesset is not None:
+        from_date = max(from_date, knesset.start_date) if from_date else knesset.start_date
+        if knesset.end_date:
+            to_date = min(to_date, knesset.end_date) if to_date else knesset.end_date
+    if from_date:
+        votes = votes.filter(time__gte=from_date)
+    if to_date:
+        votes = votes.filter(time__lt=to_date + datetime.timedelta(days=1))
+    return votes.values_list('id', flat=True)
+
+
+def update_correlations(knesset=None, from_date=None, to_date=None, min_votes=1):
+    """Replace the Correlation table with the agreement of all the pairs of
+    members in the votes of a knesset or a date range, all the votes by
+    default. Returns the number of pairs"""
+    vote_ids = list(_window_vote_ids(knesset, from_date, to_date))
+    matrix = get_vote_matrix(vote_ids)
+    member_ids, scores, together = member_correlations(matrix, vote_ids, min_votes)
+    parties = dict(Member.objects.filter(id__in=member_ids.tolist()).values_list('id', 'current_party'))
+
+    # both directions of each pair, Member.HighestCorrelations reads m1
+    firsts, seconds = np.nonzero(together > 0)
+    pairs = firsts != seconds
+    firsts, seconds = firsts[pairs], seconds[pairs]
+    normalized = scores[firsts, seconds] / together[firsts, seconds]
+    correlations = []
+    for first, second, score, normalized_score in zip(
+            member_ids[firsts].tolist(), member_ids[seconds].tolist(),
+            scores[firsts, seconds].tolist(), normalized.tolist()):
+        party_1, party_2 = parties.get(first), parties.get(second)
+        not_same_party = None if party_1 is None or party_2 is None else party_1 != party_2
+        correlations.append(Correlation(m1_id=first, m2_id=second, score=score,
+                                        normalized_score=normalized_score, not_same_party=not_same_party))
+    with transaction.atomic():
+        Correlation.objects.all().delete()
+        Correlation.objects.bulk_create(correlations, batch_size=500)
+    logger.info('%d correlations of %d members in %d votes', len(correlations), len(member_ids), len(vote_ids))
+    return len(correlations)
@@ -1,7 +1,10 @@
 #encoding: utf-8
 from django.db.models.signals import post_save, post_delete
+from django.contrib.contenttypes.models import ContentType
 from planet.models import Feed, Post
 from actstream import action
+from actstream.models import Follow
+from knesset.cache_invalidation import invalidated_by
 from knesset.utils import cannonize, disable_for_loaddata
 from links.models import Link, LinkType
 from models import Member, Knesset
@@ -42,3 +45,23 @@ def reset_current_knesset(sender, instance, **kwargs):
     Knesset.objects._current_knesset = None
 post_save.connect(reset_current_knesset, sender=Knesset)
 post_delete.connect(reset_current_knesset, sender=Knesset)
+
+
+@invalidated_by(Member)
+def member_cache_keys(instance):
+    # imported here, since mks.utils depends on persons.models which depends on mks.models
+    from utils import member_fragment_cache_keys, member_list_cache_key, MEMBER_LIST_STAT_TYPES
+    keys = member_fragment_cache_keys(instance.id)
+    keys.extend(member_list_cache_key(stat_type) for stat_type in MEMBER_LIST_STAT_TYPES)
+    keys.append('members_tooltip')
+    keys.extend(prefix + str(instance.pk) for prefix in
+                ('api_v2_member_agendas_', 'api_v2_member_mmms_', 'api_v2_member_votes_'))
+    return keys
+
+
+@invalidated_by(Follow)
+def member_followers_cache_keys(instance):
+    if instance.content_type_id != ContentType.objects.get_for_model(Member).id:
+        return []
+    from utils import member_fragment_cache_keys, member_list_cache_key
+    return member_fragment_cache_keys(int(instance.object_id), ['stats']) + [member_list_cache_key('followers')]
@@ -1,6 +1,8 @@
 from django.core.management.base import NoArgsCommand
 from logging import getLogger
 from mks.models import Member
+from mks.party_stats import PartyStatistics
+from mks.utils import MemberDistributionIndex
 from django.core.cache import cache
 
 logger = getLogger(__name__)
@@ -15,9 +17,11 @@ class Command(NoArgsCommand):
             logger.info(u'Recalculate bill statistics For mk: {0}'.format(mk.name))
             mk.recalc_bill_statistics()
 
+        MemberDistributionIndex.rebuild()
         self._invalidate_cache()
 
     def _invalidate_cache(self):
         for info_type in self.info_types:
             if cache.get('object_list_by_%s' % info_type):
                 cache.delete('object_list_by_%s' % info_type)
+        PartyStatistics.invalidate()
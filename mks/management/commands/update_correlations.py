@@ -0,0 +1,41 @@
+from datetime import datetime
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand, CommandError
+
+from mks.correlations import update_correlations
+from mks.models import Knesset
+
+
+class Command(NoArgsCommand):
+    help = "Recalculates the voting correlations of all the pairs of mks, of all the votes by default"
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--knesset', action='store', type='int', dest='knesset',
+                    help="only the votes of this knesset number"),
+        make_option('--from', action='store', dest='from_date',
+                    help="only the votes since this date, YYYY-MM-DD"),
+        make_option('--to', action='store', dest='to_date',
+                    help="only the votes until this date, YYYY-MM-DD"),
+        make_option('--min-votes', action='store', type='int', dest='min_votes', default=1,
+                    help="leave out mks who voted for or against fewer times"),
+    )
+
+    def _parse_date(self, value):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('invalid date %s, expected YYYY-MM-DD' % value)
+
+    def handle_noargs(self, **options):
+        knesset = None
+        if options.get('knesset'):
+            try:
+                knesset = Knesset.objects.get(number=options['knesset'])
+            except Knesset.DoesNotExist:
+                raise CommandError('unknown knesset %s' % options['knesset'])
+        count = update_correlations(knesset, self._parse_date(options.get('from_date')),
+                                    self._parse_date(options.get('to_date')), options['min_votes'])
+        self.stdout.write('%d correlations' % count)
@@ -1,7 +1,7 @@
 import difflib
 from django.core.cache import cache
 from django.db import models, connection
-from django.db.models import Q
+from django.db.models import Avg, Q
 
 
 # from agendas.models import Agenda
@@ -137,3 +137,57 @@ class MembershipManager(models.Manager):
             cursor.execute(query, query_parameters)
             results = cursor.fetchall()
             return [c[0] for c in results]
+
+
+class WeeklyPresenceManager(models.Manager):
+    # ids per query
+    chunk_size = 500
+
+    def upsert(self, hours):
+        """Store the weekly hours of members, given as {(member_id, date): hours}.
+        Missing weeks are inserted together, and changed weeks are updated with
+        one query per value of hours. Returns the ids of the members changed.
+        """
+        member_ids = sorted(set(member_id for member_id, week in hours))
+        changed = {}  # hours: ids of the rows to update
+        changed_members = set()
+        existing = set()
+        for i in range(0, len(member_ids), self.chunk_size):
+            rows = self.filter(member__in=member_ids[i:i + self.chunk_size]).values_list(
+                'id', 'member_id', 'date', 'hours')
+            for row_id, member_id, week, row_hours in rows:
+                key = (member_id, week)
+                if key not in hours:
+                    continue
+                existing.add(key)
+                if row_hours != hours[key]:
+                    changed.setdefault(hours[key], []).append(row_id)
+                    changed_members.add(member_id)
+        new_rows = [self.model(member_id=member_id, date=week, hours=week_hours)
+                    for (member_id, week), week_hours in sorted(hours.items()) if (member_id, week) not in existing]
+        self.bulk_create(new_rows, batch_size=self.chunk_size)
+        changed_members.update(row.member_id for row in new_rows)
+        for week_hours, row_ids in changed.items():
+            for i in range(0, len(row_ids), self.chunk_size):
+                self.filter(id__in=row_ids[i:i + self.chunk_size]).update(hours=week_hours)
+        return changed_members
+
+    def recalc_average_hours(self, members):
+        """Recompute the average weekly presence of members with one query,
+        like Member.recalc_average_weekly_presence_hours, and save the members
+        whose average changed"""
+        from mks.models import Knesset
+        members = list(members)
+        d = Knesset.objects.current_knesset().start_date
+        averages = {}
+        member_ids = [member.id for member in members]
+        for i in range(0, len(member_ids), self.chunk_size):
+            averages.update(self.filter(date__gt=d, member__in=member_ids[i:i + self.chunk_size]).values(
+                'member').annotate(average=Avg('hours')).values_list('member', 'average'))
+        for member in members:
+            average = averages.get(member.id)
+            if average is not None:
+                average = round(average, 1)
+            if member.average_weekly_presence_hours != average:
+                member.average_weekly_presence_hours = average
+                member.save()
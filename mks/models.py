@@ -21,7 +21,8 @@ from links.models import Link
 
 from mks.managers import (
     PartyManager, KnessetManager, CurrentKnessetMembersManager,
-    CurrentKnessetPartyManager, MembershipManager, CurrentKnessetActiveMembersManager, MemberManager)
+    CurrentKnessetPartyManager, MembershipManager, CurrentKnessetActiveMembersManager, MemberManager,
+    WeeklyPresenceManager)
 
 GENDER_CHOICES = (
     (u'M', _('Male')),
@@ -573,6 +574,8 @@ class WeeklyPresence(models.Model):
     hours = models.FloatField(
         blank=True)  # number of hours this member was present during this week
 
+    objects = WeeklyPresenceManager()
+
     def __unicode__(self):
         return "%s %s %.1f" % (self.member.name, str(self.date), self.hours)
 
@@ -0,0 +1,140 @@
+'''
+Statistics of the parties of the current knesset, for the parties pages
+'''
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, Q
+from django.utils.functional import Promise
+
+from laws.vote_choices import BILL_AGRR_STAGES
+from mks.models import Member, Party, Knesset, WeeklyPresence
+
+
+def _average(values, digits=1):
+    """Rounded average of the truthy values, 0 if there are none"""
+    values = [v for v in values if v]
+    return round(float(sum(values)) / len(values), digits) if values else 0
+
+
+class PartyStatistics(object):
+    """Computes a statistic for all the parties of the current knesset at once.
+
+    Each statistic is computed with a single grouped query and kept in the
+    cache as a {party id: value} dict, under a key that includes a version
+    number. Sync jobs call invalidate() after they change the underlying
+    data, which makes every statistic be computed again on its next use.
+    """
+
+    VERSION_CACHE_KEY = 'party_statistics_version'
+
+    BILL_STAGES = {
+        'bills-proposed': Q(),
+        'bills-pre': BILL_AGRR_STAGES['pre'],
+        'bills-first': BILL_AGRR_STAGES['first'],
+        'bills-approved': BILL_AGRR_STAGES['approved'],
+    }
+
+    def __init__(self):
+        self.knesset = Knesset.objects.current_knesset()
+        self.parties = list(Party.objects.filter(knesset=self.knesset))
+        self.party_ids = [party.id for party in self.parties]
+
+    @classmethod
+    def get(cls, stat_type):
+        """Return the {party id: value} dict of stat_type, computing it if needed"""
+        version = cache.get(cls.VERSION_CACHE_KEY)
+        if version is None:
+            version = cls.invalidate()
+        key = 'party_statistics_%s_%s' % (stat_type, version)
+        values = cache.get(key)
+        if values is None:
+            values = cls().compute(stat_type)
+            cache.set(key, values, settings.LONG_CACHE_TIME)
+        return values
+
+    @classmethod
+    def invalidate(cls):
+        """Mark all the cached statistics as stale"""
+        version = uuid.uuid4().hex
+        cache.set(cls.VERSION_CACHE_KEY, version, settings.LONG_CACHE_TIME)
+        return version
+
+    def compute(self, stat_type):
+        if stat_type in self.BILL_STAGES:
+            return self.bills(self.BILL_STAGES[stat_type])
+        return getattr(self, stat_type.replace('-', '_'))()
+
+    def _voting_statistics(self, method):
+        # imported here, since laws.models depends on mks.models
+        from laws.models import DailyVotingStatistics
+        from laws.models.daily_voting_statistics import COUNT_FIELDS
+        from laws.models.party_voting_statistics import PartyVotingStatistics
+        counts = DailyVotingStatistics.objects.totals_by(
+            'member__current_party', self.knesset.start_date, member__current_party__in=self.party_ids)
+        values = {}
+        for party in self.parties:
+            statistics = PartyVotingStatistics(party=party)
+            statistics.counts = counts.get(party.id, dict.fromkeys(COUNT_FIELDS, 0))
+            value = getattr(statistics, method)()
+            # the discipline of a party without votes is a translated 'N/A'
+            values[party.id] = None if isinstance(value, Promise) else value
+        return values
+
+    def votes_per_seat(self):
+        return self._voting_statistics('votes_per_seat')
+
+    def discipline(self):
+        return self._voting_statistics('discipline')
+
+    def coalition_discipline(self):
+        return self._voting_statistics('coalition_discipline')
+
+    def _member_averages(self, field):
+        values = defaultdict(list)
+        for party_id, value in Member.objects.filter(current_party__in=self.party_ids).values_list(
+                'current_party', field):
+            values[party_id].append(value)
+        return dict((party.id, _average(values[party.id])) for party in self.parties)
+
+    def residence_centrality(self):
+        return self._member_averages('residence_centrality')
+
+    def residence_economy(self):
+        return self._member_averages('residence_economy')
+
+    def bills(self, stage_filter):
+        """Bills proposed in the current knesset by members of each party, per seat"""
+        # imported here, since laws.models depends on mks.models
+        from laws.models import Bill
+        bill_ids = Bill.objects.filter(stage_filter, proposals__date__gt=self.knesset.start_date).values('id')
+        bills = defaultdict(set)
+        for party_id, bill_id in Bill.proposers.through.objects.filter(
+                bill__in=bill_ids, member__current_party__in=self.party_ids).values_list(
+                'member__current_party', 'bill'):
+            bills[party_id].add(bill_id)
+        return dict((party.id, round(float(len(bills[party.id])) / party.number_of_seats, 1))
+                    for party in self.parties)
+
+    def presence(self):
+        """Average of the members' average weekly presence hours"""
+        presence = defaultdict(list)
+        for row in WeeklyPresence.objects.filter(
+                date__gt=self.knesset.start_date, member__current_party__in=self.party_ids).order_by().values(
+                'member', 'member__current_party').annotate(hours=Avg('hours')):
+            presence[row['member__current_party']].append(round(row['hours'], 1))
+        return dict((party.id, _average(presence[party.id])) for party in self.parties)
+
+    def committees(self):
+        """Average of the members' committee meetings per month"""
+        meetings = defaultdict(list)
+        for member in Member.objects.filter(
+                current_party__in=self.party_ids,
+                committee_meetings__date__gte=self.knesset.start_date).annotate(
+                meetings_count=Count('committee_meetings')):
+            service_time = member.service_time()
+            if service_time:
+                meetings[member.current_party_id].append(round(member.meetings_count * 30.0 / service_time, 2))
+        return dict((party.id, _average(meetings[party.id])) for party in self.parties)
@@ -0,0 +1,53 @@
+import shutil
+import tempfile
+from datetime import date, datetime
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from laws.models import Vote, VoteAction
+from mks.correlations import update_correlations
+from mks.models import Correlation, Knesset, Member, Party
+
+
+class CorrelationsTest(TestCase):
+    def setUp(self):
+        super(CorrelationsTest, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.settings_override = override_settings(VOTE_MATRIX_ROOT=self.path)
+        self.settings_override.enable()
+        self.knesset = Knesset.objects.create(number=1, start_date=date(2011, 1, 1))
+        self.party_1 = Party.objects.create(name='party 1', knesset=self.knesset)
+        self.party_2 = Party.objects.create(name='party 2', knesset=self.knesset)
+        self.mk_1 = Member.objects.create(name='mk 1', current_party=self.party_1)
+        self.mk_2 = Member.objects.create(name='mk 2', current_party=self.party_1)
+        self.mk_3 = Member.objects.create(name='mk 3', current_party=self.party_2)
+        votes = [
+            (datetime(2010, 6, 1), ['against', 'for', 'for']),
+            (datetime(2011, 2, 1), ['for', 'for', 'against']),
+            (datetime(2011, 3, 1), ['for', 'for', 'abstain']),
+            (datetime(2011, 4, 1), ['against', 'for', 'for']),
+        ]
+        for i, (time, types) in enumerate(votes):
+            vote = Vote.objects.create(title='vote %d' % i, time=time)
+            for mk, vote_type in zip((self.mk_1, self.mk_2, self.mk_3), types):
+                VoteAction.objects.create(vote=vote, member=mk, type=vote_type, party=mk.current_party)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.path)
+        super(CorrelationsTest, self).tearDown()
+
+    def test_update_correlations(self):
+        Correlation.objects.create(m1=self.mk_1, m2=self.mk_3, score=10)
+        # both directions of the 3 pairs
+        self.assertEqual(update_correlations(knesset=self.knesset), 6)
+        c = Correlation.objects.get(m1=self.mk_1, m2=self.mk_2)
+        self.assertEqual((c.score, c.normalized_score, c.not_same_party), (1, 1 / 3.0, False))
+        c = Correlation.objects.get(m1=self.mk_3, m2=self.mk_1)
+        self.assertEqual((c.score, c.normalized_score, c.not_same_party), (-2, -1.0, True))
+        self.assertEqual(list(self.mk_2.HighestCorrelations()),
+                         list(Correlation.objects.filter(m1=self.mk_2).order_by('-normalized_score')))
+
+        update_correlations(from_date=date(2011, 3, 1))
+        self.assertEqual(Correlation.objects.get(m1=self.mk_2, m2=self.mk_1).normalized_score, 0.0)
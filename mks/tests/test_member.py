@@ -4,7 +4,8 @@ from django.test import TestCase
 
 from laws.enums import BillStages
 from laws.models import Bill, PrivateProposal
-from mks.models import Knesset, Party, Member, Membership, MemberAltname
+from mks.models import Knesset, Party, Member, Membership, MemberAltname, WeeklyPresence
+from mks.utils import MemberDistributionIndex, percentile
 from mks.tests.base import ten_days_ago, two_days_ago
 
 
@@ -129,6 +130,38 @@ class TestMember(TestCase):
         self.assertEqual(self.member.bills_stats_first, 0)
         self.assertEqual(self.member.bills_stats_approved, 0)
 
+    def test_member_distribution_index_places_members(self):
+        # is_current, presence hours, committee presence and bill stats
+        rows = [(True, 10.0, 1.0, 1, 0, 0, 0),
+                (True, 20.0, 1.0, 2, 0, 0, 0),
+                (False, None, None, 3, 0, 0, 0),
+                (True, 30.0, 1.0, 4, 0, 0, 0),
+                (True, 40.0, 1.0, 5, 0, 0, 0)]
+        index = MemberDistributionIndex(rows)
+
+        self.assertEqual(index.percentile('average_weekly_presence_hours', 25.0), 50)
+        self.assertEqual(index.percentile('average_weekly_presence_hours', 40.0), percentile(25.0, 125.0, 40.0))
+        # no variance among the current members
+        self.assertEqual(index.percentile('average_monthly_committee_presence', 1.0), 0)
+
+        self.assertEqual(index.scale_location('average_weekly_presence_hours', 10.0), 2)
+        self.assertEqual(index.scale_location('average_weekly_presence_hours', 40.0), 5)
+        self.assertEqual(index.scale_location('average_weekly_presence_hours', None), 0)
+
+    def test_weekly_presence_upsert_recalcs_average_once(self):
+        today = datetime.date.today()
+        yesterday = today - datetime.timedelta(days=1)
+        WeeklyPresence.objects.create(member=self.member, date=yesterday, hours=10.0)
+        changed = WeeklyPresence.objects.upsert({(self.member.id, yesterday): 20.0, (self.member.id, today): 25.0})
+        self.assertEqual(changed, set([self.member.id]))
+        self.assertEqual(sorted(WeeklyPresence.objects.filter(member=self.member).values_list('date', 'hours')),
+                         [(yesterday, 20.0), (today, 25.0)])
+        self.assertEqual(WeeklyPresence.objects.upsert({(self.member.id, today): 25.0}), set())
+
+        WeeklyPresence.objects.recalc_average_hours([self.member])
+        self.assertEqual(Member.objects.get(id=self.member.id).average_weekly_presence_hours, 22.5)
+        self.assertEqual(self.member.average_weekly_presence(), 22.5)
+
     def test_member_current_knesset_bills_link(self):
         url = self.member.get_current_knesset_bills_by_stage_url(stage='first')
         current_knesset = Knesset.objects.current_knesset().number
@@ -105,6 +105,22 @@ class MemberViewsTestCase(TestCase):
         # self.assertEqual(map(just_id, object_list),
         #                 [ self.party_1.id, self.party_2.id, ])
 
+    def testPartyStats(self):
+        Party.objects.filter(id=self.party_1.id).update(number_of_seats=2)
+        Party.objects.filter(id=self.party_2.id).update(number_of_seats=1)
+        for stat_type in ('votes-per-seat', 'discipline', 'coalition-discipline', 'bills-proposed',
+                          'bills-approved', 'presence', 'committees'):
+            res = self.client.get(reverse('party-stats', kwargs={'stat_type': stat_type}))
+            self.assertEqual(res.status_code, 200)
+
+        res = self.client.get(reverse('party-stats', kwargs={'stat_type': 'bills-proposed'}))
+        extras = dict((party.id, party.extra) for party in res.context['opposition'])
+        self.assertEqual(extras, {self.party_1.id: 0.5, self.party_2.id: 0})
+
+        res = self.client.get(reverse('party-stats', kwargs={'stat_type': 'committees'}))
+        extras = dict((party.id, party.extra) for party in res.context['opposition'])
+        self.assertEqual(extras, {self.party_1.id: 6.0, self.party_2.id: 0})
+
     def testPartyDetail(self):
         res = self.client.get(reverse('party-detail',
                                       args=[self.party_1.id]))
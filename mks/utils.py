@@ -1,4 +1,10 @@
 import math
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+from agendas.score_matrix import AgendaScoreMatrix
 from mks.models import Member
 from persons.models import Person, PersonAlias
 
@@ -39,6 +45,91 @@ def percentile(avg,var,val):
     return p
 
 
+class MemberDistributionIndex(object):
+    """Sorted values of the members' statistics, for placing a member among
+    the others.
+
+    The index is built with a single query and stored in the cache;
+    recalc_mks_bill_stats and the presence update rebuild it after they
+    change the statistics.
+    """
+
+    CACHE_KEY = 'member_distribution_index'
+
+    STATS = ('average_weekly_presence_hours', 'average_monthly_committee_presence',
+             'bills_stats_proposed', 'bills_stats_pre', 'bills_stats_first', 'bills_stats_approved')
+
+    def __init__(self, rows):
+        """rows is a list of (is_current, stat values...) tuples, one per member"""
+        self.all_values = {}
+        self.current_values = {}
+        self.averages = {}
+        self.variances = {}
+        for i, stat in enumerate(self.STATS, 1):
+            values = [row[i] or 0 for row in rows]
+            current = [value for row, value in zip(rows, values) if row[0]]
+            self.all_values[stat] = sorted(values)
+            self.current_values[stat] = sorted(current)
+            count = float(len(current)) or 1
+            avg = sum(current) / count
+            self.averages[stat] = avg
+            self.variances[stat] = sum((value - avg) ** 2 for value in current) / count
+
+    @classmethod
+    def build(cls):
+        return cls(list(Member.objects.order_by().values_list('is_current', *cls.STATS)))
+
+    @classmethod
+    def rebuild(cls):
+        index = cls.build()
+        cache.set(cls.CACHE_KEY, index, settings.LONG_CACHE_TIME)
+        return index
+
+    @classmethod
+    def get(cls):
+        return cache.get(cls.CACHE_KEY) or cls.rebuild()
+
+    def percentile(self, stat, value):
+        """Percentile of value among the current members, assuming the
+        values are normally distributed"""
+        var = self.variances[stat]
+        return percentile(self.averages[stat], var, value or 0) if var != 0 else 0
+
+    def scale_location(self, stat, value, scale=5):
+        """Which of scale equal groups of all the members value falls in,
+        from 1 (lowest) to scale, or 0 if there is no value"""
+        values = self.all_values[stat]
+        if not value or not values:
+            return 0
+        group_size = int(math.ceil(len(values) / float(scale)))
+        return 1 + bisect_left(values, value) / group_size
+
+
+MEMBER_FRAGMENTS = ('stats', 'actions', 'committees', 'videos', 'agendas')
+
+
+def member_fragment_cache_key(member_id, fragment):
+    """Cache key of a part of the member page context"""
+    key = 'mk_%d_%s' % (member_id, fragment)
+    if fragment == 'agendas':
+        # agenda scores change whenever the score matrix does
+        key += '_%s' % cache.get(AgendaScoreMatrix.VERSION_CACHE_KEY)
+    return key
+
+
+def member_fragment_cache_keys(member_id, fragments=MEMBER_FRAGMENTS):
+    return [member_fragment_cache_key(member_id, fragment) for fragment in fragments]
+
+
+MEMBER_LIST_STAT_TYPES = ('abc', 'bills_proposed', 'bills_pre', 'bills_first', 'bills_approved', 'votes',
+                          'presence', 'committees', 'followers', 'graph')
+
+
+def member_list_cache_key(stat_type):
+    """Cache key of the members list context, sorted by stat_type"""
+    return 'object_list_by_%s' % stat_type
+
+
 def get_all_mk_names():
     # TODO: refactor all places to point directly to knesset_data_django
     from knesset_data_django.mks.utils import get_all_mk_names
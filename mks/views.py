@@ -1,11 +1,12 @@
 import urllib
 import json
+import operator
 from operator import attrgetter
 from itertools import chain
 
 import waffle
 from django.conf import settings
-from django.db.models import Sum, Q
+from django.db.models import Sum, Q, Avg, Count
 from django.utils.translation import ugettext as _
 from django.http import HttpResponse, HttpResponseRedirect, Http404
 from django.views.generic import ListView, TemplateView, RedirectView
@@ -20,11 +21,10 @@ from actstream import actor_stream
 from actstream.models import Follow
 from hashnav.detail import DetailView
 
-from laws.enums import BillStages
-from laws.vote_choices import BILL_AGRR_STAGES
-from models import Member, Party, Knesset
-from utils import percentile
-from laws.models import MemberVotingStatistics, Bill, VoteAction
+from models import Member, Party, Knesset, WeeklyPresence
+from party_stats import PartyStatistics
+from utils import MemberDistributionIndex, member_fragment_cache_key, member_list_cache_key
+from laws.models import MemberVotingStatistics, DailyVotingStatistics, VoteAction
 from agendas.models import Agenda
 
 from persons.models import PersonAlias, Person
@@ -81,7 +81,7 @@ class MemberListView(ListView):
             is_current=True).select_related('current_party')
 
         # Do we have it in the cache ? If so, update and return
-        context = cache.get('object_list_by_%s' % requested_info_type) or {}
+        context = cache.get(member_list_cache_key(requested_info_type)) or {}
 
         if context:
             original_context.update(context)
@@ -131,7 +131,7 @@ class MemberListView(ListView):
             if context['past_mks']:
                 context['max_past'] = context['past_mks'][0].extra
 
-        cache.set('object_list_by_%s' % requested_info_type, context, settings.LONG_CACHE_TIME)
+        cache.set(member_list_cache_key(requested_info_type), context, settings.LONG_CACHE_TIME)
         original_context.update(context)
         return original_context
 
@@ -177,15 +177,18 @@ class MemberListView(ListView):
         return qs
 
     def _get_by_votes(self, context, qs):
+        counts = DailyVotingStatistics.objects.totals_by('member')
+
+        def votes_per_month(member):
+            return MemberVotingStatistics.votes_per_month(member, counts.get(member.id, {}).get('votes_count', 0))
+
         qs = list(qs)
-        vs = list(MemberVotingStatistics.objects.all())
-        vs = dict(zip([x.member_id for x in vs], vs))
         for x in qs:
-            x.extra = vs[x.id].average_votes_per_month()
+            x.extra = votes_per_month(x)
         qs.sort(key=lambda x: x.extra, reverse=True)
         context['past_mks'] = list(context['past_mks'])
         for x in context['past_mks']:
-            x.extra = x.voting_statistics.average_votes_per_month()
+            x.extra = votes_per_month(x)
         context['past_mks'].sort(key=lambda x: x.extra, reverse=True)
         return qs
 
@@ -262,6 +265,34 @@ class MemberCsvView(CsvView):
                     ('committee_meetings_per_month',
                      _('Committee Meetings per Month')))
 
+    def prepare_chunk(self, members):
+        # the statistics of all the members of the chunk, instead of the
+        # queries of the Member methods for each
+        ids = [member.id for member in members]
+        start_date = Knesset.objects.current_knesset().start_date
+        self._votes_counts = dict(
+            (member_id, counts['votes_count'])
+            for member_id, counts in DailyVotingStatistics.objects.totals_by('member', member__in=ids).items())
+        self._weekly_presence = dict(
+            WeeklyPresence.objects.filter(member__in=ids, date__gt=start_date).order_by()
+            .values_list('member').annotate(Avg('hours')))
+        self._committee_meetings = dict(
+            Member.objects.filter(id__in=ids, committee_meetings__date__gte=start_date).order_by()
+            .values_list('id').annotate(Count('committee_meetings')))
+
+    def average_votes_per_month(self, member, attr):
+        return MemberVotingStatistics.votes_per_month(member, self._votes_counts.get(member.id, 0))
+
+    def average_weekly_presence(self, member, attr):
+        hours = self._weekly_presence.get(member.id)
+        return round(hours, 1) if hours is not None else None
+
+    def committee_meetings_per_month(self, member, attr):
+        service_time = member.service_time()
+        if not service_time:
+            return 0
+        return round(self._committee_meetings.get(member.id, 0) * 30.0 / service_time, 2)
+
 
 class MemberDetailView(DetailView):
     queryset = Member.objects.exclude(current_party__isnull=True) \
@@ -282,30 +313,9 @@ class MemberDetailView(DetailView):
         return super(MemberDetailView, self).dispatch(*args, **kwargs)
 
     def calc_percentile(self, member, outdict, inprop, outvalprop, outpercentileprop):
-        # store in instance var if needed, no need to access cache for each
-        # call.
-        #
-        # If not found in the instance, than try to get from cache (and set if
-        # not found), plus setting it as an instance var. Also removes default
-        # ordering by name (we don't need it)
-        all_members = getattr(self, '_all_members', None)
-
-        if not all_members:
-            all_members = cache.get('all_members', None)
-            if not all_members:
-                self._all_members = all_members = list(
-                    Member.objects.filter(is_current=True).order_by().values())
-                cache.set('all_members', all_members, settings.LONG_CACHE_TIME)
-
-        member_count = float(len(all_members))
         member_val = getattr(member, inprop) or 0
-
-        avg = sum(x[inprop] or 0 for x in all_members) / member_count
-
-        var = sum(((x[inprop] or 0) - avg) ** 2 for x in all_members) / member_count
-
         outdict[outvalprop] = member_val
-        outdict[outpercentileprop] = percentile(avg, var, member_val) if var != 0 else 0
+        outdict[outpercentileprop] = MemberDistributionIndex.get().percentile(inprop, member_val)
 
     def calc_bill_stats(self, member, bills_statistics, stattype):
         # TODO: Jesus why is this a not savd as a property on mk? re calculating each time?
@@ -315,17 +325,17 @@ class MemberDetailView(DetailView):
                              stattype,
                              '%s_percentile' % stattype)
 
+    def get_fragment(self, member, name):
+        """The named part of the context, which is the same for all users"""
+        key = member_fragment_cache_key(member.id, name)
+        fragment = cache.get(key)
+        if fragment is None:
+            fragment = getattr(self, '_get_%s_fragment' % name)(member)
+            cache.set(key, fragment, settings.LONG_CACHE_TIME)
+        return fragment
+
     def get_agenda_data(self, member):
-        if self.request.user.is_authenticated():
-            agendas = Agenda.objects.get_selected_for_instance(
-                member, user=self.request.user, top=3, bottom=3)
-        else:
-            agendas = Agenda.objects.get_selected_for_instance(
-                member, user=None, top=3, bottom=3)
-        agendas = agendas['top'] + agendas['bottom']
-        for agenda in agendas:
-            agenda.watched = False
-            agenda.totals = agenda.get_mks_totals(member)
+        agendas = list(self.get_fragment(member, 'agendas')['agendas'])
         if self.request.user.is_authenticated():
             watched_agendas = self.request.user.profiles.get().agendas
             for watched_agenda in watched_agendas:
@@ -339,165 +349,178 @@ class MemberDetailView(DetailView):
         agendas.sort(key=attrgetter('score'), reverse=True)
         return agendas
 
+    def _get_agendas_fragment(self, member):
+        agendas = Agenda.objects.get_selected_for_instance(
+            member, user=None, top=3, bottom=3)
+        agendas = agendas['top'] + agendas['bottom']
+        for agenda in agendas:
+            agenda.watched = False
+            agenda.totals = agenda.get_mks_totals(member)
+        return {'agendas': agendas}
+
+    def _get_stats_fragment(self, member):
+        current_knesset_start_date = Knesset.objects.current_knesset().start_date
+        presence = {}
+        self.calc_percentile(member, presence,
+                             'average_weekly_presence_hours',
+                             'average_weekly_presence_hours',
+                             'average_weekly_presence_hours_percentile')
+        self.calc_percentile(member, presence,
+                             'average_monthly_committee_presence',
+                             'average_monthly_committee_presence',
+                             'average_monthly_committee_presence_percentile')
+
+        bills_statistics = {}
+        # TODO: can move to an offline job
+        self.calc_bill_stats(member, bills_statistics, 'proposed')
+        self.calc_bill_stats(member, bills_statistics, 'pre')
+        self.calc_bill_stats(member, bills_statistics, 'first')
+        self.calc_bill_stats(member, bills_statistics, 'approved')
+
+        # TODO: Move to model or service
+        factional_discipline = VoteAction.objects.select_related(
+            'vote').filter(member=member,
+                           against_party=True,
+                           vote__time__gt=current_knesset_start_date)
+
+        votes_against_own_bills = VoteAction.objects.select_related(
+            'vote').filter(member=member,
+                           against_own_bill=True,
+                           vote__time__gt=current_knesset_start_date)
+
+        general_discipline_params = {'member': member, 'vote__time__gt': current_knesset_start_date}
+        is_coalition = member.current_party.is_coalition
+        if is_coalition:
+            general_discipline_params['against_coalition'] = True
+        else:
+            general_discipline_params['against_opposition'] = True
+        general_discipline = VoteAction.objects.filter(
+            **general_discipline_params).select_related('vote')
+
+        mmm_documents = member.mmm_documents.order_by('-publication_date')
+
+        content_type = ContentType.objects.get_for_model(Member)
+        num_followers = Follow.objects.filter(
+            object_id=member.pk,
+            content_type=content_type).count()
+
+        # since parties are prefetch_releated, will list and slice them
+        previous_parties = list(member.parties.all())[1:]
+        return {
+            'num_followers': num_followers,
+            'mmm_documents_more': mmm_documents.count() > self.MEMBER_INITIAL_DATA,
+            'mmm_documents': mmm_documents[:self.MEMBER_INITIAL_DATA],
+            'bills_statistics': bills_statistics,
+            'presence': presence,
+            'factional_discipline': factional_discipline,
+            'votes_against_own_bills': votes_against_own_bills,
+            'general_discipline': general_discipline,
+            'previous_parties': previous_parties,
+        }
+
+    def _get_actions_fragment(self, member):
+        actions = actor_stream(member)
+
+        for a in actions:
+            a.actor = member
+
+        legislation_actions = actor_stream(member).filter(
+            verb__in=('proposed', 'joined'))
+
+        # this ugly code groups all the committee actions according to plenum and committee
+        # it stop iterating when both committee and plenum actions reach the maximum (MEMBER_INITIAL_DATA)
+        # it also stops iterating when reaching 20 iterations
+        committee_actions_more = {'committee': False, 'plenum': False}
+        committee_actions = {'committee': [], 'plenum': []}
+        i = 0
+        for action in actor_stream(member).filter(verb='attended'):
+            i = i + 1
+            if i == 20:
+                # JESUS what language are we writing here? and is this a way to do a "limit"?
+                break
+            committee_type = (action and action.target and
+                              action.target.committee and
+                              action.target.committee.type)
+            if committee_type in ['plenum', 'committee']:
+                if len(committee_actions[committee_type]) == self.MEMBER_INITIAL_DATA:
+                    committee_actions_more[committee_type] = True
+                    if committee_actions_more['plenum'] == True and committee_actions_more[
+                        'committee'] == True:
+                        break
+                else:
+                    committee_actions[committee_type].append(action)
+
+        protocol_part_annotation_actions = Action.objects.filter(
+            actor_content_type=ContentType.objects.get_for_model(Person),
+            actor_object_id__in=member.person.values_list('pk', flat=True),
+            verb='got annotation for protocol part'
+        )
+
+        return {
+            'actions_more': actions.count() > self.MEMBER_INITIAL_DATA,
+            'actions': actions[:self.MEMBER_INITIAL_DATA],
+            'legislation_actions_more': legislation_actions.count() > self.MEMBER_INITIAL_DATA,
+            'legislation_actions': legislation_actions[:self.MEMBER_INITIAL_DATA],
+            'committee_actions_more': committee_actions_more['committee'],
+            'committee_actions': committee_actions['committee'],
+            'plenum_actions_more': committee_actions_more['plenum'],
+            'plenum_actions': committee_actions['plenum'],
+            'protocol_part_annotation_actions': protocol_part_annotation_actions,
+        }
+
+    def _get_committees_fragment(self, member):
+        committees_presence = []
+        has_protocols_not_published = False
+        committees = member.get_active_committees()
+        for committee in committees:
+            committee_member = members_by_presence(committee, ids=[member.id])[0]
+            committees_presence.append({"committee": committee,
+                                        "presence": committee_member.meetings_percentage})
+            if committee.protocol_not_published:
+                has_protocols_not_published = True
+
+        committees_presence.sort(cmp=lambda x, y: y["presence"] - x["presence"])
+        return {
+            'committees_presence': committees_presence,
+            'has_protocols_not_published': has_protocols_not_published,
+        }
+
+    def _get_videos_fragment(self, member):
+        about_videos = get_videos_queryset(member, group='about')[:1]
+        if len(about_videos):
+            about_video = about_videos[0]
+            about_video_embed_link = about_video.embed_link
+            about_video_image_link = about_video.image_link
+        else:
+            about_video_embed_link = ''
+            about_video_image_link = ''
+
+        related_videos = get_videos_queryset(member, group='related')
+        related_videos = related_videos.filter(
+            Q(published__gt=date.today() - timedelta(days=30))
+            | Q(sticky=True)
+        ).order_by('sticky').order_by('-published')[:5]
+        return {
+            'about_video_embed_link': about_video_embed_link,
+            'about_video_image_link': about_video_image_link,
+            'related_videos': related_videos,
+            'num_related_videos': related_videos.count(),
+        }
+
     def get_context_data(self, **kwargs):
         context = super(MemberDetailView, self).get_context_data(**kwargs)
         member = context['object']
-        current_knesset_start_date = Knesset.objects.current_knesset().start_date
+        for name in ('stats', 'actions', 'committees', 'videos'):
+            context.update(self.get_fragment(member, name))
+
+        # the only parts that depend on the user
         if self.request.user.is_authenticated():
             profile = self.request.user.profiles.get()
-            watched = profile.is_watching_member(member)
-            cached_context = None
+            context['watched_member'] = profile.is_watching_member(member)
         else:
-            watched = False
-            cached_context = cache.get('mk_%d' % member.id)
-
-        if cached_context is None:
-            presence = {}
-            self.calc_percentile(member, presence,
-                                 'average_weekly_presence_hours',
-                                 'average_weekly_presence_hours',
-                                 'average_weekly_presence_hours_percentile')
-            self.calc_percentile(member, presence,
-                                 'average_monthly_committee_presence',
-                                 'average_monthly_committee_presence',
-                                 'average_monthly_committee_presence_percentile')
-
-            bills_statistics = {}
-            # TODO: can move to an offline job
-            self.calc_bill_stats(member, bills_statistics, 'proposed')
-            self.calc_bill_stats(member, bills_statistics, 'pre')
-            self.calc_bill_stats(member, bills_statistics, 'first')
-            self.calc_bill_stats(member, bills_statistics, 'approved')
-
-            agendas = self.get_agenda_data(member)
-            # TODO: Move to model or service
-            factional_discipline = VoteAction.objects.select_related(
-                'vote').filter(member=member,
-                               against_party=True,
-                               vote__time__gt=current_knesset_start_date)
-
-            votes_against_own_bills = VoteAction.objects.select_related(
-                'vote').filter(member=member,
-                               against_own_bill=True,
-                               vote__time__gt=current_knesset_start_date)
-
-            general_discipline_params = {'member': member, 'vote__time__gt': current_knesset_start_date}
-            is_coalition = member.current_party.is_coalition
-            if is_coalition:
-                general_discipline_params['against_coalition'] = True
-            else:
-                general_discipline_params['against_opposition'] = True
-            general_discipline = VoteAction.objects.filter(
-                **general_discipline_params).select_related('vote')
-
-            about_videos = get_videos_queryset(member, group='about')[:1]
-            if len(about_videos):
-                about_video = about_videos[0]
-                about_video_embed_link = about_video.embed_link
-                about_video_image_link = about_video.image_link
-            else:
-                about_video_embed_link = ''
-                about_video_image_link = ''
-
-            related_videos = get_videos_queryset(member, group='related')
-            related_videos = related_videos.filter(
-                Q(published__gt=date.today() - timedelta(days=30))
-                | Q(sticky=True)
-            ).order_by('sticky').order_by('-published')[:5]
-
-            actions = actor_stream(member)
-
-            for a in actions:
-                a.actor = member
-
-            legislation_actions = actor_stream(member).filter(
-                verb__in=('proposed', 'joined'))
-
-            # this ugly code groups all the committee actions according to plenum and committee
-            # it stop iterating when both committee and plenum actions reach the maximum (MEMBER_INITIAL_DATA)
-            # it also stops iterating when reaching 20 iterations
-            committee_actions_more = {'committee': False, 'plenum': False}
-            committee_actions = {'committee': [], 'plenum': []}
-            i = 0
-            for action in actor_stream(member).filter(verb='attended'):
-                i = i + 1
-                if i == 20:
-                    # JESUS what language are we writing here? and is this a way to do a "limit"?
-                    break
-                committee_type = (action and action.target and
-                                  action.target.committee and
-                                  action.target.committee.type)
-                if committee_type in ['plenum', 'committee']:
-                    if len(committee_actions[committee_type]) == self.MEMBER_INITIAL_DATA:
-                        committee_actions_more[committee_type] = True
-                        if committee_actions_more['plenum'] == True and committee_actions_more[
-                            'committee'] == True:
-                            break
-                    else:
-                        committee_actions[committee_type].append(action)
-
-            committees_presence = []
-            has_protocols_not_published = False
-            committees = member.get_active_committees()
-            for committee in committees:
-                committee_member = members_by_presence(committee, ids=[member.id])[0]
-                committees_presence.append({"committee": committee,
-                                            "presence": committee_member.meetings_percentage})
-                if committee.protocol_not_published:
-                    has_protocols_not_published = True
-
-            committees_presence.sort(cmp=lambda x, y: y["presence"] - x["presence"])
-
-            mmm_documents = member.mmm_documents.order_by('-publication_date')
-
-            content_type = ContentType.objects.get_for_model(Member)
-            num_followers = Follow.objects.filter(
-                object_id=member.pk,
-                content_type=content_type).count()
-
-            protocol_part_annotation_actions = Action.objects.filter(
-                actor_content_type=ContentType.objects.get_for_model(Person),
-                actor_object_id__in=member.person.values_list('pk', flat=True),
-                verb='got annotation for protocol part'
-            )
-
-            # since parties are prefetch_releated, will list and slice them
-            previous_parties = list(member.parties.all())[1:]
-            cached_context = {
-                'watched_member': watched,
-                'num_followers': num_followers,
-                'actions_more': actions.count() > self.MEMBER_INITIAL_DATA,
-                'actions': actions[:self.MEMBER_INITIAL_DATA],
-                'legislation_actions_more': legislation_actions.count() > self.MEMBER_INITIAL_DATA,
-                'legislation_actions': legislation_actions[:self.MEMBER_INITIAL_DATA],
-                'committee_actions_more': committee_actions_more['committee'],
-                'committee_actions': committee_actions['committee'],
-                'plenum_actions_more': committee_actions_more['plenum'],
-                'plenum_actions': committee_actions['plenum'],
-                'mmm_documents_more': mmm_documents.count() > self.MEMBER_INITIAL_DATA,
-                'mmm_documents': mmm_documents[:self.MEMBER_INITIAL_DATA],
-                'bills_statistics': bills_statistics,
-                'agendas': agendas,
-                'presence': presence,
-                'factional_discipline': factional_discipline,
-                'votes_against_own_bills': votes_against_own_bills,
-                'general_discipline': general_discipline,
-                'about_video_embed_link': about_video_embed_link,
-                'about_video_image_link': about_video_image_link,
-                'related_videos': related_videos,
-                'num_related_videos': related_videos.count(),
-                'INITIAL_DATA': self.MEMBER_INITIAL_DATA,
-                'previous_parties': previous_parties,
-                'committees_presence': committees_presence,
-                'protocol_part_annotation_actions': protocol_part_annotation_actions,
-                'has_protocols_not_published': has_protocols_not_published,
-            }
-
-            if not self.request.user.is_authenticated():
-                cache.set('mk_%d' % member.id, cached_context,
-                          settings.LONG_CACHE_TIME)
-
-        context.update(cached_context)
+            context['watched_member'] = False
+        context['agendas'] = self.get_agenda_data(member)
+        context['INITIAL_DATA'] = self.MEMBER_INITIAL_DATA
         return context
 
 
@@ -538,6 +561,22 @@ class PartyListView(ListView):
         ('committees', _('By average monthly committee meetings')),
     )
 
+    # the graph of each stat type is scaled by the lowest (or highest) value:
+    # (initial value, is a value lower/higher, norm_factor, baseline)
+    scales = {
+        'votes-per-seat': (0, operator.gt, lambda m: m / 20, lambda m: 0),
+        'discipline': (100, operator.lt, lambda m: (100.0 - m) / 15, lambda m: m - 2),
+        'coalition-discipline': (100, operator.lt, lambda m: (100.0 - m) / 15, lambda m: m - 2),
+        'residence-centrality': (10, operator.lt, lambda m: (10.0 - m) / 15, lambda m: m - 1),
+        'residence-economy': (10, operator.lt, lambda m: (10.0 - m) / 15, lambda m: m - 1),
+        'bills-proposed': (9999, operator.lt, lambda m: m / 2, lambda m: 0),
+        'bills-pre': (9999, operator.lt, lambda m: m / 2, lambda m: 0),
+        'bills-first': (9999, operator.lt, lambda m: m / 2, lambda m: 0),
+        'bills-approved': (9999, operator.lt, lambda m: m / 2, lambda m: 0),
+        'presence': (9999, operator.lt, lambda m: m / 2, lambda m: 0),
+        'committees': (9999, operator.lt, lambda m: m / 2, lambda m: 0),
+    }
+
     def get_context_data(self, **kwargs):
         context = super(PartyListView, self).get_context_data(**kwargs)
         qs = context['object_list']
@@ -557,176 +596,18 @@ class PartyListView(ListView):
                 extra=Sum('number_of_seats')).order_by('-extra')
             context['norm_factor'] = 1
             context['baseline'] = 0
-
-        if info == 'votes-per-seat':
-            m = 0
-            for party in chain(context['coalition'], context['opposition']):
-                party.extra = party.voting_statistics.votes_per_seat()
-                if party.extra > m:
-                    m = party.extra
-            context['norm_factor'] = m / 20
-            context['baseline'] = 0
-
-        if info == 'discipline':
-            m = 100
-            for party in context['coalition']:
-                party.extra = party.voting_statistics.discipline()
-                if party.extra < m:
-                    m = party.extra
-            for party in context['opposition']:
-                party.extra = party.voting_statistics.discipline()
-                if party.extra < m:
-                    m = party.extra
-            context['norm_factor'] = (100.0 - m) / 15
-            context['baseline'] = m - 2
-
-        if info == 'coalition-discipline':
-            m = 100
-            for party in context['coalition']:
-                party.extra = party.voting_statistics.coalition_discipline()
-                if party.extra < m:
-                    m = party.extra
-            for party in context['opposition']:
-                party.extra = party.voting_statistics.coalition_discipline()
-                if party.extra < m:
-                    m = party.extra
-            context['norm_factor'] = (100.0 - m) / 15
-            context['baseline'] = m - 2
-
-        if info == 'residence-centrality':
-            m = 10
-            for party in context['coalition']:
-                rc = [member.residence_centrality for member in party.members.all() if
-                      member.residence_centrality]
-                if rc:
-                    party.extra = round(float(sum(rc)) / len(rc), 1)
-                else:
-                    party.extra = 0
-                if party.extra < m:
-                    m = party.extra
-            for party in context['opposition']:
-                rc = [member.residence_centrality for member in party.members.all() if
-                      member.residence_centrality]
-                if rc:
-                    party.extra = round(float(sum(rc)) / len(rc), 1)
-                else:
-                    party.extra = 0
-                if party.extra < m:
-                    m = party.extra
-            context['norm_factor'] = (10.0 - m) / 15
-            context['baseline'] = m - 1
-
-        if info == 'residence-economy':
-            m = 10
-            for party in context['coalition']:
-                rc = [member.residence_economy for member in party.members.all() if
-                      member.residence_economy]
-                if rc:
-                    party.extra = round(float(sum(rc)) / len(rc), 1)
-                else:
-                    party.extra = 0
-                if party.extra < m:
-                    m = party.extra
-            for party in context['opposition']:
-                rc = [member.residence_economy for member in party.members.all() if
-                      member.residence_economy]
-                if rc:
-                    party.extra = round(float(sum(rc)) / len(rc), 1)
-                else:
-                    party.extra = 0
-                if party.extra < m:
-                    m = party.extra
-            context['norm_factor'] = (10.0 - m) / 15
-            context['baseline'] = m - 1
-
-        if info == 'bills-proposed':
-            m = 9999
-            start_date = Knesset.objects.current_knesset().start_date
-            for party in chain(context['coalition'], context['opposition']):
-                party.extra = round(float(
-                    len(set(Bill.objects.filter(
-                        proposers__current_party=party,
-                        proposals__date__gt=start_date).values_list('id', flat=True))
-                        )) / party.number_of_seats, 1)
-                if party.extra < m:
-                    m = party.extra
-            context['norm_factor'] = m / 2
-            context['baseline'] = 0
-
-        if info == 'bills-pre':
-            m = 9999
-            start_date = Knesset.objects.current_knesset().start_date
-            for party in chain(context['coalition'], context['opposition']):
-                party.extra = round(float(
-                    len(set(Bill.objects.filter(
-                        BILL_AGRR_STAGES['pre'],
-                        proposers__current_party=party,
-                        proposals__date__gt=start_date).values_list('id', flat=True))
-                        )) / party.number_of_seats, 1)
-                if party.extra < m:
-                    m = party.extra
-            context['norm_factor'] = m / 2
-            context['baseline'] = 0
-
-        if info == 'bills-first':
-            m = 9999
-            start_date = Knesset.objects.current_knesset().start_date
-            for party in chain(context['coalition'], context['opposition']):
-                party.extra = round(float(
-                    len(set(Bill.objects.filter(
-                        BILL_AGRR_STAGES['first'],
-                        proposers__current_party=party,
-                        proposals__date__gt=start_date).values_list('id', flat=True))
-                        )) / party.number_of_seats, 1)
-                if party.extra < m:
-                    m = party.extra
-            context['norm_factor'] = m / 2
-            context['baseline'] = 0
-
-        if info == 'bills-approved':
-            m = 9999
-            start_date = Knesset.objects.current_knesset().start_date
-            for party in chain(context['coalition'], context['opposition']):
-                party.extra = round(float(
-                    len(set(Bill.objects.filter(
-                        proposers__current_party=party,
-                        proposals__date__gt=start_date,
-                        stage=BillStages.APPROVED).values_list('id', flat=True))
-                        )) / party.number_of_seats, 1)
-                if party.extra < m:
-                    m = party.extra
-            context['norm_factor'] = m / 2
-            context['baseline'] = 0
-
-        if info == 'presence':
-            m = 9999
-            for party in chain(context['coalition'], context['opposition']):
-                awp = [member.average_weekly_presence() for member in
-                       party.members.all()]
-                awp = [a for a in awp if a]
-                if awp:
-                    party.extra = round(float(sum(awp)) / len(awp), 1)
-                else:
-                    party.extra = 0
-                if party.extra < m:
-                    m = party.extra
-            context['norm_factor'] = m / 2
-            context['baseline'] = 0
-
-        if info == 'committees':
-            m = 9999
+        else:
+            values = PartyStatistics.get(info)
+            initial, better, norm_factor, baseline = self.scales[info]
+            m = initial
             for party in chain(context['coalition'], context['opposition']):
-                cmpm = [member.committee_meetings_per_month() for member in
-                        party.members.all()]
-                cmpm = [c for c in cmpm if c]
-                if cmpm:
-                    party.extra = round(float(sum(cmpm)) / len(cmpm), 1)
-                else:
-                    party.extra = 0
-                if party.extra < m:
+                party.extra = values.get(party.id)
+                if party.extra is None:
+                    party.extra = _('N/A')
+                elif better(party.extra, m):
                     m = party.extra
-            context['norm_factor'] = m / 2
-            context['baseline'] = 0
+            context['norm_factor'] = norm_factor(m)
+            context['baseline'] = baseline(m)
 
         context['title'] = _('Parties by %s') % dict(self.pages)[info]
         # prepare data for graphs. We'll be doing loops instead of list
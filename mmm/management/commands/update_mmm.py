@@ -1,7 +1,3 @@
-import os
-import json
-from datetime import datetime
-
 from django.core.management.base import NoArgsCommand, CommandError
 
 from mmm.models import Document
@@ -14,14 +10,6 @@ class Command(NoArgsCommand):
     def handle_noargs(self, **options):
         FIXTURE_FILE = "mmm.json"
 
-        try:
-            f =  open(DATA_ROOT + FIXTURE_FILE, 'rt')
-            j = json.load(f)
-            for m in j['objects']['matches']:
-                # we're promised iso8601
-                m['pub_date'] = datetime.strptime(m['pub_date'], '%Y-%m-%d').date()
-
-            Document.objects.from_json(j)
-
-        finally:
-            f.close();
+        # the archive is read as a stream, pub_date is promised to be iso8601
+        with open(DATA_ROOT + FIXTURE_FILE, 'rb') as f:
+            Document.objects.from_json_file(f)
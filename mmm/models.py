@@ -1,7 +1,12 @@
 import logging
+from itertools import chain
 
+from django.core.cache import cache
 from django.db import models
-from django.core.exceptions import ObjectDoesNotExist
+from django.db.models.signals import post_save, post_delete
+
+from auxiliary.search import reindex, reindex_instance
+from knesset.json_stream import iter_json
 
 from mks.models import Member
 from committees.models import Committee
@@ -19,12 +24,39 @@ COMM_TYPE = "COMM"
 
 SUPPORTED_SCHEMA_VER = 2
 
-class DocumentManager(models.Manager):
+MMM_STREAM_PATHS = [('objects', 'matches'), ('objects', 'documents')]
+
+# fields of a document set from the matches
+DOCUMENT_FIELDS = ('title', 'publication_date', 'author_names')
+
+
+def _add_match(docs, m):
+    """coalesce multiple entity matches by document url into single dict entry"""
+    if m.get('entity_id') and int(m.get('entity_id')) <= 0:
+        return
+
+    doc = docs.get(m['url'])
+    if doc is None:
+        doc = docs[m['url']] = dict(title=m['title'],
+                                    publication_date=m['pub_date'] or None,
+                                    author_names=m['authors'],
+                                    req_mks=set(),
+                                    req_committee=set())
 
-    @transaction.commit_manually
-    def from_json(self,  json):
-        from itertools import chain
+    entity_id = int(m.get('entity_id', 0))
+    if m.get('entity_type') == MK_TYPE:
+        doc['req_mks'].add(entity_id)
+    elif m.get('entity_type') == COMM_TYPE:
+        doc['req_committee'].add(entity_id)
+    elif m.get('entity_type'):
+        logger.warning("Unrecognized match type: {0}".format(m['entity_type']))
 
+
+class DocumentManager(models.Manager):
+    # rows per query
+    chunk_size = 500
+
+    def from_json(self, json):
         assert json['meta']['schema_version'][0] == SUPPORTED_SCHEMA_VER # current version
 
         assert ("matches" in json['objects'] and
@@ -34,67 +66,103 @@ class DocumentManager(models.Manager):
         # as long as update is not nightly. for now - do nothing with it.
         retrieval_date = json['meta']['retrieval_date']
 
-        #########################################################################
-        # coalesce multiple entity matches by document url into single dict entry
-        docs=dict()
-        for m in chain( json['objects']['matches'], json['objects']['documents']):
-            if m.get('entity_id') and  int(m.get('entity_id')) <= 0:
-                continue
-
-            default = dict(url=m['url'],
-                                  title=m['title'],
-                                  publication_date=m['pub_date'],
-                                  author_names=m['authors'],
-                                  req_mks = [],
-                                  req_committee = [])
+        docs = dict()
+        for m in chain(json['objects']['matches'], json['objects']['documents']):
+            _add_match(docs, m)
+        return self.import_documents(docs)
+
+    def from_json_file(self, f):
+        """Like from_json, reading the matches one by one from the file
+        instead of loading it whole"""
+        docs = dict()
+        meta = None
+        seen = set()
+        for path, value in iter_json(f, MMM_STREAM_PATHS):
+            if path in MMM_STREAM_PATHS:
+                seen.add(path)
+                _add_match(docs, value)
+            elif path == ('meta',):
+                meta = value
+        assert meta is not None and meta['schema_version'][0] == SUPPORTED_SCHEMA_VER
+        assert seen == set(MMM_STREAM_PATHS)
+        return self.import_documents(docs)
+
+    def import_documents(self, docs):
+        """Store the documents, given as {url: fields}, with the requesting mks
+        and committees as sets of ids. Fixture data clobbers old values, and
+        the requesting entities of the documents are replaced.
+
+        Existing documents are compared in memory, new documents are inserted
+        together and the links are rewritten with one delete and one insert
+        per relation. Returns the number of new documents.
+        """
+        fields = dict((name, self.model._meta.get_field(name)) for name in DOCUMENT_FIELDS)
+        for doc in docs.values():
+            for name, field in fields.items():
+                doc[name] = field.to_python(doc[name])
 
-            doc = docs.get(m['url'],default)
-
-            entity_id =  int(m.get('entity_id',0))
-            if m.get('entity_type') == MK_TYPE:
-                doc['req_mks'] = list(set(doc['req_mks']+[entity_id]))
-            elif m.get('entity_type') == COMM_TYPE :
-                doc['req_committee'] =   list(set(doc['req_committee']+ [entity_id]))
-            elif m.get('entity_type'):
-                logger.warning("Unrecognized match type: {0}".format(m['entity_type']))
-
-            docs[m['url']] = doc
-
-
-        ################################################################
-        # push all documents to db, update linked entities if they exist
         logger.info("Pushing mmm documents to db")
-        cnt=0;
-        new_cnt=0;
-        for d in docs.values():
-            cnt+=1
-            # m2m fields, pop and save aside, can't call Document()
-            # with m2m fields directly
-            req_mks = d.pop("req_mks",[])
-            req_committee = d.pop("req_committee",[])
-
-            try:
-                o = self.get(url=d['url'])
-
-            except ObjectDoesNotExist:
-                new_cnt +=1
-                o =  Document(**d)
-                o.save()
-
-            # populate entry entirely with fixture data, clobbers old values
-            for k in d.keys():
-                setattr(o,k,d[k])
-
-            o.req_mks = req_mks
-            o.req_committee =  req_committee
-            o.save()
-
-            if cnt % 500 == 0:
-                transaction.commit()
-                logger.debug("Processed {0} documents so far".format(cnt))
-
-        transaction.commit()
-        logger.info("Added a total of {0} new documents".format(new_cnt))
+        existing = dict((row[0], row[1:]) for row in self.values_list('url', 'id', *DOCUMENT_FIELDS))
+        new_documents = []
+        changed = {}  # id: fields
+        for url, doc in docs.iteritems():
+            values = tuple(doc[name] for name in DOCUMENT_FIELDS)
+            if url not in existing:
+                new_documents.append(self.model(url=url, **dict(zip(DOCUMENT_FIELDS, values))))
+            elif existing[url][1:] != values:
+                changed[existing[url][0]] = dict(zip(DOCUMENT_FIELDS, values))
+
+        with transaction.atomic():
+            self.bulk_create(new_documents, batch_size=self.chunk_size)
+            document_ids = dict((url, row[0]) for url, row in existing.iteritems() if url in docs)
+            new_urls = [document.url for document in new_documents]
+            for i in range(0, len(new_urls), self.chunk_size):
+                document_ids.update(self.filter(url__in=new_urls[i:i + self.chunk_size]).values_list('url', 'id'))
+            for document_id, values in changed.iteritems():
+                self.filter(id=document_id).update(**values)
+            changed_members = self._replace_links('req_mks', docs, document_ids)
+            self._replace_links('req_committee', docs, document_ids)
+
+        # bulk writes send no signals
+        reindex('mmm_document', [document_ids[url] for url in new_urls] + changed.keys())
+        cache.delete_many(['api_v2_member_mmms_%d' % member_id for member_id in changed_members])
+        logger.info("Added a total of {0} new documents".format(len(new_documents)))
+        return len(new_documents)
+
+    def _replace_links(self, name, docs, document_ids):
+        """Set the linked objects of the m2m field name of the documents,
+        returns the ids of the objects linked or unlinked"""
+        field = self.model._meta.get_field(name)
+        through = field.rel.through
+        document_column = field.m2m_field_name() + '_id'
+        target_column = field.m2m_reverse_field_name() + '_id'
+        targets = set(field.rel.to.objects.values_list('id', flat=True))
+        wanted = set()
+        for url, doc in docs.iteritems():
+            missing = doc[name] - targets
+            if missing:
+                logger.warning("{0} of {1} not found: {2}".format(name, url, sorted(missing)))
+            wanted.update((document_ids[url], target_id) for target_id in doc[name] & targets)
+
+        imported = set(document_ids.values())
+        existing = set()
+        stale_ids = []
+        changed_targets = set()
+        for row_id, document_id, target_id in through.objects.values_list('id', document_column, target_column):
+            if document_id not in imported:
+                continue
+            if (document_id, target_id) in wanted:
+                existing.add((document_id, target_id))
+            else:
+                stale_ids.append(row_id)
+                changed_targets.add(target_id)
+        for i in range(0, len(stale_ids), self.chunk_size):
+            through.objects.filter(id__in=stale_ids[i:i + self.chunk_size]).delete()
+        added = wanted - existing
+        through.objects.bulk_create([through(**{document_column: document_id, target_column: target_id})
+                                     for document_id, target_id in sorted(added)], batch_size=self.chunk_size)
+        changed_targets.update(target_id for document_id, target_id in added)
+        return changed_targets
 
 
 class Document(models.Model):
@@ -118,3 +186,5 @@ class Document(models.Model):
         return self.title
 
 
+post_save.connect(reindex_instance, sender=Document)
+post_delete.connect(reindex_instance, sender=Document)
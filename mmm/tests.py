@@ -107,3 +107,25 @@ class MmmTest(TestCase):
             pass
         else:
             raise AssertionError("Didn't detect bad schema version")
+
+    def test_import_file(self):
+        Member.objects.create(id=194, name="mk194")
+        for id in (6, 10):
+            Committee.objects.create(id=id, name="comm" + str(id))
+
+        with open(MMM_FIXTURE, 'rb') as f:
+            self.assertEqual(Document.objects.from_json_file(f), 25)
+        doc = Document.objects.get(url="http://knesset.gov.il/mmm/data/pdf/m00018.pdf")
+        self.assertEqual(list(doc.req_mks.values_list('id', flat=True)), [194])
+        self.assertEqual(list(doc.req_committee.values_list('id', flat=True)), [6])
+
+        # a second import changes only what changed in the fixture
+        with open(MMM_FIXTURE) as f:
+            j = json.load(f)
+        j['objects']['matches'] = [m for m in j['objects']['matches'] if m['entity_type'] != "MK"]
+        j['objects']['documents'][0]['title'] = u'כותרת חדשה'
+        self.assertEqual(Document.objects.from_json(j), 0)
+        self.assertEqual(Document.objects.count(), 25)
+        self.assertEqual(list(doc.req_mks.all()), [])
+        self.assertEqual(list(doc.req_committee.values_list('id', flat=True)), [6])
+        self.assertEqual(Document.objects.get(url=j['objects']['documents'][0]['url']).title, u'כותרת חדשה')
@@ -0,0 +1,188 @@
+'''
+Builds the updates of the notification emails of many users at once.
+
+The follows of all the users are grouped by the followed actor, so the new
+actions of every actor are fetched with a few queries and each action,
+actor header and agenda update is rendered once, no matter how many users
+follow it. The emails are then assembled from the rendered fragments.
+'''
+import datetime
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.template import TemplateDoesNotExist
+from django.template.loader import render_to_string
+
+from actstream.models import Follow, Action
+from agendas.models import Agenda
+from mks.models import Member
+from notify.models import LastSent
+
+import logging
+
+logger = logging.getLogger("open-knesset.notify")
+
+
+def render_with_fallback(template_name, fallback_template_name, context):
+    try:
+        return render_to_string(template_name, context)
+    except TemplateDoesNotExist:
+        return render_to_string(fallback_template_name, context)
+
+
+class NotificationDigest(object):
+    """The rendered updates of the actors followed by a group of users.
+
+    Use get_updates() for each of the users, then save_last_sent() to record
+    which updates were sent.
+    """
+
+    # actor ids per query, to stay below the database parameters limit
+    chunk_size = 500
+
+    def __init__(self, users, domain, days_back):
+        self.domain = domain
+        self.now = datetime.datetime.now()
+        self.default_since = self.now - datetime.timedelta(days_back)
+        user_ids = [user.id for user in users]
+
+        # the actors each user follows, without repetitions
+        self.follows = defaultdict(set)
+        for user_id, content_type_id, object_id in Follow.objects.filter(
+                user__in=user_ids).values_list('user', 'content_type', 'object_id'):
+            self.follows[user_id].add((content_type_id, unicode(object_id)))
+
+        self.last_sent = {}
+        for last_sent_id, user_id, content_type_id, object_pk, time in LastSent.objects.filter(
+                user__in=user_ids).values_list('id', 'user', 'content_type', 'object_pk', 'time'):
+            self.last_sent[(user_id, content_type_id, object_pk)] = (last_sent_id, time)
+
+        self.actors = self._load_actors()
+        self.actions = self._load_actions()
+        self._rendered_actions = {}
+        self._rendered_headers = {}
+        self._agenda_updates = {}
+        self._sent_last_sent_ids = []
+        self._new_last_sent = []
+
+    def _actor_keys(self):
+        return set(key for follows in self.follows.values() for key in follows)
+
+    def _load_actors(self):
+        ids_by_content_type = defaultdict(set)
+        for content_type_id, object_id in self._actor_keys():
+            ids_by_content_type[content_type_id].add(object_id)
+        actors = {}
+        for content_type_id, object_ids in ids_by_content_type.items():
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            if model is None:
+                continue
+            object_ids = list(object_ids)
+            for i in range(0, len(object_ids), self.chunk_size):
+                for obj in model.objects.filter(pk__in=object_ids[i:i + self.chunk_size]):
+                    actors[(content_type_id, unicode(obj.pk))] = obj
+        return actors
+
+    def _since(self, user_id, actor_key):
+        last_sent = self.last_sent.get((user_id,) + actor_key)
+        return last_sent[1] if last_sent else self.default_since
+
+    def _load_actions(self):
+        """New actions of all the followed actors, latest first, per actor"""
+        since = {}
+        for user_id, follows in self.follows.items():
+            for actor_key in follows:
+                user_since = self._since(user_id, actor_key)
+                since[actor_key] = min(since.get(actor_key, user_since), user_since)
+
+        # one query per chunk of actors that share a content type
+        ids_by_content_type = defaultdict(list)
+        for content_type_id, object_id in sorted(since):
+            ids_by_content_type[content_type_id].append(object_id)
+        actions = defaultdict(list)
+        for content_type_id, object_ids in ids_by_content_type.items():
+            for i in range(0, len(object_ids), self.chunk_size):
+                chunk = object_ids[i:i + self.chunk_size]
+                oldest = min(since[(content_type_id, object_id)] for object_id in chunk)
+                for action in Action.objects.filter(
+                        actor_content_type=content_type_id, actor_object_id__in=chunk,
+                        timestamp__gt=oldest).order_by('-timestamp').prefetch_related('actor', 'target'):
+                    actions[(content_type_id, unicode(action.actor_object_id))].append(action)
+        return actions
+
+    def render_action(self, action):
+        if action.id not in self._rendered_actions:
+            verb = action.verb.replace(' ', '_')
+            self._rendered_actions[action.id] = (
+                render_with_fallback('activity/%s/action_email.txt' % verb, 'activity/action_email.txt',
+                                     {'action': action}),
+                render_with_fallback('activity/%s/action_email.html' % verb, 'activity/action_email.html',
+                                     {'action': action, 'domain': self.domain}))
+        return self._rendered_actions[action.id]
+
+    def render_header(self, actor):
+        key = (actor.__class__, actor.pk)
+        if key not in self._rendered_headers:
+            model_template = actor.__class__.__name__.lower()
+            context = {'model': actor._meta.verbose_name, 'object': actor, 'domain': self.domain}
+            self._rendered_headers[key] = (
+                render_with_fallback('notify/%s_header.txt' % model_template, 'notify/model_header.txt', context),
+                render_with_fallback('notify/%s_header.html' % model_template, 'notify/model_header.html',
+                                     context))
+        return self._rendered_headers[key]
+
+    def agenda_update(self, agenda):
+        ''' generate the general update email for this agenda.
+            this will be added to the email if and only if there has been
+            some update in it's data.
+        '''
+        if agenda.id not in self._agenda_updates:
+            context = {'mks': agenda.selected_instances(Member), 'domain': self.domain}
+            self._agenda_updates[agenda.id] = (render_to_string('notify/agenda_update.txt', context),
+                                               render_to_string('notify/agenda_update.html', context))
+        return self._agenda_updates[agenda.id]
+
+    def get_updates(self, user, update_models):
+        ''' return {model: [text updates]} and {model: [html updates]} for
+            the actors followed by the user. updates of models not in
+            update_models are grouped under None.
+        '''
+        updates = dict((model, []) for model in update_models)
+        updates_html = dict((model, []) for model in update_models)
+        for actor_key in sorted(self.follows.get(user.id, ())):
+            actor = self.actors.get(actor_key)
+            if actor is None:
+                logger.warning('Follow object with None actor. ignoring')
+                continue
+            last_sent = self.last_sent.get((user.id,) + actor_key)
+            since = self._since(user.id, actor_key)
+            stream = [action for action in self.actions[actor_key] if action.timestamp > since]
+            if last_sent is None:  # never updated about this actor
+                self._new_last_sent.append(LastSent(user=user, content_type_id=actor_key[0],
+                                                    object_pk=actor_key[1]))
+            elif stream:
+                self._sent_last_sent_ids.append(last_sent[0])
+            if not stream:
+                continue
+
+            key = actor.__class__ if actor.__class__ in updates else None
+            header, header_html = self.render_header(actor)
+            updates[key].append(header)
+            updates_html[key].append(header_html)
+            for action in stream:
+                action_output, action_output_html = self.render_action(action)
+                updates[key].append(action_output)
+                updates_html[key].append(action_output_html)
+            if isinstance(actor, Agenda):
+                txt, html = self.agenda_update(actor)
+                updates[key].append(txt)
+                updates_html[key].append(html)
+        return updates, updates_html
+
+    def save_last_sent(self):
+        """Record the time the updates were sent, with a few bulk queries"""
+        for i in range(0, len(self._sent_last_sent_ids), self.chunk_size):
+            LastSent.objects.filter(id__in=self._sent_last_sent_ids[i:i + self.chunk_size]).update(time=self.now)
+        LastSent.objects.bulk_create(self._new_last_sent)
+        self._sent_last_sent_ids = []
+        self._new_last_sent = []
@@ -44,6 +44,22 @@ class SimpleTest(TestCase):
         email, email_html = cmd.get_email_for_user(self.jacob)
         self.assertEqual(email, [])
 
+    def test_digest_for_many_users(self):
+        adrian = User.objects.create_user('adrian', 'adrian@example.com', 'ADRIAN')
+        follow(self.jacob, self.mk_1)
+        follow(adrian, self.mk_1)
+        action.send(self.mk_1, verb='farted on', target=self.agenda_1)
+        cmd = notify.Command()
+        digest = cmd.get_digest([self.jacob, adrian])
+        for user in (self.jacob, adrian):
+            email, email_html = cmd.get_email_for_user(user, digest)
+            self.assertIn(u'mk 1 farted on agenda 1', "\n".join(email))
+        self.assertEqual(len(digest._rendered_actions), 1)
+        digest.save_last_sent()
+        self.assertEqual(LastSent.objects.count(), 2)
+        email, email_html = cmd.get_email_for_user(adrian)
+        self.assertEqual(email, [])
+
     def test_LastsSent_unicode(self):
         dt = datetime(2013, 2, 3)
         lastsent = LastSent.objects.create(user = self.jacob, content_object = self.mk_1)
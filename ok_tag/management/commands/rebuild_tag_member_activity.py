@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from ok_tag.models import TagMemberActivity
+
+
+class Command(BaseCommand):
+    args = '[tag id ...]'
+    help = "Count again the activity of members in tags, in all tags unless tag ids are given"
+
+    def handle(self, *args, **options):
+        tag_ids = [int(tag_id) for tag_id in args] or None
+        TagMemberActivity.objects.rebuild(tag_ids)
+        self.stdout.write('%d tag member activity rows' % TagMemberActivity.objects.count())
@@ -0,0 +1,11 @@
+from django.core.management.base import NoArgsCommand
+
+from ok_tag.models import TagUsage
+
+
+class Command(NoArgsCommand):
+    help = "Count again the number of tagged objects per tag, model and knesset"
+
+    def handle_noargs(self, **options):
+        TagUsage.objects.rebuild()
+        self.stdout.write('%d tag usage rows' % TagUsage.objects.count())
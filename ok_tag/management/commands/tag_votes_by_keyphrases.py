@@ -0,0 +1,27 @@
+import datetime
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand, CommandError
+
+from laws.models import Vote
+from ok_tag.models import VoteKeyphraseTagger
+
+
+class Command(NoArgsCommand):
+    help = "Tag votes whose titles contain tag keyphrases, all votes unless --since is given"
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--since', dest='since',
+                    help="only tag votes from this date on (YYYY-MM-DD)"),
+    )
+
+    def handle_noargs(self, **options):
+        votes = Vote.objects.all()
+        if options.get('since'):
+            try:
+                since = datetime.datetime.strptime(options['since'], '%Y-%m-%d')
+            except ValueError:
+                raise CommandError('--since should be a date in the format YYYY-MM-DD')
+            votes = votes.filter(time__gte=since)
+        created = VoteKeyphraseTagger().tag_votes(votes)
+        self.stdout.write('created %d tagged items' % created)
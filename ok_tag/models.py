@@ -1,12 +1,146 @@
+import datetime
+import operator
 import re
+import threading
+import uuid
+from bisect import bisect_left
+from collections import defaultdict, Counter
+from contextlib import contextmanager
 
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
-from django.db.models.signals import post_save, post_delete
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Q, F, Sum
+from django.db.models.query import QuerySet
+from django.db.models.signals import pre_save, post_save, post_delete
 from tagging.models import TaggedItem, Tag
+from tagging.utils import calculate_cloud
 
 from auxiliary.models import TagKeyphrase
 from committees.models import CommitteeMeeting
+from knesset.aho_corasick import KeywordMatcher
 from knesset.utils import trans_clean
+from mks.models import Member, Knesset
+
+
+def bills_related_objects(bill_ids):
+    """Return {bill id: set of (content type id, object id)} of the votes
+    and committee meetings related to the given bills"""
+    # imported here, since laws.models depends on this module
+    from laws.models import Bill
+    vote_ctype = ContentType.objects.get_by_natural_key('laws', 'vote')
+    cm_ctype = ContentType.objects.get_for_model(CommitteeMeeting)
+    related = dict((bill_id, set()) for bill_id in bill_ids)
+    bill_ids = list(related)
+    for i in range(0, len(bill_ids), 500):
+        chunk = bill_ids[i:i + 500]
+        for bill_id, vote_id in Bill.pre_votes.through.objects.filter(bill__in=chunk).values_list('bill', 'vote'):
+            related[bill_id].add((vote_ctype.id, vote_id))
+        for bill_id, first_vote_id, approval_vote_id in Bill.objects.filter(id__in=chunk).values_list(
+                'id', 'first_vote', 'approval_vote'):
+            related[bill_id].update((vote_ctype.id, vote_id) for vote_id in (first_vote_id, approval_vote_id)
+                                    if vote_id)
+        for through in (Bill.first_committee_meetings.through, Bill.second_committee_meetings.through):
+            for bill_id, cm_id in through.objects.filter(bill__in=chunk).values_list('bill', 'committeemeeting'):
+                related[bill_id].add((cm_ctype.id, cm_id))
+    return related
+
+
+def propagate_bill_tags(added=(), removed=()):
+    """Apply tags added to and removed from bills to the bills' related
+    votes and committee meetings.
+
+    added and removed are iterables of (tag id, bill id). The related tagged
+    items are created with one bulk insert and deleted with one delete per
+    chunk of tags.
+    """
+    added, removed = set(added), set(removed)
+    if not added and not removed:
+        return
+    related = bills_related_objects(set(bill_id for tag_id, bill_id in added | removed))
+
+    to_add = set((tag_id, ct_id, object_id) for tag_id, bill_id in added for ct_id, object_id in related[bill_id])
+    if to_add:
+        # the tags the related objects already have
+        object_ids = defaultdict(set)  # key: content type id, value: object ids
+        for tag_id, ct_id, object_id in to_add:
+            object_ids[ct_id].add(object_id)
+        existing = set()
+        for ct_id, ids in object_ids.items():
+            ids = list(ids)
+            for i in range(0, len(ids), 500):
+                existing.update(TaggedItem.objects.filter(content_type=ct_id, object_id__in=ids[i:i + 500])
+                                .values_list('tag', 'content_type', 'object_id'))
+        new_items = to_add - existing
+        TaggedItem.objects.bulk_create([TaggedItem(tag_id=tag_id, content_type_id=ct_id, object_id=object_id)
+                                        for tag_id, ct_id, object_id in new_items])
+        # bulk_create sends no post_save
+        count_tagged_items(new_items)
+
+    to_remove = defaultdict(set)  # key: (tag id, content type id), value: object ids
+    for tag_id, bill_id in removed:
+        for ct_id, object_id in related[bill_id]:
+            to_remove[(tag_id, ct_id)].add(object_id)
+    keys = list(to_remove)
+    for i in range(0, len(keys), 100):
+        TaggedItem.objects.filter(reduce(operator.or_, [
+            Q(tag=tag_id, content_type=ct_id, object_id__in=to_remove[(tag_id, ct_id)])
+            for tag_id, ct_id in keys[i:i + 100]])).delete()
+
+
+class _PendingBillTags(threading.local):
+    def __init__(self):
+        self.deferred = 0
+        self.added = set()
+        self.removed = set()
+
+
+_pending_bill_tags = _PendingBillTags()
+
+
+@contextmanager
+def deferred_bill_tag_propagation():
+    """Collect the bill tag changes made inside the block, and propagate
+    them all together when it ends, also when it raises: the changes
+    already written are propagated, the rolled back ones are not."""
+    _pending_bill_tags.deferred += 1
+    try:
+        yield
+    finally:
+        _pending_bill_tags.deferred -= 1
+        if not _pending_bill_tags.deferred:
+            _propagate_pending_bill_tags()
+
+
+def _propagate_pending_bill_tags():
+    added, removed = _pending_bill_tags.added, _pending_bill_tags.removed
+    _pending_bill_tags.added, _pending_bill_tags.removed = set(), set()
+    if not added and not removed:
+        return
+    # skip the changes rolled back since they were queued
+    bill_ct = ContentType.objects.get_by_natural_key('laws', 'bill')
+    bill_ids = list(set(bill_id for tag_id, bill_id in added | removed))
+    bill_tags = set()
+    for i in range(0, len(bill_ids), 500):
+        bill_tags.update(TaggedItem.objects.filter(content_type=bill_ct, object_id__in=bill_ids[i:i + 500])
+                         .values_list('tag', 'object_id'))
+    propagate_bill_tags(added & bill_tags, removed - bill_tags)
+
+
+def _enqueue_bill_tag_change(instance, is_added):
+    if instance.content_type_id != ContentType.objects.get_by_natural_key('laws', 'bill').id:
+        return
+    change = (instance.tag_id, instance.object_id)
+    # the last change of a tag of a bill wins
+    if is_added:
+        _pending_bill_tags.removed.discard(change)
+        _pending_bill_tags.added.add(change)
+    else:
+        _pending_bill_tags.added.discard(change)
+        _pending_bill_tags.removed.add(change)
+    if not _pending_bill_tags.deferred:
+        _propagate_pending_bill_tags()
 
 
 def add_tags_to_related_objects(sender, instance, **kwargs):
@@ -17,115 +151,73 @@ def add_tags_to_related_objects(sender, instance, **kwargs):
     tag related votes and related committee meetings.
 
     """
-    obj = instance.object
-    tag = instance.tag
-    bill_ctype = ContentType.objects.get(app_label='laws', model='bill')
-    if type(obj) is bill_ctype.model_class():
-        vote_ctype = ContentType.objects.get(app_label='laws', model='vote')
-        # tag related votes
-        for v in obj.pre_votes.all():
-            (ti, created) = TaggedItem._default_manager.get_or_create(
-                tag=tag,
-                content_type=vote_ctype,
-                object_id=v.id)
-        v = obj.first_vote
-        if v:
-            (ti, created) = TaggedItem._default_manager.get_or_create(
-                tag=tag,
-                content_type=vote_ctype,
-                object_id=v.id)
-        v = obj.approval_vote
-        if v:
-            (ti, created) = TaggedItem._default_manager.get_or_create(
-                tag=tag,
-                content_type=vote_ctype,
-                object_id=v.id)
-
-        cm_ctype = ContentType.objects.get_for_model(CommitteeMeeting)
-        for cm in obj.first_committee_meetings.all():
-            (ti, created) = TaggedItem._default_manager.get_or_create(
-                tag=tag,
-                content_type=cm_ctype,
-                object_id=cm.id)
-        for cm in obj.second_committee_meetings.all():
-            (ti, created) = TaggedItem._default_manager.get_or_create(
-                tag=tag,
-                content_type=cm_ctype,
-                object_id=cm.id)
+    _enqueue_bill_tag_change(instance, True)
 
 
 def remove_tags_from_related_objects(sender, instance, **kwargs):
-    obj = instance.object
-    try:
-        tag = instance.tag
-    except Tag.DoesNotExist:  # the tag itself was deleted,
-        return  # so we have nothing to do.
-    bill_ctype = ContentType.objects.get(app_label='laws', model='bill')
-    if type(obj) is bill_ctype.model_class():
-        vote_ctype = ContentType.objects.get(app_label='laws', model='vote')
-        # untag related votes
-        for v in obj.pre_votes.all():
-            try:
-                ti = TaggedItem._default_manager.get(
-                    tag=tag,
-                    content_type=vote_ctype,
-                    object_id=v.id)
-                ti.delete()
-            except TaggedItem.DoesNotExist:
-                pass
-        v = obj.first_vote
-        if v:
-            try:
-                ti = TaggedItem._default_manager.get(
-                    tag=tag,
-                    content_type=vote_ctype,
-                    object_id=v.id)
-                ti.delete()
-            except TaggedItem.DoesNotExist:
-                pass
-        v = obj.approval_vote
-        if v:
-            try:
-                ti = TaggedItem._default_manager.get(
-                    tag=tag,
-                    content_type=vote_ctype,
-                    object_id=v.id)
-                ti.delete()
-            except TaggedItem.DoesNotExist:
-                pass
-
-        # untag related committee meetings
-        cm_ctype = ContentType.objects.get_for_model(CommitteeMeeting)
-        for cm in obj.first_committee_meetings.all():
-            try:
-                ti = TaggedItem._default_manager.get(
-                    tag=tag,
-                    content_type=cm_ctype,
-                    object_id=cm.id)
-                ti.delete()
-            except TaggedItem.DoesNotExist:
-                pass
-        for cm in obj.second_committee_meetings.all():
-            try:
-                ti = TaggedItem._default_manager.get(
-                    tag=tag,
-                    content_type=cm_ctype,
-                    object_id=cm.id)
-                ti.delete()
-            except TaggedItem.DoesNotExist:
-                pass
+    _enqueue_bill_tag_change(instance, False)
 
 
-def tag_vote(vote):
-    vote_ctype = ContentType.objects.get(app_label='laws', model='vote')
-    t = vote.title.translate(trans_clean)
+def clean_vote_title(title):
+    t = title.translate(trans_clean)
     t = re.sub(' . ', ' ', t)
-    t = re.sub(' +', ' ', t)
-    for tag_phrase in TagKeyphrase.objects.select_related('tag').all():
-        if tag_phrase.phrase in t:
-            TaggedItem.objects.get_or_create(tag=tag_phrase.tag,
-                                             content_type=vote_ctype,
-                                             object_id=vote.id)
+    return re.sub(' +', ' ', t)
+
+
+class VoteKeyphraseTagger(object):
+    """Tags votes whose cleaned titles contain the phrase of a TagKeyphrase.
+
+    All the keyphrases are compiled into one matcher, so each title is
+    scanned once, and the new tagged items of many votes are inserted
+    together.
+    """
+
+    # votes per query and per insert
+    chunk_size = 500
+
+    def __init__(self):
+        self.matcher = KeywordMatcher(TagKeyphrase.objects.values_list('phrase', 'tag_id'))
+        self.vote_ctype = ContentType.objects.get(app_label='laws', model='vote')
+
+    def tag_ids(self, title):
+        return self.matcher.values_in(clean_vote_title(title))
+
+    def tag_votes(self, votes):
+        """Tag the given votes (a queryset, or a list of votes or vote ids),
+        returns the number of tagged items created"""
+        # imported here, since laws.models depends on this module
+        from laws.models import Vote
+        from ok_tag.tag_suggestions import invalidate_tags_names, unused_tag_ids
+        if isinstance(votes, QuerySet):
+            vote_ids = list(votes.values_list('id', flat=True))
+        else:
+            vote_ids = [getattr(vote, 'pk', vote) for vote in votes]
+        created = 0
+        # the tags list of the tag suggestions has the used tags only
+        first_used_tag_ids = set()
+        for i in range(0, len(vote_ids), self.chunk_size):
+            chunk = vote_ids[i:i + self.chunk_size]
+            items = set()
+            for vote_id, title in Vote.objects.filter(id__in=chunk).values_list('id', 'title'):
+                items.update((tag_id, vote_id) for tag_id in self.tag_ids(title))
+            if not items:
+                continue
+            # skip the tagged items that already exist
+            items.difference_update(TaggedItem.objects.filter(
+                content_type=self.vote_ctype, object_id__in=chunk).values_list('tag_id', 'object_id'))
+            first_used_tag_ids.update(unused_tag_ids(tag_id for tag_id, vote_id in items))
+            TaggedItem.objects.bulk_create([TaggedItem(tag_id=tag_id, content_type=self.vote_ctype, object_id=vote_id)
+                                            for tag_id, vote_id in items])
+            count_tagged_items((tag_id, self.vote_ctype.id, vote_id) for tag_id, vote_id in items)
+            created += len(items)
+        if first_used_tag_ids:
+            # bulk_create sends no post_save
+            invalidate_tags_names(TaggedItem, None)
+        return created
+
+
+def tag_vote(vote):
+    VoteKeyphraseTagger().tag_votes([vote])
 
 
 # def tagged_votes_titles(tags):
@@ -145,6 +237,352 @@ def tag_vote(vote):
 #     return res
 
 
+# the field that decides the knesset of each tagged model
+TAGGED_DATE_FIELDS = {'bill': 'stage_date', 'vote': 'time', 'committeemeeting': 'date'}
+
+
+def knesset_resolver():
+    """Return a function from a date to the number of the last knesset
+    that started before it, or None"""
+    knessets = sorted(Knesset.objects.exclude(start_date=None).values_list('start_date', 'number'))
+    start_dates = [start_date for start_date, number in knessets]
+
+    def knesset_of(date):
+        if date is None:
+            return None
+        if isinstance(date, datetime.datetime):
+            date = date.date()
+        i = bisect_left(start_dates, date)
+        return knessets[i - 1][1] if i else None
+
+    return knesset_of
+
+
+class TagCountsManager(models.Manager):
+    """Manager of rows that count tagged items by the key_fields, the first
+    of which is the tag"""
+    key_fields = ()
+    # rows per query and per insert
+    chunk_size = 500
+
+    def _row(self, key, count):
+        return self.model(count=count, **dict(('%s_id' % field, value) for field, value in zip(self.key_fields, key)))
+
+    def replace_counts(self, counts, tag_ids=None):
+        """Replace the rows of all the tags, or of the given tags, with the
+        {key: count} counts"""
+        with transaction.atomic():
+            rows = self.all()
+            if tag_ids is not None:
+                rows = rows.filter(tag__in=tag_ids)
+            rows.delete()
+            self.bulk_create([self._row(key, count) for key, count in counts.iteritems()],
+                             batch_size=self.chunk_size)
+
+    def add_counts(self, counts):
+        """Add the {key: count} counts, which may be negative, to the rows"""
+        counts = dict((key, count) for key, count in counts.items() if count)
+        if not counts:
+            return
+        tag_ids = list(set(key[0] for key in counts))
+        with transaction.atomic():
+            existing = {}
+            for i in range(0, len(tag_ids), self.chunk_size):
+                for row in self.filter(tag__in=tag_ids[i:i + self.chunk_size]).values_list(
+                        'id', *self.key_fields):
+                    existing[row[1:]] = row[0]
+            row_ids = defaultdict(list)  # key: count to add
+            new_rows = []
+            for key, count in counts.items():
+                if key in existing:
+                    row_ids[count].append(existing[key])
+                elif count > 0:
+                    new_rows.append(self._row(key, count))
+            for count, ids in row_ids.items():
+                for i in range(0, len(ids), self.chunk_size):
+                    self.filter(id__in=ids[i:i + self.chunk_size]).update(count=F('count') + count)
+            self.bulk_create(new_rows, batch_size=self.chunk_size)
+            for i in range(0, len(tag_ids), self.chunk_size):
+                self.filter(tag__in=tag_ids[i:i + self.chunk_size], count__lte=0).delete()
+
+
+class TagMemberActivityManager(TagCountsManager):
+    key_fields = ('tag', 'member', 'knesset')
+
+    def _content_types(self):
+        # imported here, since laws.models depends on this module
+        from laws.models import Bill, Vote
+        return dict((ContentType.objects.get_for_model(model).id, model) for model in
+                    (Bill, Vote, CommitteeMeeting))
+
+    def _participations(self, model, object_ids):
+        """(object id, member id, date) of the members who proposed, voted
+        in or attended the given objects"""
+        from laws.models import Bill, VoteAction
+        if model is Bill:
+            return Bill.proposers.through.objects.filter(bill__in=object_ids).values_list(
+                'bill', 'member', 'bill__stage_date')
+        elif model is CommitteeMeeting:
+            return CommitteeMeeting.mks_attended.through.objects.filter(committeemeeting__in=object_ids).values_list(
+                'committeemeeting', 'member', 'committeemeeting__date')
+        else:
+            return VoteAction.objects.filter(vote__in=object_ids).values_list('vote', 'member', 'vote__time')
+
+    def _count(self, tagged_items):
+        """Count the (tag id, member id, knesset number) of the members
+        participating in the given (tag id, content type id, object id)"""
+        content_types = self._content_types()
+        tags = defaultdict(lambda: defaultdict(list))  # content type id -> object id -> tag ids
+        for tag_id, content_type_id, object_id in tagged_items:
+            if content_type_id in content_types:
+                tags[content_type_id][object_id].append(tag_id)
+        knesset_of = knesset_resolver()
+        counts = Counter()
+        for content_type_id, object_tags in tags.items():
+            object_ids = list(object_tags)
+            for i in range(0, len(object_ids), self.chunk_size):
+                for object_id, member_id, date in self._participations(
+                        content_types[content_type_id], object_ids[i:i + self.chunk_size]):
+                    knesset = knesset_of(date)
+                    for tag_id in object_tags[object_id]:
+                        counts[(tag_id, member_id, knesset)] += 1
+        return counts
+
+    def rebuild(self, tag_ids=None):
+        """Count again the activity of all the members in all the tags, or in
+        the given tags"""
+        tagged_items = TaggedItem.objects.filter(content_type__in=list(self._content_types()))
+        if tag_ids is not None:
+            tagged_items = tagged_items.filter(tag__in=tag_ids)
+        counts = self._count(tagged_items.values_list('tag', 'content_type', 'object_id').iterator())
+        self.replace_counts(counts, tag_ids)
+
+    def update_for_tagged_items(self, tagged_items, sign=1):
+        """Count the members participating in the given (tag id, content
+        type id, object id), which were tagged (sign=1) or untagged (sign=-1)"""
+        self.add_counts(dict((key, sign * count) for key, count in self._count(tagged_items).items()))
+
+    def update_for_participants(self, obj, member_ids, sign=1):
+        """Count members who were added to (sign=1) or removed from (sign=-1)
+        the participants of a bill, vote or committee meeting"""
+        content_type = ContentType.objects.get_for_model(obj)
+        tag_ids = list(TaggedItem.objects.filter(content_type=content_type, object_id=obj.pk).values_list(
+            'tag', flat=True))
+        if not tag_ids:
+            return
+        knesset = knesset_resolver()(getattr(obj, TAGGED_DATE_FIELDS[content_type.model]))
+        self.add_counts(dict(((tag_id, member_id, knesset), sign) for tag_id in tag_ids for member_id in member_ids))
+
+    def top_members(self, tag, limit, knesset=None, exclude_knesset=None):
+        """The limit members with most activity in the tag, in the given
+        knesset or in all knessets except exclude_knesset, each with a count
+        attribute"""
+        rows = self.filter(tag=tag)
+        if knesset is not None:
+            rows = rows.filter(knesset=knesset)
+        if exclude_knesset is not None:
+            rows = rows.exclude(knesset=exclude_knesset)
+        top = list(rows.order_by().values('member').annotate(total=Sum('count')).order_by('-total', 'member')[:limit])
+        members = Member.objects.in_bulk([row['member'] for row in top])
+        result = []
+        for row in top:
+            member = members[row['member']]
+            member.count = row['total']
+            result.append(member)
+        return result
+
+
+class TagMemberActivity(models.Model):
+    """How many tagged bills a member proposed, tagged votes the member
+    voted in and tagged committee meetings the member attended, in the
+    tag, in a knesset.
+
+    Kept up to date by the signal handlers of tagged items, vote actions,
+    bill proposers and committee meeting attendance. The
+    rebuild_tag_member_activity command counts everything again.
+    """
+    tag = models.ForeignKey(Tag, related_name='member_activity')
+    member = models.ForeignKey(Member, related_name='tag_activity')
+    # the last knesset that started before the activity, if any
+    knesset = models.ForeignKey(Knesset, null=True, blank=True, related_name='+')
+    count = models.IntegerField(default=0)
+
+    objects = TagMemberActivityManager()
+
+    class Meta:
+        unique_together = (('tag', 'member', 'knesset'),)
+
+    def __unicode__(self):
+        return u"%s %s %s: %d" % (self.tag, self.member, self.knesset_id, self.count)
+
+
+class TagUsageManager(TagCountsManager):
+    key_fields = ('tag', 'content_type', 'knesset')
+
+    VERSION_CACHE_KEY = 'tag_usage_version'
+
+    def invalidate(self):
+        """Mark the cached clouds and counts as stale"""
+        version = uuid.uuid4().hex
+        cache.set(self.VERSION_CACHE_KEY, version, settings.LONG_CACHE_TIME)
+        return version
+
+    def _cached(self, name, compute):
+        version = cache.get(self.VERSION_CACHE_KEY)
+        if version is None:
+            version = self.invalidate()
+        key = 'tag_usage_%s_%s' % (name, version)
+        value = cache.get(key)
+        if value is None:
+            value = compute()
+            cache.set(key, value, settings.LONG_CACHE_TIME)
+        return value
+
+    def _count(self, tagged_items):
+        """Count the (tag id, content type id, knesset number) of the given
+        (tag id, content type id, object id)"""
+        items = defaultdict(list)  # content type id -> (tag id, object id)
+        for tag_id, content_type_id, object_id in tagged_items:
+            items[content_type_id].append((tag_id, object_id))
+        knesset_of = knesset_resolver()
+        counts = Counter()
+        for content_type_id, tagged in items.items():
+            content_type = ContentType.objects.get_for_id(content_type_id)
+            knessets = {}
+            if content_type.model in TAGGED_DATE_FIELDS and content_type.model_class() is not None:
+                object_ids = list(set(object_id for tag_id, object_id in tagged))
+                for i in range(0, len(object_ids), self.chunk_size):
+                    for object_id, date in content_type.model_class().objects.filter(
+                            pk__in=object_ids[i:i + self.chunk_size]).values_list(
+                            'pk', TAGGED_DATE_FIELDS[content_type.model]):
+                        knessets[object_id] = knesset_of(date)
+            for tag_id, object_id in tagged:
+                counts[(tag_id, content_type_id, knessets.get(object_id))] += 1
+        return counts
+
+    def rebuild(self):
+        """Count again the usage of all the tags"""
+        self.replace_counts(self._count(TaggedItem.objects.values_list('tag', 'content_type', 'object_id').iterator()))
+        self.invalidate()
+
+    def update_for_tagged_items(self, tagged_items, sign=1):
+        """Count the given (tag id, content type id, object id), which were
+        tagged (sign=1) or untagged (sign=-1)"""
+        self.add_counts(dict((key, sign * count) for key, count in self._count(tagged_items).items()))
+        self.invalidate()
+
+    def cloud(self, models, knesset=None, steps=4):
+        """The tags of objects of the given models, in the given knesset or
+        in all of them, sorted by name, each with count and font_size
+        attributes"""
+        content_type_ids = sorted(ContentType.objects.get_for_model(model).id for model in models)
+
+        def compute():
+            rows = self.filter(content_type__in=content_type_ids)
+            if knesset is not None:
+                rows = rows.filter(knesset=knesset)
+            counts = dict(rows.order_by().values_list('tag').annotate(total=Sum('count')))
+            tags = sorted(Tag.objects.in_bulk(list(counts)).values(), key=lambda tag: tag.name)
+            for tag in tags:
+                tag.count = counts[tag.id]
+            return calculate_cloud(tags, steps)
+
+        return self._cached('cloud_%s_%s_%s' % ('-'.join(map(str, content_type_ids)), knesset, steps), compute)
+
+    def item_counts(self):
+        """{tag id: number of tagged items} of all the tags"""
+        return self._cached('item_counts', lambda: dict(
+            self.order_by().values_list('tag').annotate(total=Sum('count'))))
+
+
+class TagUsage(models.Model):
+    """How many objects of a model, from a knesset, are tagged with a tag.
+
+    Kept up to date by the signal handlers of tagged items and by the bulk
+    tagging paths, and read by the tag clouds. The rebuild_tag_usage command
+    counts everything again.
+    """
+    tag = models.ForeignKey(Tag, related_name='usage')
+    content_type = models.ForeignKey(ContentType, related_name='+')
+    # the last knesset that started before the tagged object, if any
+    knesset = models.ForeignKey(Knesset, null=True, blank=True, related_name='+')
+    count = models.IntegerField(default=0)
+
+    objects = TagUsageManager()
+
+    class Meta:
+        unique_together = (('tag', 'content_type', 'knesset'),)
+
+    def __unicode__(self):
+        return u"%s %s %s: %d" % (self.tag, self.content_type, self.knesset_id, self.count)
+
+
+def count_tagged_items(tagged_items, sign=1):
+    """Update the counts of tagged items that were created (sign=1) or
+    deleted (sign=-1) without sending signals, e.g. by bulk_create().
+    tagged_items are (tag id, content type id, object id)"""
+    tagged_items = list(tagged_items)
+    TagMemberActivity.objects.update_for_tagged_items(tagged_items, sign)
+    TagUsage.objects.update_for_tagged_items(tagged_items, sign)
+
+
+def _through_field(through, model):
+    return [field.name for field in through._meta.fields if field.rel and field.rel.to is model][0]
+
+
+def count_participants_activity(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """m2m_changed handler of the members participating in bills, votes or
+    committee meetings, e.g. Bill.proposers"""
+    if action == 'pre_clear':
+        # remember who is cleared, to uncount them after the clear
+        instance._cleared_participants = list(sender.objects.filter(
+            **{_through_field(sender, instance.__class__): instance.pk}).values_list(
+            _through_field(sender, model), flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    sign = 1 if action == 'post_add' else -1
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_participants', ())
+    if not pk_set:
+        return
+    if reverse:  # the instance is a member
+        for obj in model.objects.filter(pk__in=pk_set):
+            TagMemberActivity.objects.update_for_participants(obj, [instance.pk], sign)
+    else:
+        TagMemberActivity.objects.update_for_participants(instance, pk_set, sign)
+
+
+def _tagged_item_key(instance):
+    return instance.tag_id, instance.content_type_id, instance.object_id
+
+
+def remember_tagged_item_tag(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._original_tag_id = TaggedItem.objects.filter(pk=instance.pk).values_list(
+            'tag', flat=True).first()
+
+
+def count_tagged_item(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    original_tag_id = getattr(instance, '_original_tag_id', None)
+    if created:
+        count_tagged_items([_tagged_item_key(instance)])
+    elif original_tag_id is not None and original_tag_id != instance.tag_id:
+        # the item moved to another tag
+        count_tagged_items([(original_tag_id, instance.content_type_id, instance.object_id)], sign=-1)
+        count_tagged_items([_tagged_item_key(instance)])
+
+
+def uncount_tagged_item(sender, instance, **kwargs):
+    count_tagged_items([_tagged_item_key(instance)], sign=-1)
+
+
 post_save.connect(add_tags_to_related_objects, sender=TaggedItem)
 
 post_delete.connect(remove_tags_from_related_objects, sender=TaggedItem)
+
+pre_save.connect(remember_tagged_item_tag, sender=TaggedItem)
+post_save.connect(count_tagged_item, sender=TaggedItem)
+post_delete.connect(uncount_tagged_item, sender=TaggedItem)
@@ -1,24 +1,32 @@
 # -*- coding: utf-8 -*-
 
+import uuid
+
 from tagging.models import Tag, TaggedItem
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from knesset.aho_corasick import KeywordMatcher
 from laws.models import Vote, Bill
 from committees.models import CommitteeMeeting
+from ok_tag.models import deferred_bill_tag_propagation
 
 import operator
 
 
 def approve(admin, request, tag_suggestions):
-    for tag_suggestion in tag_suggestions:
-        obj = tag_suggestion.object
+    with deferred_bill_tag_propagation():
+        for tag_suggestion in tag_suggestions:
+            obj = tag_suggestion.object
 
-        ct = ContentType.objects.get_for_model(obj)
+            ct = ContentType.objects.get_for_model(obj)
 
-        tag, t_created = Tag.objects.get_or_create(name=tag_suggestion.name)
-        ti, ti_created = TaggedItem.objects.get_or_create(
-            tag=tag, object_id=obj.pk, content_type=ct)
+            tag, t_created = Tag.objects.get_or_create(name=tag_suggestion.name)
+            ti, ti_created = TaggedItem.objects.get_or_create(
+                tag=tag, object_id=obj.pk, content_type=ct)
 
-        tag_suggestion.delete()
+            tag_suggestion.delete()
 
 
 def sum_add_two_dictionaries(dict, dict_to_add):
@@ -34,13 +42,19 @@ def sum_add_two_dictionaries(dict, dict_to_add):
 
 # A list of prefix charcters to use in tag extraction
 prefixes = [u'ב', u'ו', u'ה', u'מ', u'מה', u'ל', u'']
+TAGS_VERSION_CACHE_KEY = 'tag_suggestions_tags_version'
 _all_tags_names = []
+_all_tags_version = None
+_tags_matcher = (None, None)  # (the tags names list it was built from, matcher)
 
 
 def all_tags_names():
-    '''Lazy intialization of tags list'''
+    '''Lazy intialization of tags list, which is loaded again after tags
+       change in this or any other process'''
 
-    if (_all_tags_names == []):
+    global _all_tags_names, _all_tags_version
+    version = cache.get(TAGS_VERSION_CACHE_KEY)
+    if _all_tags_names == [] or (version is not None and version != _all_tags_version):
         # Extract only used tags, to avoid irrelevant tags
         vote_tags = Tag.objects.usage_for_model(Vote)
         bill_tags = Tag.objects.usage_for_model(Bill)
@@ -48,32 +62,76 @@ def all_tags_names():
         all_tags = list(set(vote_tags).union(bill_tags).union(cm_tags))
 
         # A list of tags that have been tagged over 10 times in the website
-        global _all_tags_names
         _all_tags_names = [tag.name for tag in all_tags]
+        _all_tags_version = version
 
     return _all_tags_names
 
 
+def invalidate_tags_names(sender, instance, **kwargs):
+    '''Make all processes load the tags list again'''
+    global _all_tags_names
+    _all_tags_names = []
+    cache.set(TAGS_VERSION_CACHE_KEY, uuid.uuid4().hex, settings.LONG_CACHE_TIME)
+
+
+def _tagged_content_types():
+    return [ct.id for ct in ContentType.objects.get_for_models(Vote, Bill, CommitteeMeeting).values()]
+
+
+def unused_tag_ids(tag_ids):
+    '''The tags of tag_ids that no vote, bill or committee meeting is
+       tagged with, which are not in the tags list'''
+    tag_ids = set(tag_ids)
+    return tag_ids - set(TaggedItem.objects.filter(tag__in=tag_ids, content_type__in=_tagged_content_types())
+                         .values_list('tag', flat=True).distinct())
+
+
+def invalidate_tags_names_for_first_use(sender, instance, created=False, raw=False, **kwargs):
+    '''Load the tags list again when a tag is used for the first time.
+       Other taggings do not change the list, and a tag that is not used
+       anymore stays in it until the tags change'''
+    if not created or raw:
+        return
+    content_types = _tagged_content_types()
+    if instance.content_type_id in content_types and not TaggedItem.objects.filter(
+            tag=instance.tag_id, content_type__in=content_types).exclude(pk=instance.pk).exists():
+        invalidate_tags_names(sender, instance)
+
+
+post_save.connect(invalidate_tags_names, sender=Tag, dispatch_uid='tag_suggestions_tag_save')
+post_delete.connect(invalidate_tags_names, sender=Tag, dispatch_uid='tag_suggestions_tag_delete')
+post_save.connect(invalidate_tags_names_for_first_use, sender=TaggedItem,
+                  dispatch_uid='tag_suggestions_tagged_item_save')
+
+
+def tags_matcher():
+    '''A matcher of the words of every tag, with any of the prefixes on
+       its first word, over the words of a text'''
+
+    global _tags_matcher
+    names = all_tags_names()
+    if _tags_matcher[0] is not names:
+        matcher = KeywordMatcher()
+        for tag in names:
+            words = tag.split()
+            if not words:
+                continue
+            for p in prefixes:
+                matcher.add(tuple([p + words[0]] + words[1:]), tag)
+        _tags_matcher = (names, matcher)
+    return _tags_matcher[1]
+
+
 def get_tags_in_text(text):
     """Returns a dictionary, the keys are tags found in text, and the values are the number of occurrences in text"""
 
     result_dict = {}
     words = text.split() if text is not None else []
 
-    # look for tag in word
-    for tag in all_tags_names():
-        # create tag variations according to prefixes
-        tag_variations = [(p + tag) for p in prefixes]
-
-        # find number of occurences of tags for each word
-        occurence_count = 0
-        for word in words:
-            if word in tag_variations:
-                occurence_count += 1
-
-        # if tag found more than once, add them
-        if occurence_count > 0:
-            result_dict[tag] = result_dict.get(tag, 0) + occurence_count
+    # find all occurrences of all tags in a single pass over the words
+    for end, tag in tags_matcher().iter_matches(words):
+        result_dict[tag] = result_dict.get(tag, 0) + 1
 
     return result_dict
 
@@ -1,15 +1,18 @@
-from datetime import datetime
+# -*- coding: utf-8 -*-
+from datetime import datetime, date, timedelta
 
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.http.request import HttpRequest
 from django.test import TestCase
-from tagging.models import Tag
+from tagging.models import Tag, TaggedItem
 
 import ok_tag.tag_suggestions
-from auxiliary.models import TagSuggestion
+from auxiliary.models import TagSuggestion, TagKeyphrase
 from committees.models import CommitteeMeeting, Committee
-from laws.models import Bill, Law
+from laws.models import Bill, Law, Vote
+from mks.models import Knesset, Member
+from ok_tag.models import VoteKeyphraseTagger, deferred_bill_tag_propagation, TagMemberActivity, TagUsage
 from ok_tag.views import suggest_tag_post
 
 
@@ -77,3 +80,165 @@ class SuggestionsTestCase(TestCase):
         text = "tag1 ate the cat"
         tags_count = ok_tag.tag_suggestions.get_tags_in_text(text)
         self.assertEqual(tags_count['tag1'], 1)
+
+    def test_get_tags_in_text_with_prefixes_and_multiple_words(self):
+        ok_tag.tag_suggestions._all_tags_names = [u'חינוך', u'מערכת הבריאות']
+        text = u'החינוך ומערכת הבריאות, מערכת הבריאות וחינוך חינוכי'
+        tags_count = ok_tag.tag_suggestions.get_tags_in_text(text)
+        self.assertEqual(tags_count[u'חינוך'], 2)
+        # the comma is part of the last word of the first occurrence
+        self.assertEqual(tags_count[u'מערכת הבריאות'], 1)
+
+    def test_tags_list_is_loaded_again_on_first_use_of_a_tag(self):
+        vote_1 = Vote.objects.create(title='vote 1', time=datetime.now())
+        vote_2 = Vote.objects.create(title='vote 2', time=datetime.now())
+        Tag.objects.add_tag(vote_1, 'tag2')
+        names = ok_tag.tag_suggestions.all_tags_names()
+        self.assertEqual(names, ['tag2'])
+        # tagging with a used tag keeps the list
+        Tag.objects.add_tag(vote_2, 'tag2')
+        self.assertIs(ok_tag.tag_suggestions.all_tags_names(), names)
+        Tag.objects.add_tag(vote_2, 'tag3')
+        self.assertEqual(set(ok_tag.tag_suggestions.all_tags_names()), {'tag2', 'tag3'})
+
+
+class VoteKeyphraseTaggerTestCase(TestCase):
+    def test_tag_votes(self):
+        education = Tag.objects.create(name=u'חינוך')
+        health = Tag.objects.create(name=u'בריאות')
+        TagKeyphrase.objects.create(tag=education, phrase=u'חוק החינוך')
+        TagKeyphrase.objects.create(tag=health, phrase=u'קופות החולים')
+        vote_1 = Vote.objects.create(title=u'הצעת חוק החינוך (תיקון) - קריאה ראשונה', time=datetime.now())
+        vote_2 = Vote.objects.create(title=u'חוק קופות החולים וחוק החינוך', time=datetime.now())
+        vote_3 = Vote.objects.create(title=u'חוק התקציב', time=datetime.now())
+
+        tagger = VoteKeyphraseTagger()
+        self.assertEqual(tagger.tag_votes(Vote.objects.all()), 3)
+        self.assertEqual(set(Tag.objects.get_for_object(vote_1)), {education})
+        self.assertEqual(set(Tag.objects.get_for_object(vote_2)), {education, health})
+        self.assertEqual(list(Tag.objects.get_for_object(vote_3)), [])
+        # tagging again creates nothing
+        self.assertEqual(tagger.tag_votes([vote_1, vote_2.id]), 0)
+
+
+class BillTagPropagationTestCase(TestCase):
+    def setUp(self):
+        super(BillTagPropagationTestCase, self).setUp()
+        self.bill = Bill.objects.create(stage='1', title='bill 1')
+        self.pre_vote = Vote.objects.create(title='pre vote', time=datetime.now())
+        self.first_vote = Vote.objects.create(title='first vote', time=datetime.now())
+        committee = Committee.objects.create(name='committee 1')
+        self.meeting = CommitteeMeeting.objects.create(committee=committee, date=datetime.now())
+        self.bill.pre_votes.add(self.pre_vote)
+        self.bill.first_committee_meetings.add(self.meeting)
+        self.bill.first_vote = self.first_vote
+        self.bill.save()
+        self.tag_1 = Tag.objects.create(name='tag 1')
+        self.tag_2 = Tag.objects.create(name='tag 2')
+
+    def test_tags_are_propagated_together(self):
+        with deferred_bill_tag_propagation():
+            Tag.objects.add_tag(self.bill, self.tag_1.name)
+            Tag.objects.add_tag(self.bill, self.tag_2.name)
+            # nothing is propagated before the block ends
+            self.assertEqual(list(Tag.objects.get_for_object(self.pre_vote)), [])
+        for obj in (self.pre_vote, self.first_vote, self.meeting):
+            self.assertEqual(set(Tag.objects.get_for_object(obj)), {self.tag_1, self.tag_2})
+
+        TaggedItem.objects.get(tag=self.tag_1, object_id=self.bill.id, content_type__model='bill').delete()
+        for obj in (self.pre_vote, self.first_vote, self.meeting):
+            self.assertEqual(list(Tag.objects.get_for_object(obj)), [self.tag_2])
+
+    def test_tags_are_propagated_when_the_block_raises(self):
+        with self.assertRaises(ValueError):
+            with deferred_bill_tag_propagation():
+                Tag.objects.add_tag(self.bill, self.tag_1.name)
+                raise ValueError()
+        for obj in (self.pre_vote, self.first_vote, self.meeting):
+            self.assertEqual(list(Tag.objects.get_for_object(obj)), [self.tag_1])
+
+
+class TagMemberActivityTestCase(TestCase):
+    def setUp(self):
+        super(TagMemberActivityTestCase, self).setUp()
+        Knesset.objects._current_knesset = None
+        self.previous_knesset = Knesset.objects.create(number=1, start_date=date.today() - timedelta(days=10))
+        self.current_knesset = Knesset.objects.create(number=2, start_date=date.today() - timedelta(days=5))
+        self.mk_1 = Member.objects.create(name='mk 1')
+        self.mk_2 = Member.objects.create(name='mk 2')
+        self.tag = Tag.objects.create(name='tag 1')
+        self.bill = Bill.objects.create(stage='1', title='bill 1', stage_date=date.today() - timedelta(days=7))
+        self.vote = Vote.objects.create(title='vote 1', time=datetime.now())
+        committee = Committee.objects.create(name='committee 1')
+        self.meeting = CommitteeMeeting.objects.create(committee=committee, date=date.today())
+
+    def tearDown(self):
+        Knesset.objects._current_knesset = None
+        super(TagMemberActivityTestCase, self).tearDown()
+
+    def counts(self):
+        return dict(((row.member_id, row.knesset_id), row.count) for row in TagMemberActivity.objects.filter(
+            tag=self.tag))
+
+    def test_counts_follow_changes(self):
+        self.bill.proposers.add(self.mk_1)
+        self.vote.voteaction_set.create(member=self.mk_1, type='for')
+        Tag.objects.add_tag(self.bill, self.tag.name)
+        Tag.objects.add_tag(self.vote, self.tag.name)
+        self.assertEqual(self.counts(), {(self.mk_1.id, 1): 1, (self.mk_1.id, 2): 1})
+
+        self.meeting.mks_attended.add(self.mk_1, self.mk_2)
+        Tag.objects.add_tag(self.meeting, self.tag.name)
+        self.bill.proposers.add(self.mk_2)
+        self.assertEqual(self.counts(), {(self.mk_1.id, 1): 1, (self.mk_1.id, 2): 2,
+                                         (self.mk_2.id, 1): 1, (self.mk_2.id, 2): 1})
+
+        self.meeting.mks_attended.clear()
+        self.vote.voteaction_set.all().delete()
+        TaggedItem.objects.get(tag=self.tag, content_type__model='bill', object_id=self.bill.id).delete()
+        self.assertEqual(self.counts(), {})
+
+    def test_rebuild_and_cloud(self):
+        self.bill.proposers.add(self.mk_1, self.mk_2)
+        self.vote.voteaction_set.create(member=self.mk_1, type='for')
+        Tag.objects.add_tag(self.bill, self.tag.name)
+        Tag.objects.add_tag(self.vote, self.tag.name)
+        counts = self.counts()
+        TagMemberActivity.objects.all().delete()
+        TagMemberActivity.objects.rebuild()
+        self.assertEqual(self.counts(), counts)
+
+        current = TagMemberActivity.objects.top_members(self.tag, 10, knesset=self.current_knesset)
+        self.assertEqual([(mk, mk.count) for mk in current], [(self.mk_1, 1)])
+        previous = TagMemberActivity.objects.top_members(self.tag, 1, exclude_knesset=self.current_knesset)
+        self.assertEqual([(mk, mk.count) for mk in previous], [(self.mk_1, 1)])
+
+
+class TagUsageTestCase(TestCase):
+    def setUp(self):
+        super(TagUsageTestCase, self).setUp()
+        self.tag_1 = Tag.objects.create(name='tag 1')
+        self.tag_2 = Tag.objects.create(name='tag 2')
+        self.bill = Bill.objects.create(stage='1', title='bill 1')
+        self.vote_1 = Vote.objects.create(title='vote 1', time=datetime.now())
+        self.vote_2 = Vote.objects.create(title='vote 2', time=datetime.now())
+
+    def cloud(self, *models):
+        return [(tag.name, tag.count) for tag in TagUsage.objects.cloud(models)]
+
+    def test_cloud_follows_tagged_items(self):
+        Tag.objects.add_tag(self.bill, self.tag_1.name)
+        Tag.objects.add_tag(self.vote_1, self.tag_1.name)
+        Tag.objects.add_tag(self.vote_2, self.tag_1.name)
+        Tag.objects.add_tag(self.vote_2, self.tag_2.name)
+        self.assertEqual(self.cloud(Vote, Bill), [('tag 1', 3), ('tag 2', 1)])
+        self.assertEqual(self.cloud(Bill), [('tag 1', 1)])
+        self.assertEqual(TagUsage.objects.item_counts(), {self.tag_1.id: 3, self.tag_2.id: 1})
+
+        TaggedItem.objects.get(tag=self.tag_2).delete()
+        self.assertEqual(self.cloud(Vote), [('tag 1', 2)])
+
+        counts = TagUsage.objects.item_counts()
+        TagUsage.objects.all().delete()
+        TagUsage.objects.rebuild()
+        self.assertEqual(TagUsage.objects.item_counts(), counts)
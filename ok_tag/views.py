@@ -1,9 +1,7 @@
 import tagging
 from actstream import action
-from django.conf import settings
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.contenttypes.models import ContentType
-from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.db.models import Q
 from django.http import Http404, HttpResponseForbidden, HttpResponse, HttpResponseNotAllowed, HttpResponseBadRequest, \
@@ -25,6 +23,7 @@ from knesset.utils import notify_responsible_adult
 from laws.models import Vote, Bill
 from mks.models import Member, Knesset
 from ok_tag.knesset_paginator import SelectorPaginator
+from ok_tag.models import TagMemberActivity, TagUsage
 
 
 class BaseTagMemberListView(ListView):
@@ -190,15 +189,7 @@ def add_tag_synonym(request, parent_tag_id, synonym_tag_id):
 
 
 def calculate_cloud_from_models(*args):
-    from tagging.models import Tag
-    cloud = Tag._default_manager.cloud_for_model(args[0])
-    for model in args[1:]:
-        for tag in Tag._default_manager.cloud_for_model(model):
-            if tag in cloud:
-                cloud[cloud.index(tag)].count += tag.count
-            else:
-                cloud.append(tag)
-    return tagging.utils.calculate_cloud(cloud)
+    return TagUsage.objects.cloud(args)
 
 
 class TagList(ListView):
@@ -212,12 +203,7 @@ class TagList(ListView):
 
     def get_context_data(self, **kwargs):
         context = super(TagList, self).get_context_data(**kwargs)
-        tags_cloud = cache.get('tags_cloud', None)
-        if not tags_cloud:
-            tags_cloud = calculate_cloud_from_models(Vote, Bill, CommitteeMeeting)
-            tags_cloud.sort(key=lambda x: x.name)
-            cache.set('tags_cloud', tags_cloud, settings.LONG_CACHE_TIME)
-        context['tags_cloud'] = tags_cloud
+        context['tags_cloud'] = TagUsage.objects.cloud([Vote, Bill, CommitteeMeeting])
         return context
 
 
@@ -244,50 +230,22 @@ class TagDetail(DetailView, knessetAwareMixin):
     template_name = 'ok_tag/tag_detail.html'
     slug_field = 'name'
 
-    def create_tag_cloud(self, tag, limit=30, bills=None, votes=None, cms=None):
+    def create_tag_cloud(self, tag, limit=30):
         """
         Create tag could for tag <tag>. Returns only the <limit> most tagged members
+        in the current knesset, and in all previous knessets
         """
 
         try:
             mk_limit = int(self.request.GET.get('limit', limit))
         except ValueError:
             mk_limit = limit
-        if bills is None:
-            bills = TaggedItem.objects.get_by_model(Bill, tag) \
-                .prefetch_related('proposers')
-        if votes is None:
-            votes = TaggedItem.objects.get_by_model(Vote, tag) \
-                .prefetch_related('votes')
-        if cms is None:
-            cms = TaggedItem.objects.get_by_model(CommitteeMeeting, tag) \
-                .prefetch_related('mks_attended')
-        mk_taggeds = [(b.proposers.all(), b.stage_date) for b in bills]
-        mk_taggeds += [(v.votes.all(), v.time.date()) for v in votes]
-        mk_taggeds += [(cm.mks_attended.all(), cm.date) for cm in cms]
-        current_k_start = Knesset.objects.current_knesset().start_date
-        d = {}
-        d_previous = {}
-        for tagged, date in mk_taggeds:
-            if date and (date > current_k_start):
-                for p in tagged:
-                    d[p] = d.get(p, 0) + 1
-            else:  # not current knesset
-                for p in tagged:
-                    d_previous[p] = d.get(p, 0) + 1
-        # now d is a dict: MK -> number of tagged in Bill, Vote and
-        # CommitteeMeeting in this tag, in the current knesset
-        # d_previous is similar, but for all non current knesset data
-        mks = dict(sorted(d.items(), lambda x, y: cmp(y[1], x[1]))[:mk_limit])
-        # Now only the most tagged are in the dict (up to the limit param)
-        for mk in mks:
-            mk.count = d[mk]
+        # the counts of proposed bills, votes and attended committee meetings
+        # are maintained by TagMemberActivity
+        current_knesset = Knesset.objects.current_knesset()
+        mks = TagMemberActivity.objects.top_members(tag, mk_limit, knesset=current_knesset)
         mks = tagging.utils.calculate_cloud(mks)
-
-        mks_previous = dict(sorted(d_previous.items(),
-                                   lambda x, y: cmp(y[1], x[1]))[:mk_limit])
-        for mk in mks_previous:
-            mk.count = d_previous[mk]
+        mks_previous = TagMemberActivity.objects.top_members(tag, mk_limit, exclude_knesset=current_knesset)
         mks_previous = tagging.utils.calculate_cloud(mks_previous)
         return mks, mks_previous
 
@@ -17,12 +17,18 @@ class Command(NoArgsDbLogCommand):
             help="like the download stage but download all the files again"),
         make_option('--reparse',action='store_true',dest='reparse',
             help="like the parse stage but parses all the existing data again"),
+        make_option('--download-workers',action='store',type='int',dest='download_workers',default=4,
+            help="number of protocols downloaded at the same time"),
+        make_option('--convert-workers',action='store',type='int',dest='convert_workers',default=None,
+            help="number of processes converting protocols to xml, defaults to the number of cpus"),
     )
     
     def _handle_noargs(self, **options):
         didSomething=False
         if options.get('download',False) or options.get('redownload',False):
-            Download(options.get('redownload',False), self._logger)
+            Download(options.get('redownload',False), self._logger,
+                     download_workers=options.get('download_workers',4),
+                     convert_workers=options.get('convert_workers'))
             didSomething=True
         if options.get('parse',False) or options.get('reparse',False):
             Parse(options.get('reparse',False), self._logger)
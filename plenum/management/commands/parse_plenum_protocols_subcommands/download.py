@@ -6,11 +6,17 @@ import os
 import re
 import urllib
 import urllib2
+from collections import namedtuple
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
 
 from BeautifulSoup import BeautifulSoup
 from django.conf import settings
+from django.db import transaction
 
+from auxiliary.search import deferred_search_indexing, reindex
 from committees.models import Committee, CommitteeMeeting
+from knesset.cache_invalidation import invalidate_for_instances
 from knesset.utils import send_chat_notification
 from simple.utils import doc_to_xml
 
@@ -63,39 +69,23 @@ def _antiword(filename):
         return ''
 
 
-def _urlAlreadyDownloaded(url):
-    plenum = Committee.objects.filter(type='plenum')[0]
-    if CommitteeMeeting.objects.filter(committee=plenum, src_url=url).count() > 0:
-        return True
-    else:
-        return False
-
+class Protocol(namedtuple('Protocol', 'url year mon day filename')):
+    """A plenum protocol file listed in an index page"""
 
-def _updateDb(xmlData, url, year, mon, day):
-    logger.debug('update db %s, %s, %s, %s, %s' % (len(xmlData), url, year, mon, day))
-    plenum = Committee.objects.filter(type='plenum')[0]
-    cms = CommitteeMeeting.objects.filter(committee=plenum, src_url=url)
-    if cms.count() > 0:
-        meeting = cms[0]
-    else:
-        meeting = CommitteeMeeting(
-            committee=plenum,
-            date=datetime.datetime(int(year), int(mon), int(day)),
-            src_url=url,
-            topics=u'ישיבת מליאה מתאריך ' + day + '/' + mon + '/' + year,
-            date_string='' + day + '/' + mon + '/' + year
-        )
-    meeting.protocol_text = xmlData
-    meeting.save()
+    @property
+    def path(self):
+        return os.path.join(getattr(settings, 'DATA_ROOT'), 'plenum_protocols',
+                            '%s_%s_%s_%s' % (self.year, self.mon, self.day, self.filename))
 
 
-def _downloadLatest(full, redownload):
+def _find_protocols(full):
     html = _get_committees_index_page(full)
     soup = BeautifulSoup(html)
     if full:
         words_of_the_knesset = WORDS_OF_THE_KNESSET_FULL
     else:
         words_of_the_knesset = WORDS_OF_THE_KNESSET
+    protocols = []
     aelts = soup('a', text=words_of_the_knesset)
     for aelt in aelts:
         selt = aelt.findPrevious('span', text=re.compile(DISCUSSIONS_ON_DATE))
@@ -116,24 +106,132 @@ def _downloadLatest(full, redownload):
             year = m.group(3)
             url = url.replace('/heb/..', '')
             logger.debug(url)
-            if not redownload and _urlAlreadyDownloaded(url):
-                logger.debug('url already downloaded')
-            else:
-                DATA_ROOT = getattr(settings, 'DATA_ROOT')
-                _copy(url.replace('/heb/..', ''),
-                      DATA_ROOT + 'plenum_protocols/' + year + '_' + mon + '_' + day + '_' + filename,
-                      recopy=redownload)
-                xmlData = _antiword(DATA_ROOT + 'plenum_protocols/' + year + '_' + mon + '_' + day + '_' + filename)
-                os.remove(DATA_ROOT + 'plenum_protocols/' + year + '_' + mon + '_' + day + '_' + filename)
-                if xmlData != '':
-                    _updateDb(xmlData, url, year, mon, day)
-
-
-def Download(redownload, _logger):
+            protocols.append(Protocol(url, year, mon, day, filename))
+    return protocols
+
+
+def _convert_protocol(protocol):
+    """Convert a downloaded protocol to xml, in a worker process"""
+    xml_data = _antiword(protocol.path)
+    os.remove(protocol.path)
+    return protocol, xml_data
+
+
+class ProtocolsPipeline(object):
+    """Downloads, converts and stores plenum protocols in three stages that
+    run together: a pool of download threads, a pool of antiword processes
+    and the database writes, batch_size meetings per transaction.
+    """
+
+    def __init__(self, redownload=False, download_workers=4, convert_workers=None, batch_size=20,
+                 convert=_convert_protocol):
+        self.redownload = redownload
+        self.download_workers = download_workers
+        self.convert_workers = convert_workers
+        self.batch_size = batch_size
+        # a module level function, so it can be sent to the worker processes
+        self.convert = convert
+
+    def _download(self, protocol):
+        try:
+            _copy(protocol.url, protocol.path, recopy=self.redownload)
+        except Exception:
+            logger.exception(u'could not download protocol %s' % protocol.url)
+            return None
+        return protocol
+
+    def run(self, protocols):
+        """Download, convert and store the protocols. Returns the number of
+        meetings stored"""
+        self.plenum = Committee.objects.filter(type='plenum')[0]
+        # the meetings of all the known protocols, loaded once
+        self.meeting_ids = dict(CommitteeMeeting.objects.filter(committee=self.plenum).exclude(
+            src_url=None).values_list('src_url', 'id'))
+        todo = []
+        urls = set()
+        for protocol in protocols:
+            if not self.redownload and protocol.url in self.meeting_ids:
+                logger.debug('url already downloaded %s' % protocol.url)
+            elif protocol.url not in urls:
+                urls.add(protocol.url)
+                todo.append(protocol)
+        if not todo:
+            return 0
+        # the processes are forked before the threads are started
+        convert_pool = Pool(self.convert_workers)
+        download_pool = ThreadPool(self.download_workers)
+        stored = 0
+        try:
+            downloaded = (protocol for protocol in download_pool.imap_unordered(self._download, todo) if protocol)
+            batch = []
+            for protocol, xml_data in convert_pool.imap_unordered(self.convert, downloaded):
+                if xml_data != '':
+                    batch.append((protocol, xml_data))
+                if len(batch) >= self.batch_size:
+                    stored += self._store(batch)
+                    batch = []
+            stored += self._store(batch)
+        except:
+            # the remaining protocols are not downloaded and converted first
+            download_pool.terminate()
+            convert_pool.terminate()
+            raise
+        else:
+            download_pool.close()
+            convert_pool.close()
+        finally:
+            download_pool.join()
+            convert_pool.join()
+        return stored
+
+    def _store(self, batch):
+        """Store the protocols of a batch, with one insert for the new
+        meetings"""
+        if not batch:
+            return 0
+        new_meetings = []
+        with transaction.atomic(), deferred_search_indexing():
+            for protocol, xml_data in batch:
+                logger.debug('update db %s, %s' % (len(xml_data), protocol.url))
+                meeting_id = self.meeting_ids.get(protocol.url)
+                if meeting_id is not None:
+                    CommitteeMeeting.objects.filter(id=meeting_id).update(protocol_text=xml_data)
+                else:
+                    new_meetings.append(_new_meeting(self.plenum, protocol, xml_data))
+            CommitteeMeeting.objects.bulk_create(new_meetings)
+            new_ids = CommitteeMeeting.objects.filter(
+                committee=self.plenum, src_url__in=[meeting.src_url for meeting in new_meetings]).values_list(
+                'src_url', 'id')
+            self.meeting_ids.update(new_ids)
+            # update() and bulk_create() send no post_save
+            meeting_ids = [self.meeting_ids[protocol.url] for protocol, xml_data in batch]
+            invalidate_for_instances(CommitteeMeeting(id=meeting_id, committee=self.plenum)
+                                     for meeting_id in meeting_ids)
+            reindex('committee_meeting', meeting_ids)
+        return len(batch)
+
+
+def _new_meeting(plenum, protocol, xml_data):
+    day, mon, year = protocol.day, protocol.mon, protocol.year
+    return CommitteeMeeting(
+        committee=plenum,
+        date=datetime.datetime(int(year), int(mon), int(day)),
+        src_url=protocol.url,
+        topics=u'ישיבת מליאה מתאריך ' + day + '/' + mon + '/' + year,
+        date_string='' + day + '/' + mon + '/' + year,
+        protocol_text=xml_data
+    )
+
+
+def _downloadLatest(full, redownload, **pipeline_options):
+    ProtocolsPipeline(redownload, **pipeline_options).run(_find_protocols(full))
+
+
+def Download(redownload, _logger, **pipeline_options):
     global logger
     logger = _logger
-    _downloadLatest(False, redownload)
-    _downloadLatest(True, redownload)
+    _downloadLatest(False, redownload, **pipeline_options)
+    _downloadLatest(True, redownload, **pipeline_options)
 
 
 def download_for_existing_meeting(meeting):
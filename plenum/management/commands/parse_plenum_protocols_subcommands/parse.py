@@ -1,5 +1,6 @@
 # encoding: utf-8
 from django.db.models import Count
+from auxiliary.search import deferred_search_indexing
 from committees.models import Committee, CommitteeMeeting
 from plenum import create_protocol_parts
 import logging
@@ -13,10 +14,12 @@ def Parse(reparse, logger, meeting_pks=None):
         meetings=CommitteeMeeting.objects.filter(committee=plenum).exclude(protocol_text='')
     (mks,mk_names)=create_protocol_parts.get_all_mk_names()
     logger.debug('got mk names: %s, %s'%(mks, mk_names))
-    for meeting in meetings:
-        if reparse or meeting.parts.count() == 0:
-            logger.debug('creating protocol parts for meeting %s'%(meeting,))
-            meeting.create_protocol_parts(delete_existing=reparse,mks=mks,mk_names=mk_names)
+    # the parts of all the meetings are indexed together at the end
+    with deferred_search_indexing():
+        for meeting in meetings:
+            if reparse or meeting.parts.count() == 0:
+                logger.debug('creating protocol parts for meeting %s'%(meeting,))
+                meeting.create_protocol_parts(delete_existing=reparse,mks=mks,mk_names=mk_names)
 
 def parse_for_existing_meeting(meeting):
     logger = logging.getLogger('open-knesset')
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*
+import os
+import shutil
+import tempfile
+import threading
+from BaseHTTPServer import HTTPServer
+from SimpleHTTPServer import SimpleHTTPRequestHandler
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from committees.models import Committee, CommitteeMeeting
+from plenum.management.commands.parse_plenum_protocols_subcommands.download import Protocol, ProtocolsPipeline
+
+
+def _read_protocol(protocol):
+    # stands in for antiword
+    with open(protocol.path) as f:
+        xml_data = f.read().decode('utf8')
+    os.remove(protocol.path)
+    return protocol, xml_data
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class ProtocolsPipelineTest(TestCase):
+    """Downloads protocols from a local file server"""
+
+    def setUp(self):
+        self.served = tempfile.mkdtemp()
+        self.data_root = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.served)
+        self.server = HTTPServer(('127.0.0.1', 0), _QuietHandler)
+        threading.Thread(target=self.server.serve_forever).start()
+        self.settings_override = override_settings(DATA_ROOT=self.data_root)
+        self.settings_override.enable()
+        self.plenum = Committee.objects.create(name='plenum', type='plenum')
+        self.protocols = []
+        for day in range(1, 31):
+            filename = '%d.doc' % day
+            with open(os.path.join(self.served, filename), 'w') as f:
+                f.write((u'פרוטוקול %d' % day).encode('utf8'))
+            self.protocols.append(Protocol('http://127.0.0.1:%d/%s' % (self.server.server_port, filename),
+                                           '2016', '1', str(day), filename))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        os.chdir(self.cwd)
+        self.settings_override.disable()
+        shutil.rmtree(self.served)
+        shutil.rmtree(self.data_root)
+
+    def test_run(self):
+        pipeline = ProtocolsPipeline(download_workers=4, convert_workers=2, batch_size=7, convert=_read_protocol)
+        self.assertEqual(pipeline.run(self.protocols), 30)
+        meetings = CommitteeMeeting.objects.filter(committee=self.plenum)
+        self.assertEqual(meetings.count(), 30)
+        meeting = meetings.get(src_url=self.protocols[4].url)
+        self.assertEqual(meeting.protocol_text, u'פרוטוקול 5')
+        self.assertEqual(meeting.date_string, '5/1/2016')
+        self.assertEqual(os.listdir(os.path.join(self.data_root, 'plenum_protocols')), [])
+
+        # known protocols are not downloaded again
+        self.assertEqual(ProtocolsPipeline(convert=_read_protocol).run(self.protocols), 0)
+
+        with open(os.path.join(self.served, '5.doc'), 'w') as f:
+            f.write(u'פרוטוקול מתוקן'.encode('utf8'))
+        pipeline = ProtocolsPipeline(redownload=True, convert=_read_protocol)
+        self.assertEqual(pipeline.run(self.protocols[4:5]), 1)
+        self.assertEqual(CommitteeMeeting.objects.get(id=meeting.id).protocol_text, u'פרוטוקול מתוקן')
+        self.assertEqual(meetings.count(), 30)
+
+    def test_run_stops_when_store_fails(self):
+        class FailingPipeline(ProtocolsPipeline):
+            def _store(self, batch):
+                if batch:
+                    raise ValueError()
+                return 0
+
+        pipeline = FailingPipeline(download_workers=1, convert_workers=1, batch_size=1, convert=_read_protocol)
+        self.assertRaises(ValueError, pipeline.run, self.protocols)
+        self.assertEqual(CommitteeMeeting.objects.filter(committee=self.plenum).count(), 0)
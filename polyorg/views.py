@@ -46,11 +46,12 @@ class CandidateListDetailView(DetailView):
             context['candidates'] = [x.person for x in candidates]
             agendas = []
             if cl.member_ids:
+                scores = Agenda.objects.get_candidatelist_scores()
                 for a in Agenda.objects.filter(is_public=True).order_by('-num_followers'):
                     agendas.append({'id': a.id,
                                     'name': a.name,
                                     'url': a.get_absolute_url(),
-                                    'score': a.candidate_list_score(cl)})
+                                    'score': scores.get(a.id, {}).get(cl.id, (0.0, 0.0))[0]})
                 context['agendas'] = agendas
             cache.set(cache_key, context, settings.LONG_CACHE_TIME)
         return context
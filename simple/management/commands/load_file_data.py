@@ -8,10 +8,13 @@ import re
 
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
-from django.db.models import Max
+from django.db import transaction
 from okscraper_django.management.base_commands import NoArgsDbLogCommand
 
+from actstream.models import Action
+from knesset.aho_corasick import KeywordMatcher
 from laws.models import Vote, VoteAction
+from laws.vote_matrix import update_vote_matrix
 from links.models import Link
 from mks.models import Member, Party, Membership
 
@@ -35,6 +38,9 @@ class Command(NoArgsDbLogCommand):
     last_downloaded_vote_id = 0
     last_downloaded_member_id = 0
 
+    # rows written per bulk insert and transaction
+    batch_size = 5000
+
     def _handle_noargs(self, **options):
         global logger
         logger = self._logger
@@ -48,9 +54,8 @@ class Command(NoArgsDbLogCommand):
 
     def update_members_from_file(self):
         logger.debug('update_members_from_file')
-        f = gzip.open(os.path.join(DATA_ROOT, 'members.tsv.gz'))
-        content = f.read().split('\n')
-        for line in content:
+        k19_parties = list(Party.objects.filter(knesset_id=19).values_list('name', 'id'))
+        for line in self._read_lines('members.tsv.gz'):
             if len(line) <= 1:
                 continue
             (member_id, name, img_url, phone, fax, website, email,
@@ -110,9 +115,8 @@ class Command(NoArgsDbLogCommand):
                     l.save()
 
             if k19:  # KNESSET 19 specific
-                parties = Party.objects.filter(knesset_id=19).values_list('name', 'id')
                 k19 = k19.decode(ENCODING)
-                for k, v in parties:
+                for k, v in k19_parties:
                     if k in k19:
                         m.current_party_id = int(v)
                         logger.debug('member %s, k19 %s, party %s'
@@ -135,182 +139,219 @@ class Command(NoArgsDbLogCommand):
     heb_months = ['ינואר', 'פברואר', 'מרץ', 'אפריל', 'מאי', 'יוני', 'יולי', 'אוגוסט', 'ספטמבר', 'אוקטובר', 'נובמבר',
                   'דצמבר']
 
-    def update_db_from_files(self):
-        logger.debug("Update DB From Files")
-
+    def _read_lines(self, filename):
+        """Yield the lines of a gzipped data file, one at a time"""
+        f = gzip.open(os.path.join(DATA_ROOT, filename))
         try:
-            laws = []  # of lists: [name,name_for_search,explanation,link]
-            f = gzip.open(os.path.join(DATA_ROOT, 'laws.tsv.gz'))
-            content = f.read().split('\n')
-            for line in content:
-                law = line.split('\t')
-                if len(law) == 3:
-                    name_for_search = self.get_search_string(law[0])
-                    law.insert(1, name_for_search)
-                    laws.append(law)
+            for line in f:
+                yield line.rstrip('\n')
+        finally:
             f.close()
 
-            parties = dict()  # key: party-name; value: Party
-            members = dict()  # key: member-name; value: Member
-            votes = dict()  # key: id; value: Vote
-            memberships = dict()  # key: (member.id,party.id)
-            current_max_src_id = Vote.objects.aggregate(Max('src_id'))['src_id__max']
-            if current_max_src_id == None:  # the db contains no votes, meaning its empty
-                current_max_src_id = 0
-
-            logger.debug("processing votes data")
-            f = gzip.open(os.path.join(DATA_ROOT, 'votes.tsv.gz'))
-            content = f.read().split('\n')
-            for line in content:
-                if len(line) <= 1:
-                    continue
-                (vote_id, vote_src_url, vote_label, vote_meeting_num, vote_num, vote_time_string, _, _, _,
-                 _) = line.split('\t')
-                # if vote_id < current_max_src_id: # skip votes already parsed.
-                #    continue
-                vote_time_string = vote_time_string.replace('&nbsp;', ' ')
-                for i in self.heb_months:
-                    if i in vote_time_string:
-                        month = self.heb_months.index(i) + 1
-                day = re.search("""(\d\d?)""", vote_time_string).group(1)
-                year = re.search("""(\d\d\d\d)""", vote_time_string).group(1)
-                vote_hm = datetime.datetime.strptime(vote_time_string.split(' ')[-1], "%H:%M")
-                vote_date = datetime.date(int(year), int(month), int(day))
-                vote_time = datetime.datetime(int(year), int(month), int(day), vote_hm.hour, vote_hm.minute)
-                vote_label_for_search = self.get_search_string(vote_label)
-
-                # if vote_date < datetime.date(2009, 02, 24): # vote before 18th knesset
-                #    continue
-
-                try:
-                    v = Vote.objects.get(src_id=vote_id)
-                    created = False
-                except:
-                    v = Vote(title=vote_label, time_string=vote_time_string, importance=1, src_id=vote_id,
-                             time=vote_time)
-                    try:
-                        vote_meeting_num = int(vote_meeting_num)
-                        v.meeting_number = vote_meeting_num
-                    except:
-                        pass
-                    try:
-                        vote_num = int(vote_num)
-                        v.vote_number = vote_num
-                    except:
-                        pass
-                    v.src_url = vote_src_url
-                    for law in laws:
-                        (_, law_name_for_search, law_exp, law_link) = law
-                        if vote_label_for_search.find(law_name_for_search) >= 0:
-                            v.summary = law_exp
-                            v.full_text_url = law_link
-                    v.save()
-                    if v.full_text_url != None:
-                        l = Link(title=u'מסמך הצעת החוק באתר הכנסת', url=v.full_text_url,
-                                 content_type=ContentType.objects.get_for_model(v), object_pk=str(v.id))
-                        l.save()
-                votes[int(vote_id)] = v
-            f.close()
-
-            logger.debug("processing member votes data")
-            f = gzip.open(os.path.join(DATA_ROOT, 'results.tsv.gz'))
-            content = f.read().split('\n')
-            for line in content:
-                if len(line) < 2:
-                    continue
-                s = line.split('\t')  # (id,voter,party,vote)
-
-                vote_id = int(s[0])
-                voter = s[1]
-                voter_party = s[2]
-
-                # transform party names to canonical form
-                if voter_party in CANONICAL_PARTY_ALIASES:
-                    voter_party = CANONICAL_PARTY_ALIASES[voter_party]
-
-                vote = s[3]
-
-                try:
-                    v = votes[vote_id]
-                except KeyError:  # this vote was skipped in this read, also skip voteactions and members
-                    continue
-                vote_date = v.time.date()
-
-                # create/get the party appearing in this vote
-                if voter_party in parties:
-                    party = parties[voter_party]
-                    created = False
-                else:
-                    party, created = Party.objects.get_or_create(name=voter_party)
-                    parties[voter_party] = party
-                    # if created: # this is magic needed because of unicode chars. if you don't do this, the object p will have gibrish as its name.
-                    # only when it comes back from the db it has valid unicode chars.
-
-                # use this vote's time to update the party's start date and end date
-                if (party.start_date is None) or (party.start_date > vote_date):
-                    party.start_date = vote_date
-                if (party.end_date is None) or (party.end_date < vote_date):
-                    party.end_date = vote_date
-                if created:  # save on first time, so it would have an id, be able to link, etc. all other updates are saved in the end
-                    party.save()
-
-                # create/get the member voting
-                if voter in members:
-                    member = members[voter]
-                    created = False
-                else:
-                    try:
-                        member = Member.objects.get(name=voter)
-                    except:  # if there are several people with same age,
-                        member = Member.objects.filter(name=voter).order_by('-date_of_birth')[
-                            0]  # choose the younger. TODO: fix this
-                    members[voter] = member
-
-                # use this vote's date to update the member's dates.
-                if (member.start_date is None) or (member.start_date > vote_date):
-                    member.start_date = vote_date
-                if (member.end_date is None) or (member.end_date < vote_date):
-                    member.end_date = vote_date
-                # if created: # save on first time, so it would have an id, be able to link, etc. all other updates are saved in the end
-                #    m.save()
-
-
-                # create/get the membership (connection between member and party)
-                if ((member.id, party.id) in memberships):
-                    ms = memberships[(member.id, party.id)]
-                    created = False
-                else:
-                    ms, created = Membership.objects.get_or_create(member=member, party=party)
-                    memberships[(member.id, party.id)] = ms
-                # if created: # again, unicode magic
-                #    ms = Membership.objects.get(member=m,party=p)
-                # again, update the dates on the membership
-                if (ms.start_date is None) or (ms.start_date > vote_date):
-                    ms.start_date = vote_date
-                if (ms.end_date is None) or (ms.end_date < vote_date):
-                    ms.end_date = vote_date
-                if created:  # save on first time, so it would have an id, be able to link, etc. all other updates are saved in the end
-                    ms.save()
-
-                # add the current member's vote
-
-                va, created = VoteAction.objects.get_or_create(vote=v, member=member, type=vote,
-                                                               party=member.current_party)
-                if created:
-                    va.save()
+    def _parse_vote_time(self, vote_time_string):
+        vote_time_string = vote_time_string.replace('&nbsp;', ' ')
+        for i in self.heb_months:
+            if i in vote_time_string:
+                month = self.heb_months.index(i) + 1
+        day = re.search("""(\d\d?)""", vote_time_string).group(1)
+        year = re.search("""(\d\d\d\d)""", vote_time_string).group(1)
+        vote_hm = datetime.datetime.strptime(vote_time_string.split(' ')[-1], "%H:%M")
+        return vote_time_string, datetime.datetime(int(year), int(month), int(day), vote_hm.hour, vote_hm.minute)
+
+    def load_laws(self):
+        """Return a matcher of the laws search names, whose values are
+        (index, explanation, link) of the law"""
+        laws = KeywordMatcher()
+        for index, line in enumerate(self._read_lines('laws.tsv.gz')):
+            law = line.split('\t')
+            if len(law) == 3:
+                (name, law_exp, law_link) = law
+                laws.add(self.get_search_string(name), (index, law_exp, law_link))
+        return laws
 
-            logger.debug("done")
-            logger.debug(
-                "saving data: %d parties, %d members, %d memberships " % (len(parties), len(members), len(memberships)))
-            for party in parties:
-                parties[party].save()
-            for member in members:
-                members[member].save()
-            for ms in memberships:
-                memberships[ms].save()
+    def update_db_from_files(self):
+        logger.debug("Update DB From Files")
 
+        try:
+            laws = self.load_laws()
+            votes = self.update_votes_from_file(laws)
+            self.update_vote_actions_from_file(votes)
             logger.debug("done")
-            f.close()
         except Exception:
 
             logger.exception('Update db from file exception')
+
+    def update_votes_from_file(self, laws):
+        """Create the votes of votes.tsv.gz that are not in the db yet.
+
+        Returns {vote src id: (vote id, vote date)} of all the votes in the file.
+        """
+        logger.debug("processing votes data")
+        # key: src id; value: (id, date)
+        existing_votes = dict((src_id, (vote_id, time.date())) for src_id, vote_id, time in
+                              Vote.objects.filter(src_id__isnull=False).values_list('src_id', 'id', 'time'))
+        votes = {}
+        new_votes = []
+        for line in self._read_lines('votes.tsv.gz'):
+            if len(line) <= 1:
+                continue
+            (vote_id, vote_src_url, vote_label, vote_meeting_num, vote_num, vote_time_string, _, _, _,
+             _) = line.split('\t')
+            vote_id = int(vote_id)
+            if vote_id in existing_votes:
+                votes[vote_id] = existing_votes[vote_id]
+                continue
+            vote_time_string, vote_time = self._parse_vote_time(vote_time_string)
+            v = Vote(title=vote_label, time_string=vote_time_string, importance=1, src_id=vote_id,
+                     time=vote_time, src_url=vote_src_url)
+            try:
+                v.meeting_number = int(vote_meeting_num)
+            except ValueError:
+                pass
+            try:
+                v.vote_number = int(vote_num)
+            except ValueError:
+                pass
+            # the last law in the file whose name appears in the vote title
+            matching_laws = laws.values_in(self.get_search_string(vote_label))
+            if matching_laws:
+                (_, v.summary, v.full_text_url) = max(matching_laws)
+            new_votes.append(v)
+            if len(new_votes) >= self.batch_size:
+                votes.update(self._create_votes(new_votes))
+                new_votes = []
+        votes.update(self._create_votes(new_votes))
+        return votes
+
+    def _create_votes(self, new_votes):
+        """Save new votes, and links to their laws, and return their
+        {src id: (id, date)}"""
+        if not new_votes:
+            return {}
+        vote_ct = ContentType.objects.get_for_model(Vote)
+        with transaction.atomic():
+            Vote.objects.bulk_create(new_votes)
+            # bulk_create does not set the ids of the new votes
+            src_ids = [v.src_id for v in new_votes]
+            created = {}
+            for i in range(0, len(src_ids), 500):
+                created.update((src_id, (vote_id, time.date())) for src_id, vote_id, time in Vote.objects.filter(
+                    src_id__in=src_ids[i:i + 500]).values_list('src_id', 'id', 'time'))
+            Link.objects.bulk_create([Link(title=u'מסמך הצעת החוק באתר הכנסת', url=v.full_text_url,
+                                           content_type=vote_ct, object_pk=str(created[v.src_id][0]))
+                                      for v in new_votes if v.full_text_url is not None])
+        logger.debug('created %d votes' % len(new_votes))
+        return created
+
+    def _get_member_by_name(self):
+        """{name: Member}, the youngest member of each name"""
+        members = {}
+        for member in Member.objects.order_by('date_of_birth'):
+            members[member.name] = member
+        return members
+
+    def update_vote_actions_from_file(self, votes):
+        """Create the vote actions of results.tsv.gz, and the parties and
+        memberships they imply, and update the dates of the members,
+        parties and memberships to span all their votes."""
+        logger.debug("processing member votes data")
+        parties = dict()  # key: party-name; value: Party
+        members = self._get_member_by_name()  # key: member-name; value: Member
+        memberships = dict(((ms.member_id, ms.party_id), ms) for ms in Membership.objects.all())
+        changed = set()  # parties, members and memberships whose dates changed
+
+        def update_dates(obj, vote_date):
+            if (obj.start_date is None) or (obj.start_date > vote_date):
+                obj.start_date = vote_date
+                changed.add(obj)
+            if (obj.end_date is None) or (obj.end_date < vote_date):
+                obj.end_date = vote_date
+                changed.add(obj)
+
+        results = []  # of (vote id, vote date, member id, party id, vote type)
+        synced_vote_ids = set()  # votes with new actions
+        for line in self._read_lines('results.tsv.gz'):
+            if len(line) < 2:
+                continue
+            s = line.split('\t')  # (id,voter,party,vote)
+
+            vote_src_id = int(s[0])
+            voter = s[1]
+            voter_party = s[2]
+
+            # transform party names to canonical form
+            if voter_party in CANONICAL_PARTY_ALIASES:
+                voter_party = CANONICAL_PARTY_ALIASES[voter_party]
+
+            try:
+                vote_id, vote_date = votes[vote_src_id]
+            except KeyError:  # this vote was skipped in this read, also skip voteactions and members
+                continue
+
+            # create/get the party appearing in this vote
+            if voter_party in parties:
+                party = parties[voter_party]
+            else:
+                party, created = Party.objects.get_or_create(name=voter_party)
+                parties[voter_party] = party
+            update_dates(party, vote_date)
+
+            member = members.get(voter)
+            if member is None:
+                logger.warning('member %s not found' % voter)
+                continue
+            update_dates(member, vote_date)
+
+            # create/get the membership (connection between member and party)
+            ms = memberships.get((member.id, party.id))
+            if ms is None:
+                ms = memberships[(member.id, party.id)] = Membership.objects.create(member=member, party=party)
+            update_dates(ms, vote_date)
+
+            # the party of the vote, for members without a current party
+            results.append((vote_id, vote_date, member.id, member.current_party_id or party.id, s[3]))
+            if len(results) >= self.batch_size:
+                synced_vote_ids.update(self._create_vote_actions(results))
+                results = []
+        synced_vote_ids.update(self._create_vote_actions(results))
+        update_vote_matrix(synced_vote_ids)
+
+        logger.debug(
+            "saving data: %d parties, %d members, %d memberships " % (len(parties), len(members), len(memberships)))
+        with transaction.atomic():
+            for obj in changed:
+                obj.save()
+
+    def _create_vote_actions(self, results):
+        """Create the vote actions that are not in the db yet, and record
+        them in the members' activity streams. Returns the ids of the votes
+        with new actions"""
+        if not results:
+            return set()
+        vote_ids = list(set(r[0] for r in results))
+        existing = set()
+        for i in range(0, len(vote_ids), 500):
+            existing.update(VoteAction.objects.filter(vote__in=vote_ids[i:i + 500]).values_list(
+                'vote', 'member', 'type', 'party'))
+        new_results = []
+        for vote_id, vote_date, member_id, party_id, vote_type in results:
+            if (vote_id, member_id, vote_type, party_id) not in existing:
+                existing.add((vote_id, member_id, vote_type, party_id))
+                new_results.append((vote_id, member_id, party_id, vote_type))
+        if not new_results:
+            return set()
+        vote_times = dict(Vote.objects.filter(id__in=set(r[0] for r in new_results)).values_list('id', 'time'))
+        member_ct = ContentType.objects.get_for_model(Member)
+        vote_ct = ContentType.objects.get_for_model(Vote)
+        with transaction.atomic():
+            vote_actions = [VoteAction(vote_id=vote_id, member_id=member_id, party_id=party_id, type=vote_type)
+                            for vote_id, member_id, party_id, vote_type in new_results]
+            VoteAction.objects.bulk_create(vote_actions)
+            # bulk_create sends no post_save, do what laws.listeners.record_vote_action does
+            Action.objects.bulk_create([Action(actor_content_type=member_ct, actor_object_id=str(va.member_id),
+                                               verb='voted', description=va.get_type_display(),
+                                               target_content_type=vote_ct, target_object_id=str(va.vote_id),
+                                               timestamp=vote_times[va.vote_id])
+                                        for va in vote_actions])
+        logger.debug('created %d vote actions' % len(vote_actions))
+        return set(vote_times)
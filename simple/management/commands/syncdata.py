@@ -27,6 +27,8 @@ from laws.models import (Vote, VoteAction, Bill, Law, PrivateProposal,
                          KnessetProposal, GovProposal, GovLegislationCommitteeDecision)
 from links.models import Link
 from mks.models import Member, Party, Membership, WeeklyPresence, Knesset
+from mks.party_stats import PartyStatistics
+from mks.utils import MemberDistributionIndex
 
 from persons.models import Person, PersonAlias
 
@@ -148,6 +150,9 @@ class Command(NoArgsDbLogCommand):
                         logger.exception("Caught Exception in syncdata update phase %s", func)
             logger.info('finished update')
 
+        if any([process, laws, presence, update]):
+            PartyStatistics.invalidate()
+
     def read_laws_page(self, index):
 
         url = '%s' % SECOND_AND_THIRD_READING_LAWS_URL
@@ -445,16 +450,20 @@ class Command(NoArgsDbLogCommand):
             logger.error('Can\'t find presence file')
             return
         todays_timestamp = datetime.date.today().isocalendar()[:2]
-        c = [b[0][0] for b in presence.values()]
-        c.sort()
-        min_timestamp = c[0]
-        c = None
+        if not presence:
+            logger.error('no presence data')
+            return
+        min_timestamp = min(b[0][0] for b in presence.values())
+        valid_weeks = set(valid_weeks)
 
+        members = []
+        weekly_hours = {}
         for member in Member.current_members.all():
             if member.id not in presence:
                 logger.error('member %s (id=%d) not found in presence data', member.name, member.id)
                 continue
-            member_presence = dict(zip([b[0] for b in presence[member.id]], [b[1] for b in presence[member.id]]))
+            members.append(member)
+            member_presence = dict(presence[member.id])
 
             if member.end_date:
                 end_timestamp = member.end_date.isocalendar()[:2]
@@ -468,19 +477,20 @@ class Command(NoArgsDbLogCommand):
                 current_timestamp = min_timestamp
 
             while current_timestamp <= end_timestamp:  # loop over weeks
+                date = iso_to_gregorian(*current_timestamp, iso_day=0)  # get real date of the week's monday
                 if current_timestamp in valid_weeks:  # if we have valid data for this week
-                    if current_timestamp in member_presence:  # if this member was present this week
-                        hours = member_presence[current_timestamp]  # check how many hours
-                    else:
-                        hours = 0.0  # not present at all this week = 0 hours
-                    date = iso_to_gregorian(*current_timestamp, iso_day=0)  # get real date of the week's monday
-                    (wp, created) = WeeklyPresence.objects.get_or_create(member=member, date=date,
-                                                                         defaults={'hours': hours})
-                    wp.save()
-                else:
-                    date = iso_to_gregorian(*current_timestamp, iso_day=0)
+                    # not present at all this week = 0 hours
+                    weekly_hours[(member.id, date)] = member_presence.get(current_timestamp, 0.0)
                 current_timestamp = (date + datetime.timedelta(8)).isocalendar()[:2]
 
+        changed = WeeklyPresence.objects.upsert(weekly_hours)
+        logger.debug('updated presence of %d members', len(changed))
+        # saving a WeeklyPresence recomputes the average of its member, the
+        # bulk writes don't, so each average is recomputed once here
+        WeeklyPresence.objects.recalc_average_hours(members)
+
+        MemberDistributionIndex.rebuild()
+
     def update_private_proposal_content_html(self, pp):
         html = parse_remote.rtf(pp.source_url)
         if html:
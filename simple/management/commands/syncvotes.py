@@ -17,7 +17,7 @@ class Command(NoArgsCommand):
         viewRes = viewObj.dispatch(viewReq)
 
         # write result to media file
-        outputFile = ContentFile(viewRes.content)
+        outputFile = ContentFile("".join(viewRes.streaming_content))
         filewithpath = VoteCsvView.filename
 
         # remove existing file
@@ -1,13 +1,136 @@
-from datetime import datetime, date
+from datetime import date
 import gzip
 
+import numpy as np
+
 WORKING_HOURS_PER_WEEK = 48.0
 KNESSET_WORKING_DAYS = [0, 1, 2]
 WORKDAY_START = 6.0
 WORKDAY_END = 22.0
+# weeks with fewer reports (~50 hours sampled) are not counted
+MIN_REPORTS_PER_WEEK = 200
+# each report is valid for maximum of 15 minutes
+MAX_REPORT_MINUTES = 15
+
+
+class PresenceReports(object):
+    """The reports of a presence file as columns.
+
+       times is the scrape time of each report (datetime64[s]), and the
+       reported member ids are member_ids[report_offsets[i]:report_offsets[i + 1]]
+    """
 
+    def __init__(self, times, member_ids, report_offsets):
+        self.times = times
+        self.member_ids = member_ids
+        self.report_offsets = report_offsets
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def report_indexes(self):
+        """The report of each item of member_ids"""
+        return np.repeat(np.arange(len(self.times)), np.diff(self.report_offsets))
+
+
+def read_presence_reports(filename):
+    """Read the reports of a gzipped presence file, each line is the scrape
+       time followed by the ids of the members present"""
+    times = []
+    member_ids = []
+    counts = []
+    with gzip.open(filename, 'r') as f:
+        lines = f.read().splitlines()
+    for line in lines:
+        scrape_time, _, ids = line.partition(',')
+        if not scrape_time.strip():
+            continue
+        times.append(scrape_time.strip())
+        ids = ids.replace(',', ' ')
+        member_ids.append(ids)
+        counts.append(len(ids.split()))
+    return PresenceReports(np.array(times, dtype='datetime64[s]'),
+                           np.fromstring(' '.join(member_ids), dtype=np.int64, sep=' '),
+                           np.concatenate(([0], np.cumsum(counts, dtype=np.int64))))
 
-def parse_presence(filename=None):
+
+def iso_weeks(days):
+    """(year, week) of the iso calendar of datetime64[D] days as an array of
+       year * 100 + week"""
+    weekdays = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a thursday
+    thursdays = days - weekdays + 3
+    years = thursdays.astype('datetime64[Y]')
+    weeks = (thursdays - years.astype('datetime64[D]')).astype(np.int64) // 7 + 1
+    return (years.astype(np.int64) + 1970) * 100 + weeks
+
+
+def weekly_presence(reports, today=None):
+    """Compute the weekly presence hours of the members.
+       Returns (weeks, member_ids, hours, present):
+       weeks is an array of the week timestamps (year * 100 + iso week) in which
+       we had enough data to compute weekly hours, member_ids is a sorted array
+       of the reported members, hours is a weeks x members matrix of the weekly
+       hours, and present is a matrix of whether the member was reported at all
+       in the week.
+    """
+    today = today or date.today()
+    no_presence = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros((0, 0)), np.zeros((0, 0), bool)
+    if len(reports) < 2:
+        return no_presence
+    times = reports.times
+    seconds = times.astype(np.int64)
+    # every report is valid from the report before it, on any day
+    minutes = np.minimum((np.diff(seconds) % 86400) // 60, MAX_REPORT_MINUTES)
+    times = times[1:]
+    days = times.astype('datetime64[D]')
+    time_in_day = (times - days).astype(np.int64) // 60 / 60.0
+    weeks = iso_weeks(days)
+    kept = (np.in1d((days.astype(np.int64) + 3) % 7, KNESSET_WORKING_DAYS) &
+            (time_in_day >= WORKDAY_START) & (time_in_day <= WORKDAY_END))
+    kept = np.flatnonzero(kept)
+    # the reports stop at the current week
+    todays_year, todays_week = today.isocalendar()[:2]
+    current = np.flatnonzero(weeks[kept] == todays_year * 100 + todays_week)
+    if len(current):
+        kept = kept[:current[0]]
+    if not len(kept):
+        return no_presence
+
+    # consecutive reports of a week; the last week may still be in progress,
+    # so it is not counted
+    kept_weeks = weeks[kept]
+    week_index = np.concatenate(([0], np.cumsum(kept_weeks[1:] != kept_weeks[:-1])))
+    number_of_weeks = week_index[-1]
+    counted = week_index < number_of_weeks
+    kept, week_index = kept[counted], week_index[counted]
+    week_minutes = np.bincount(week_index, minutes[kept], number_of_weeks)
+    enough = ((np.bincount(week_index, minlength=number_of_weeks) > MIN_REPORTS_PER_WEEK) &
+              (week_minutes > 0))
+    if not enough.any():
+        return no_presence
+
+    # the member ids of the kept reports (the first report only starts the count)
+    report_week = np.full(len(reports), -1, dtype=np.int64)
+    report_week[kept + 1] = week_index
+    report_minutes = np.zeros(len(reports))
+    report_minutes[kept + 1] = minutes[kept]
+    report_indexes = reports.report_indexes
+    item_weeks = report_week[report_indexes]
+    items = np.flatnonzero((item_weeks >= 0) & enough[np.maximum(item_weeks, 0)])
+    member_ids, members = np.unique(reports.member_ids[items], return_inverse=True)
+    week_row = np.cumsum(enough) - 1
+    cells = week_row[item_weeks[items]] * len(member_ids) + members
+    shape = (int(enough.sum()), len(member_ids))
+    member_minutes = np.bincount(cells, report_minutes[report_indexes[items]], shape[0] * shape[1]).reshape(shape)
+    present = np.bincount(cells, minlength=shape[0] * shape[1]).reshape(shape) > 0
+    # rounded half up, like round() of positive numbers
+    hours = np.floor(member_minutes / week_minutes[enough][:, np.newaxis] * WORKING_HOURS_PER_WEEK + 0.5)
+    week_starts = np.concatenate(([0], np.flatnonzero(kept_weeks[1:] != kept_weeks[:-1]) + 1))
+    return kept_weeks[week_starts[:number_of_weeks]][enough], member_ids, hours, present
+
+
+def parse_presence(filename=None, today=None):
     """Parse the presence reports text file.
        filename is the reports file to parse. defaults to 'presence.txt'
        Will throw an IOError if the file is not found, or can't be read
@@ -18,68 +141,10 @@ def parse_presence(filename=None):
     """
     if filename is None:
         filename = 'presence.txt'
+    weeks, member_ids, hours, present = weekly_presence(read_presence_reports(filename), today)
+    timestamps = [(int(week) // 100, int(week) % 100) for week in weeks]
     member_totals = dict()
-    totals = dict()
-    total_time = 0.0
-    f = gzip.open(filename, 'r')
-
-    workdays = KNESSET_WORKING_DAYS
-    last_timestamp = None
-    todays_timestamp = date.today().isocalendar()[:2]
-    reports = []
-    enough_data = []
-    line = f.readline()
-    data = line.split(',')
-    scrape_time = datetime.strptime(data[0], '%Y-%m-%d %H:%M:%S')
-
-    for line in f:
-        data = line.split(',')
-        last_time = scrape_time
-        scrape_time = datetime.strptime(data[0], '%Y-%m-%d %H:%M:%S')
-        time_in_day = scrape_time.hour + scrape_time.minute / 60.0
-        current_timestamp = scrape_time.isocalendar()[:2]
-
-        if scrape_time.weekday() not in workdays or (time_in_day < WORKDAY_START) or (time_in_day > WORKDAY_END):
-            continue
-        if current_timestamp == todays_timestamp:
-            break
-        if current_timestamp != last_timestamp:  # when we move to next timestamp (week), parse the last weeks data
-            if len(reports) > 200:  # only if we have enough reports from this week (~50 hours sampled)
-                enough_data.append(last_timestamp)  # record that we had enough reports this week
-                subtotals = dict()
-                subtotal_time = 0
-                for presence_report in reports:
-                    minutes = min(presence_report[0], 15)  # each report is valid for maximum of 15 minutes
-                    subtotal_time += minutes
-                    for i in presence_report[1]:
-                        if i in subtotals:
-                            subtotals[i] += minutes
-                        else:
-                            subtotals[i] = minutes
-                for sub_total in subtotals:
-                    if sub_total in totals:
-                        totals[sub_total] += float(subtotals[sub_total])
-                    else:
-                        totals[sub_total] = float(subtotals[sub_total])
-                total_time += subtotal_time
-            else:  # not enough data this week.
-                # if last_timestamp!=None:
-                #    not_enough_data.append(last_timestamp)
-                pass
-            # delete the reports list
-            reports = []
-
-            for total in totals:
-                d = last_timestamp
-                weekly_hours_for_member = round(float(totals[total]) / total_time * WORKING_HOURS_PER_WEEK)
-                if total in member_totals:
-                    member_totals[total].append((d, weekly_hours_for_member))
-                else:
-                    member_totals[total] = [(d, weekly_hours_for_member)]
-            totals = {}
-            total_time = 0.0
-            last_timestamp = scrape_time.isocalendar()[:2]
-
-        # for every report in the file, add it to the array as a tuple: (time, [list of member ids])
-        reports.append(((scrape_time - last_time).seconds / 60, [int(x) for x in data[1:] if len(x.strip()) > 0]))
-    return member_totals, enough_data
+    for column, member_id in enumerate(member_ids):
+        rows = np.flatnonzero(present[:, column])
+        member_totals[int(member_id)] = [(timestamps[row], float(hours[row, column])) for row in rows]
+    return member_totals, timestamps
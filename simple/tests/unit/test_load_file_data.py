@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*
+import datetime
+import unittest
+
+from knesset.aho_corasick import KeywordMatcher
+from simple.management.commands.load_file_data import Command
+
+
+class TestLoadFileData(unittest.TestCase):
+
+    def test_parse_vote_time(self):
+        time_string, time = Command()._parse_vote_time('3 מרץ 2010&nbsp;12:30')
+        self.assertEqual('3 מרץ 2010 12:30', time_string)
+        self.assertEqual(datetime.datetime(2010, 3, 3, 12, 30), time)
+
+    def test_last_matching_law(self):
+        command = Command()
+        laws = KeywordMatcher()
+        for index, name in enumerate(['חוק החינוך', 'חוק החינוך (תיקון)', 'חוק הבריאות']):
+            laws.add(command.get_search_string(name), (index, name, 'http://example.com/%d' % index))
+        matches = laws.values_in(command.get_search_string('הצעת חוק החינוך (תיקון), קריאה ראשונה'))
+        self.assertEqual([0, 1], sorted(index for index, name, link in matches))
+        self.assertEqual(1, max(matches)[0])
+        self.assertEqual(set(), laws.values_in(command.get_search_string('חוק התקציב')))
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*
+import datetime
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from simple.parsers.parse_presence import parse_presence
+
+
+class TestParsePresence(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, 'presence.txt.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write_reports(self, reports):
+        with gzip.open(self.filename, 'w') as f:
+            for scrape_time, member_ids in reports:
+                f.write(scrape_time.strftime('%Y-%m-%d %H:%M:%S') + ''.join(', %d' % i for i in member_ids) + '\n')
+
+    def test_parse_presence(self):
+        reports = []
+        # a report every 10 minutes on the working hours of two weeks, member 1
+        # is present in all of them and member 2 in a quarter of the first week
+        for monday in (datetime.datetime(2016, 1, 4), datetime.datetime(2016, 1, 11)):
+            for day in range(3):
+                for minutes in range(7 * 60, 21 * 60, 10):
+                    scrape_time = monday + datetime.timedelta(days=day, minutes=minutes)
+                    member_ids = [1, 2] if monday.day == 4 and day == 0 and minutes < 17 * 60 else [1]
+                    reports.append((scrape_time, member_ids))
+        # a sunday report, not counted, starts the third week
+        reports.append((datetime.datetime(2016, 1, 17, 12), [3]))
+        reports.append((datetime.datetime(2016, 1, 18, 12), [3]))
+        self.write_reports(reports)
+
+        member_totals, weeks = parse_presence(self.filename, today=datetime.date(2016, 2, 1))
+        self.assertEqual(weeks, [(2016, 1), (2016, 2)])
+        # each report counts up to 15 minutes since the one before it
+        self.assertEqual(member_totals[1], [((2016, 1), 48.0), ((2016, 2), 48.0)])
+        self.assertEqual(member_totals[2], [((2016, 1), 11.0)])
+        # the last week may be incomplete
+        self.assertNotIn(3, member_totals)
+
+        # nor is the current week
+        member_totals, weeks = parse_presence(self.filename, today=datetime.date(2016, 1, 13))
+        self.assertEqual(weeks, [])